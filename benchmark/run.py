@@ -0,0 +1,277 @@
+#!/usr/bin/python3
+#-*- coding: utf-8 -*-
+
+# Copyright (C) 2017-2024 Clémence Frioux & Arnaud Belcour - Inria Dyliss - Pleiade
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""Benchmark of the mene subcommands on synthetic networks.
+
+Each subcommand is run in its own Python process, which reports its wall
+time, its peak resident memory and the time spent by clingo in grounding
+and solving. The results are appended to a JSON history and compared to
+the previous run of the history.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import write_network
+
+SCALES = {'tiny': 100, 'small': 500, 'medium': 2000, 'large': 10000}
+
+COMMANDS = ['scope', 'acti', 'check', 'dead', 'seed', 'scope_inc', 'path', 'cof']
+
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.json')
+
+
+def run_command(command, draft, seeds, targets):
+    """run a subcommand through the python API
+
+    Args:
+        command (str): name of the subcommand
+        draft (str): SBML network file
+        seeds (str): SBML seeds file
+        targets (str): SBML targets file
+    """
+    import menetools
+    if command == 'scope':
+        menetools.run_menescope(draft, seeds)
+    elif command == 'acti':
+        menetools.run_meneacti(draft, seeds)
+    elif command == 'check':
+        menetools.run_menecheck(draft, seeds, targets)
+    elif command == 'dead':
+        menetools.run_menedead(draft)
+    elif command == 'seed':
+        menetools.run_meneseed(draft)
+    elif command == 'scope_inc':
+        # the steps of all the producible compounds, the incremental scope
+        # of unproducible targets does not end
+        menetools.run_menescope_inc(draft, seeds, None)
+    elif command == 'path':
+        menetools.run_menepath(draft, seeds, targets, min_size=True, processes=1)
+    elif command == 'cof':
+        menetools.run_menecof(draft, seeds, targets)
+
+
+def measure(command, draft, seeds, targets):
+    """run a subcommand in the current process and measure it
+
+    clingo.Control is replaced by a subclass timing the groundings and
+    reading the solving time of each solve call in the clingo statistics.
+
+    Args:
+        command (str): name of the subcommand
+        draft (str): SBML network file
+        seeds (str): SBML seeds file
+        targets (str): SBML targets file
+
+    Returns:
+        dict: wall time, peak RSS and time of the phases
+    """
+    import resource
+    import clingo
+
+    phases = {'ground': 0.0, 'solve': 0.0}
+
+    class TimedHandle:
+        def __init__(self, ctl, handle):
+            self.ctl = ctl
+            self.handle = handle
+
+        def __getattr__(self, name):
+            return getattr(self.handle, name)
+
+        def __iter__(self):
+            return iter(self.handle)
+
+        def __enter__(self):
+            self.handle.__enter__()
+            return self
+
+        def __exit__(self, *exc):
+            result = self.handle.__exit__(*exc)
+            phases['solve'] += self.ctl.statistics['summary']['times']['solve']
+            return result
+
+    class TimedControl(clingo.Control):
+        def ground(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().ground(*args, **kwargs)
+            finally:
+                phases['ground'] += time.perf_counter() - start
+
+        def solve(self, *args, **kwargs):
+            result = super().solve(*args, **kwargs)
+            if isinstance(result, clingo.SolveResult):
+                phases['solve'] += self.statistics['summary']['times']['solve']
+                return result
+            return TimedHandle(self, result)
+
+    clingo.Control = TimedControl
+    start = time.perf_counter()
+    run_command(command, draft, seeds, targets)
+    wall = time.perf_counter() - start
+    phases['other'] = max(0.0, wall - phases['ground'] - phases['solve'])
+    # kilobytes on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+    return {'wall': wall, 'peak_rss_kb': peak_rss, 'phases': phases}
+
+
+def run_isolated(command, files, timeout):
+    """run and measure a subcommand in a new Python process
+
+    Args:
+        command (str): name of the subcommand
+        files (tuple): SBML network, seeds and targets files
+        timeout (float): seconds before the process is killed
+
+    Returns:
+        dict: status (ok, error or timeout) and the measures of measure if ok
+    """
+    try:
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', command, *files],
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 timeout=timeout, universal_newlines=True)
+    except subprocess.TimeoutExpired:
+        return {'status': 'timeout'}
+    # the measures are printed on the last line, after the outputs of the command
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines or not lines[-1].startswith('{'):
+        return {'status': 'error'}
+    measures = json.loads(lines[-1])
+    measures['status'] = 'ok'
+    return measures
+
+
+def environment():
+    """describe the versions and the machine of a benchmark
+
+    Returns:
+        dict: date, menetools, clingo and python versions, machine, CPUs and git commit
+    """
+    import clingo
+    import menetools
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'menetools': menetools.__version__, 'clingo': clingo.__version__,
+            'python': platform.python_version(), 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'commit': commit}
+
+
+def compare(runs, previous, threshold):
+    """print the runs and their wall time ratio to the previous run
+
+    Args:
+        runs (list): runs of the benchmark
+        previous (list): runs of the previous benchmark of the history
+        threshold (float): ratio above which a run is reported as a regression
+
+    Returns:
+        int: number of regressions
+    """
+    previous = {(run['scale'], run['command']): run for run in previous if run['status'] == 'ok'}
+    regressions = 0
+    print('{:<8} {:<10} {:>7} {:>10} {:>9} {:>9} {:>9} {:>8}'.format(
+        'scale', 'command', 'status', 'wall (s)', 'ground', 'solve', 'RSS (MB)', 'ratio'))
+    for run in runs:
+        if run['status'] != 'ok':
+            print('{:<8} {:<10} {:>7}'.format(run['scale'], run['command'], run['status']))
+            continue
+        ratio = ''
+        before = previous.get((run['scale'], run['command']))
+        if before:
+            ratio = run['wall'] / max(before['wall'], 1e-9)
+            if ratio > threshold:
+                regressions += 1
+            ratio = '{:.2f}{}'.format(ratio, ' !' if ratio > threshold else '')
+        print('{:<8} {:<10} {:>7} {:>10.3f} {:>9.3f} {:>9.3f} {:>9.1f} {:>8}'.format(
+            run['scale'], run['command'], run['status'], run['wall'], run['phases']['ground'],
+            run['phases']['solve'], run['peak_rss_kb'] / 1024, ratio))
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        command, draft, seeds, targets = sys.argv[2:6]
+        print(json.dumps(measure(command, draft, seeds, targets)))
+        return
+
+    parser = argparse.ArgumentParser(description='Benchmark the mene subcommands on synthetic networks.')
+    parser.add_argument('--scales', nargs='+', default=['tiny', 'small'],
+                        help='scales among {0}, or numbers of reactions. Default = tiny small'.format(
+                            ', '.join('{0} ({1})'.format(name, size) for name, size in SCALES.items())))
+    parser.add_argument('--commands', nargs='+', default=COMMANDS, choices=COMMANDS,
+                        help='subcommands to run. Default = all')
+    parser.add_argument('--reversibility', type=float, default=0.2,
+                        help='ratio of reversible reactions. Default = 0.2')
+    parser.add_argument('--hub-skew', type=float, default=1.0,
+                        help='skew of the metabolite occurrences, 0 for uniform. Default = 1.0')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the network generator. Default = 0')
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='seconds before a subcommand is stopped. Default = 600')
+    parser.add_argument('--history', default=HISTORY,
+                        help='JSON history the results are appended to. Default = benchmark/history.json')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='wall time ratio to the previous run reported as a regression. Default = 1.2')
+    args = parser.parse_args()
+
+    runs = []
+    for scale in args.scales:
+        reactions = SCALES[scale] if scale in SCALES else int(scale)
+        with tempfile.TemporaryDirectory(prefix='menetools_benchmark_') as directory:
+            files = write_network(directory, reactions, reversibility=args.reversibility,
+                                  hub_skew=args.hub_skew, seed=args.seed)
+            for command in args.commands:
+                run = {'scale': scale, 'reactions': reactions, 'command': command}
+                run.update(run_isolated(command, files, args.timeout))
+                runs.append(run)
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history) as history_file:
+            history = json.load(history_file)
+    parameters = {'reversibility': args.reversibility, 'hub_skew': args.hub_skew, 'seed': args.seed}
+    # the last benchmark run on the same networks
+    previous = next((benchmark['runs'] for benchmark in reversed(history)
+                     if benchmark['parameters'] == parameters), [])
+    regressions = compare(runs, previous, args.threshold)
+
+    benchmark = environment()
+    benchmark['parameters'] = parameters
+    benchmark['runs'] = runs
+    history.append(benchmark)
+    with open(args.history, 'w') as history_file:
+        json.dump(history, history_file, indent=True)
+    if regressions:
+        print('{0} runs slower than {1} times the previous run'.format(regressions, args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+#-*- coding: utf-8 -*-
+
+# Copyright (C) 2017-2024 Clémence Frioux & Arnaud Belcour - Inria Dyliss - Pleiade
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""Seeded generator of synthetic metabolic networks in SBML."""
+
+import argparse
+import itertools
+import os
+import random
+
+import xml.etree.ElementTree as etree
+
+SBML_NAMESPACE = 'http://www.sbml.org/sbml/level2'
+
+
+def generate_network(reactions, metabolites=None, reversibility=0.2, hub_skew=1.0,
+                     seeds=10, targets=10, seed=0):
+    """generate a random metabolic network, its seeds and targets
+
+    The reactants and products of the reactions are drawn from a Zipf-like
+    distribution: the i-th metabolite is drawn with a weight 1/(i+1)^hub_skew,
+    so that a few hub metabolites occur in many reactions, as water or ATP.
+
+    Args:
+        reactions (int): number of reactions
+        metabolites (int, optional): Defaults to None. number of metabolites, as many as reactions if None
+        reversibility (float, optional): Defaults to 0.2. ratio of reversible reactions
+        hub_skew (float, optional): Defaults to 1.0. skew of the metabolite occurrences, 0 for uniform
+        seeds (int, optional): Defaults to 10. number of seeds, drawn among the hubs
+        targets (int, optional): Defaults to 10. number of targets, drawn among the other metabolites
+        seed (int, optional): Defaults to 0. seed of the random generator
+
+    Returns:
+        dict: metabolites (list), reactions (list of (id, reversible, reactants, products)),
+        seeds (list) and targets (list)
+    """
+    rng = random.Random(seed)
+    if metabolites is None:
+        metabolites = reactions
+    names = ['M_m{0}_c'.format(i) for i in range(metabolites)]
+    cumulative = list(itertools.accumulate(1 / (i + 1) ** hub_skew for i in range(metabolites)))
+
+    network_reactions = []
+    for i in range(reactions):
+        size = rng.randint(2, 6)
+        species = set()
+        while len(species) < size:
+            species.update(rng.choices(names, cum_weights=cumulative, k=size - len(species)))
+        # sorted first, the order of a set depends on the hash seed
+        species = sorted(species)
+        rng.shuffle(species)
+        cut = rng.randint(1, size - 1)
+        network_reactions.append(('R_r{0}'.format(i), rng.random() < reversibility,
+                                  sorted(species[:cut]), sorted(species[cut:])))
+
+    # the seeds are nutrients and cofactors, the targets are the rarer compounds
+    hubs = max(seeds, metabolites // 10)
+    network_seeds = sorted(rng.sample(names[:hubs], seeds))
+    network_targets = sorted(rng.sample(names[hubs:], targets))
+    return {'metabolites': names, 'reactions': network_reactions,
+            'seeds': network_seeds, 'targets': network_targets}
+
+
+def sbml_document(model_id, species, reactions=()):
+    """build a SBML level 2 document
+
+    Args:
+        model_id (str): ID of the model
+        species (list): species IDs
+        reactions (iterable, optional): Defaults to (). (id, reversible, reactants, products) tuples
+
+    Returns:
+        xml.etree.ElementTree.ElementTree: SBML document
+    """
+    sbml = etree.Element('sbml', {'xmlns': SBML_NAMESPACE, 'level': '2', 'version': '1'})
+    model = etree.SubElement(sbml, 'model', {'id': model_id, 'name': model_id})
+    compartments = etree.SubElement(model, 'listOfCompartments')
+    etree.SubElement(compartments, 'compartment', {'id': 'C_c', 'name': 'C_c'})
+    list_of_species = etree.SubElement(model, 'listOfSpecies')
+    for species_id in species:
+        etree.SubElement(list_of_species, 'species', {'id': species_id, 'name': species_id,
+                                                      'compartment': 'C_c'})
+    list_of_reactions = etree.SubElement(model, 'listOfReactions')
+    for reaction_id, reversible, reactants, products in reactions:
+        reaction = etree.SubElement(list_of_reactions, 'reaction',
+                                    {'id': reaction_id, 'name': reaction_id,
+                                     'reversible': 'true' if reversible else 'false'})
+        for tag, references in [('listOfReactants', reactants), ('listOfProducts', products)]:
+            list_of_references = etree.SubElement(reaction, tag)
+            for species_id in references:
+                etree.SubElement(list_of_references, 'speciesReference',
+                                 {'species': species_id, 'stoichiometry': '1'})
+    return etree.ElementTree(sbml)
+
+
+def write_network(directory, reactions, **parameters):
+    """generate a network and write it, its seeds and its targets in SBML
+
+    Args:
+        directory (str): output directory
+        reactions (int): number of reactions
+        **parameters: other arguments of generate_network
+
+    Returns:
+        str, str, str: paths of the network, seeds and targets files
+    """
+    network = generate_network(reactions, **parameters)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, species, network_reactions in [('network', network['metabolites'], network['reactions']),
+                                             ('seeds', network['seeds'], ()),
+                                             ('targets', network['targets'], ())]:
+        path = os.path.join(directory, name + '.sbml')
+        sbml_document(name, species, network_reactions).write(path, encoding='UTF-8', xml_declaration=True)
+        paths.append(path)
+    return tuple(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic metabolic network in SBML.')
+    parser.add_argument('-o', '--output', required=True, help='output directory')
+    parser.add_argument('-r', '--reactions', type=int, required=True, help='number of reactions')
+    parser.add_argument('-m', '--metabolites', type=int, default=None,
+                        help='number of metabolites. Default = number of reactions')
+    parser.add_argument('--reversibility', type=float, default=0.2,
+                        help='ratio of reversible reactions. Default = 0.2')
+    parser.add_argument('--hub-skew', type=float, default=1.0,
+                        help='skew of the metabolite occurrences, 0 for uniform. Default = 1.0')
+    parser.add_argument('--seeds', type=int, default=10, help='number of seeds. Default = 10')
+    parser.add_argument('--targets', type=int, default=10, help='number of targets. Default = 10')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random generator. Default = 0')
+    args = parser.parse_args()
+    for path in write_network(args.output, args.reactions, metabolites=args.metabolites,
+                              reversibility=args.reversibility, hub_skew=args.hub_skew,
+                              seeds=args.seeds, targets=args.targets, seed=args.seed):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
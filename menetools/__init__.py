@@ -12,14 +12,17 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
-from menetools.menescope import run_menescope
+from menetools.menescope import run_menescope, run_menescope_batch
 from menetools.meneacti import run_meneacti
-from menetools.menecheck import run_menecheck
+from menetools.menecheck import run_menecheck, run_menecheck_batch
 from menetools.menecof import run_menecof
 from menetools.menepath import run_menepath
 from menetools.menedead import run_menedead
 from menetools.meneseed import run_meneseed
 from menetools.menescope_inc import run_menescope_inc
+from menetools.menebatch import run_menebatch
+from menetools.meneknockout import run_meneknockout
+from menetools.meneserve import run_meneserve
 
 
 __version__="3.4.0"
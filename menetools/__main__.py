@@ -13,6 +13,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
 import argparse
+import importlib.util
 import logging
 import sys
 
@@ -24,16 +25,25 @@ out_hdlr.setLevel(logging.DEBUG)
 logger.addHandler(out_hdlr)
 logger.propagate = True
 
+# Check ASP solver, clingo is used in-process through its Python module.
+if importlib.util.find_spec('clingo') is None:
+    logger.critical('clingo Python module is not installed, menetools can not work without it.')
+    logger.critical('You can install with: pip install clyngor-with-clingo')
+    sys.exit(1)
+
 from menetools import __version__ as VERSION
-from menetools.menescope import run_menescope
+from menetools.menescope import run_menescope, run_menescope_batch
 from menetools.meneacti import run_meneacti
-from menetools.menecheck import run_menecheck
+from menetools.menecheck import run_menecheck, run_menecheck_batch
 from menetools.menecof import run_menecof
 from menetools.menepath import run_menepath
 from menetools.menedead import run_menedead
 from menetools.meneseed import run_meneseed
 from menetools.menescope_inc import run_menescope_inc
-from shutil import which
+from menetools.menebatch import run_menebatch
+from menetools.meneknockout import run_meneknockout
+from menetools.meneserve import run_meneserve
+from menetools.utils import list_files
 
 LICENSE = """Copyright (C) Clémence Frioux & Arnaud Belcour - Inria Dyliss - Pleiade
 This program is free software: you can redistribute it and/or modify
@@ -53,18 +63,12 @@ MESSAGE = """
 Explore the producibility potential in a metabolic network using the network expansion algorithm.
 """
 REQUIRES = """
-Requires Clingo and clyngor package: "pip install clyngor clyngor-with-clingo"
+Requires the clingo Python module and clyngor package: "pip install clyngor clyngor-with-clingo"
 """
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
-# Check ASP binaries.
-if not which('clingo'):
-    logger.critical('clingo is not in the Path, menetools can not work without it.')
-    logger.critical('You can install with: pip install clyngor-with-clingo')
-    sys.exit(1)
-
 
 def main():
     """Run programm.
@@ -99,6 +103,27 @@ def main():
         help="seeds in SBML format",
         required=True,
     )
+    # Menescope and Menecheck seeds, a single file or a batch of seeds files.
+    parent_parser_s_batch = argparse.ArgumentParser(add_help=False)
+    seeds_group = parent_parser_s_batch.add_mutually_exclusive_group(required=True)
+    seeds_group.add_argument(
+        "-s",
+        "--seeds",
+        dest="seeds",
+        help="seeds in SBML format",
+    )
+    seeds_group.add_argument(
+        "--seeds-dir",
+        dest="seeds_dir",
+        help="directory of seeds SBML files, the network is read once and \
+        the results are written as one json line per seeds file",
+    )
+    seeds_group.add_argument(
+        "--seeds-list",
+        dest="seeds_list",
+        help="text file listing one seeds SBML file per line, the network is \
+        read once and the results are written as one json line per seeds file",
+    )
     parent_parser_t = argparse.ArgumentParser(add_help=False)
     parent_parser_t.add_argument(
         "-t",
@@ -115,7 +140,19 @@ def main():
         required=False,
     )
 
-    # Menepath and Menecof common argument.
+    # Menescope, Meneacti, Menecheck, Menebatch and Menescope_inc common argument.
+    parent_parser_engine = argparse.ArgumentParser(add_help=False)
+    parent_parser_engine.add_argument(
+        "--engine",
+        dest="engine",
+        help="engine computing the network expansion: 'asp' (clingo) \
+        or 'native' (Python forward chaining). Default = asp",
+        required=False,
+        choices=["asp", "native"],
+        default="asp",
+    )
+
+    # Menepath and Menecof common arguments.
     parent_parser_opt_e = argparse.ArgumentParser(add_help=False)
     parent_parser_opt_e.add_argument(
         "--enumerate",
@@ -124,6 +161,98 @@ def main():
         required=False,
         action="store_true",
     )
+    parent_parser_prune = argparse.ArgumentParser(add_help=False)
+    parent_parser_prune.add_argument(
+        "--prune",
+        dest="prune",
+        help="before solving, restrict the network to the reactions producing \
+        predecessors of the targets and, for cofactors and minimal paths, \
+        activated from the seeds (and the cofactors)",
+        required=False,
+        action="store_true",
+    )
+    parent_parser_limits = argparse.ArgumentParser(add_help=False)
+    parent_parser_limits.add_argument(
+        "--time-limit",
+        dest="time_limit",
+        help="seconds given to the solving (of each target for path), after \
+        which the best solution found so far is returned, marked as not \
+        proven optimal. Default = None",
+        required=False,
+        type=float,
+        default=None,
+    )
+    parent_parser_limits.add_argument(
+        "--solve-limit",
+        dest="solve_limit",
+        help="clingo search limit of each solving, <conflicts>[,<restarts>], \
+        after which the best solution found so far is returned. Default = None",
+        required=False,
+        default=None,
+    )
+    parent_parser_threads = argparse.ArgumentParser(add_help=False)
+    parent_parser_threads.add_argument(
+        "--threads",
+        dest="threads",
+        help="number of clingo threads (of each process for path), running \
+        core-guided and model-guided optimisation in parallel. Default = 1",
+        required=False,
+        type=int,
+        default=1,
+    )
+    parent_parser_enumeration = argparse.ArgumentParser(add_help=False)
+    parent_parser_enumeration.add_argument(
+        "--stream-jsonl",
+        dest="stream_jsonl",
+        help="enumerate the solutions and write each one as a json line of this file \
+        as soon as it is found, instead of keeping them in memory",
+        required=False,
+        default=None,
+    )
+    parent_parser_enumeration.add_argument(
+        "--max-solutions",
+        dest="max_solutions",
+        help="maximal number of enumerated solutions (of each target for path). Default = all",
+        required=False,
+        type=int,
+        default=None,
+    )
+    parent_parser_enumeration.add_argument(
+        "--no-project",
+        dest="project",
+        help="do not restrict the enumeration to distinct sets of reactions or cofactors, \
+        which is faster when the encoding has no other choice",
+        required=False,
+        action="store_false",
+        default=True,
+    )
+    parent_parser_profile = argparse.ArgumentParser(add_help=False)
+    parent_parser_profile.add_argument(
+        "--profile",
+        dest="profile",
+        help="log the wall time and peak memory of the phases of the run \
+        (SBML reading, fact loading, grounding, solving, decoding) and add them to the json output",
+        required=False,
+        action="store_true",
+        default=False,
+    )
+    parent_parser_profile.add_argument(
+        "--statistics",
+        dest="statistics",
+        help="log the clingo statistics of the solvings (size of the ground program, \
+        choices, conflicts, models, solving time, proven optimality) and add them to the json output",
+        required=False,
+        action="store_true",
+        default=False,
+    )
+    parent_parser_profile.add_argument(
+        "--profile-trace",
+        dest="profile_trace",
+        help="write the phases of the run in the Chrome trace format, \
+        readable by chrome://tracing or https://ui.perfetto.dev",
+        required=False,
+        default=None,
+    )
 
     # Menecof specific arguments.
     parent_parser_opt_c = argparse.ArgumentParser(add_help=False)
@@ -155,6 +284,17 @@ def main():
         action="store_true",
     )
 
+    parent_parser_opt_p = argparse.ArgumentParser(add_help=False)
+    parent_parser_opt_p.add_argument(
+        "--persist-weights",
+        dest="persist_weights",
+        help="when no cofactors file is given, store the occurrences of the \
+        compounds of the network next to it (DRAFTNET.weights.tsv) and \
+        reuse them in the next runs",
+        required=False,
+        action="store_true",
+    )
+
     # Menepath specific argument.
     parent_parser_opt_m = argparse.ArgumentParser(add_help=False)
     parent_parser_opt_m.add_argument(
@@ -165,6 +305,72 @@ def main():
         action="store_true",
     )
 
+    # Menebatch specific arguments.
+    parent_parser_networks = argparse.ArgumentParser(add_help=False)
+    networks_group = parent_parser_networks.add_mutually_exclusive_group(required=True)
+    networks_group.add_argument(
+        "--networks-dir",
+        dest="networks_dir",
+        help="directory of metabolic networks in SBML format",
+    )
+    networks_group.add_argument(
+        "--networks-list",
+        dest="networks_list",
+        help="text file listing one metabolic network SBML file per line",
+    )
+    parent_parser_processes = argparse.ArgumentParser(add_help=False)
+    parent_parser_processes.add_argument(
+        "--processes",
+        dest="processes",
+        help="number of processes computing the networks (batch), the targets \
+        (path) or the knockouts (knockout) in parallel. Default = number of CPUs",
+        required=False,
+        type=int,
+        default=None,
+    )
+
+    # Meneknockout specific arguments.
+    parent_parser_reactions = argparse.ArgumentParser(add_help=False)
+    parent_parser_reactions.add_argument(
+        "-r",
+        "--reactions",
+        dest="reactions",
+        help="reactions to knock out. Default = all the reactions",
+        required=False,
+        nargs="+",
+    )
+
+    # Meneserve specific arguments.
+    parent_parser_serve = argparse.ArgumentParser(add_help=False)
+    parent_parser_serve.add_argument(
+        "--host",
+        dest="host",
+        help="address to listen to. Default = 127.0.0.1",
+        required=False,
+        default="127.0.0.1",
+    )
+    parent_parser_serve.add_argument(
+        "--port",
+        dest="port",
+        help="port to listen to. Default = 8000",
+        required=False,
+        type=int,
+        default=8000,
+    )
+    parent_parser_serve.add_argument(
+        "--socket",
+        dest="socket",
+        help="Unix socket file to listen to, instead of host and port, not on Windows",
+        required=False,
+    )
+    parent_parser_serve.add_argument(
+        "--preload",
+        dest="preload",
+        help="metabolic networks in SBML format read before listening",
+        required=False,
+        nargs="+",
+    )
+
     # subparsers
     subparsers = parser.add_subparsers(
         title='subcommands',
@@ -175,7 +381,16 @@ def main():
         "acti",
         help="Get activable reactions in a metabolic network, starting from seeds.",
         parents=[
-            parent_parser_d, parent_parser_s, parent_parser_o
+            parent_parser_d, parent_parser_s, parent_parser_o, parent_parser_engine, parent_parser_profile
+        ]
+    )
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="Get the scope, and the producibility of targets, of many metabolic networks with the same seeds, using several processes. The results are merged in one json line per network.",
+        parents=[
+            parent_parser_networks, parent_parser_s, parent_parser_t, parent_parser_o,
+            parent_parser_processes, parent_parser_engine, parent_parser_profile
         ]
     )
 
@@ -183,7 +398,8 @@ def main():
         "check",
         help="Check the producibility of targets from seeds in a metabolic network.",
         parents=[
-            parent_parser_d, parent_parser_s, parent_parser_t, parent_parser_o
+            parent_parser_d, parent_parser_s_batch, parent_parser_t, parent_parser_o,
+            parent_parser_engine, parent_parser_profile
         ]
     )
 
@@ -192,7 +408,9 @@ def main():
         help="Propose cofactor whose producibility could unblock the producibility of targets.",
         parents=[
             parent_parser_d, parent_parser_s, parent_parser_t, parent_parser_opt_c,
-            parent_parser_opt_w, parent_parser_opt_s, parent_parser_opt_e, parent_parser_o
+            parent_parser_opt_w, parent_parser_opt_s, parent_parser_opt_e, parent_parser_o,
+            parent_parser_opt_p, parent_parser_prune, parent_parser_limits,
+            parent_parser_threads, parent_parser_enumeration, parent_parser_profile
         ]
     )
 
@@ -200,7 +418,16 @@ def main():
         "dead",
         help="Identification of dead-end reactions (reactions whose reactants are never consumed or whose reactants are never produced) in metabolic networks.",
         parents=[
-            parent_parser_d, parent_parser_o
+            parent_parser_d, parent_parser_o, parent_parser_profile
+        ]
+    )
+
+    knockout_parser = subparsers.add_parser(
+        "knockout",
+        help="Remove each reaction of a metabolic network in turn and report the compounds lost from the scope and the targets that become unproducible.",
+        parents=[
+            parent_parser_d, parent_parser_s, parent_parser_t, parent_parser_reactions,
+            parent_parser_o, parent_parser_processes, parent_parser_profile
         ]
     )
 
@@ -209,7 +436,9 @@ def main():
         help="Get production pathways of targets in metabolic networks, started from seeds.",
         parents=[
             parent_parser_d, parent_parser_s, parent_parser_t,
-            parent_parser_opt_e, parent_parser_opt_m, parent_parser_o
+            parent_parser_opt_e, parent_parser_opt_m, parent_parser_o,
+            parent_parser_processes, parent_parser_prune, parent_parser_limits,
+            parent_parser_threads, parent_parser_enumeration, parent_parser_profile
         ]
     )
 
@@ -217,7 +446,7 @@ def main():
         "scope",
         help="Get producible metabolites in a metabolic network, starting from seeds. The outputs for menecope are (i) As a control: seeds that were provided but do not appear in the metabolic network., (ii) The _scope_ i.e. compounds that are in the seeds and those that are produced from the seeds, (iii) Two subsets to distinguish seed status. (iii-a) those that can be produced by the metabolic network. For such seeds, the organism would have the metabolic capability to renew the production in addition to what was available in the environement. (iii-b) those that cannot be produced by the metabolic network. For such seeds, there is no alternative other than relying on the environmental composition.",
         parents=[
-            parent_parser_d, parent_parser_s, parent_parser_o
+            parent_parser_d, parent_parser_s_batch, parent_parser_o, parent_parser_engine, parent_parser_profile
         ]
     )
 
@@ -225,7 +454,15 @@ def main():
         "seed",
         help="Get metabolites from exchange reactions in a metabolic network.",
         parents=[
-            parent_parser_d, parent_parser_o
+            parent_parser_d, parent_parser_o, parent_parser_profile
+        ]
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Answer scope, check, acti, path and cof json requests over HTTP, keeping the metabolic networks in memory between requests.",
+        parents=[
+            parent_parser_serve
         ]
     )
 
@@ -233,7 +470,8 @@ def main():
         "scope_inc",
         help="Get the steps of the network expansion to produce either targets or all the producible compounds, starting from seeds.",
         parents=[
-            parent_parser_d, parent_parser_s, parent_parser_t, parent_parser_o
+            parent_parser_d, parent_parser_s, parent_parser_t, parent_parser_o,
+            parent_parser_engine, parent_parser_profile
         ]
     )
 
@@ -245,21 +483,36 @@ def main():
         sys.exit(1)
 
     if args.cmd == "acti":
-        run_meneacti(args.draftnet, args.seeds, args.output)
+        run_meneacti(args.draftnet, args.seeds, args.output, args.engine, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
+    elif args.cmd == "batch":
+        draft_sbmls = list_files(args.networks_dir, args.networks_list)
+        run_menebatch(draft_sbmls, args.seeds, args.targets, args.output, args.processes, args.engine, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
     elif args.cmd == "check":
-        run_menecheck(args.draftnet, args.seeds, args.targets, args.output)
+        if args.seeds:
+            run_menecheck(args.draftnet, args.seeds, args.targets, args.output, args.engine, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
+        else:
+            seeds_sbmls = list_files(args.seeds_dir, args.seeds_list)
+            run_menecheck_batch(args.draftnet, seeds_sbmls, args.targets, args.output, args.engine, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
     elif args.cmd == "cof":
-        run_menecof(args.draftnet, args.seeds, args.targets, args.cofactors, args.weight, args.suffix, args.enumerate, args.output)
+        run_menecof(args.draftnet, args.seeds, args.targets, args.cofactors, args.weight, args.suffix, args.enumerate, args.output, args.persist_weights, args.prune, args.time_limit, args.solve_limit, args.threads, args.stream_jsonl, max_solutions=args.max_solutions, project=args.project, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
     elif args.cmd == "dead":
-        run_menedead(args.draftnet, args.output)
+        run_menedead(args.draftnet, args.output, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
+    elif args.cmd == "knockout":
+        run_meneknockout(args.draftnet, args.seeds, args.targets, args.reactions, args.output, args.processes, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
     elif args.cmd == "path":
-        run_menepath(args.draftnet, args.seeds, args.targets, args.min, args.enumerate, args.output)
+        run_menepath(args.draftnet, args.seeds, args.targets, args.min, args.enumerate, args.output, args.processes, args.prune, args.time_limit, args.solve_limit, args.threads, args.stream_jsonl, max_solutions=args.max_solutions, project=args.project, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
     elif args.cmd == "scope":
-        run_menescope(args.draftnet, args.seeds, args.output)
+        if args.seeds:
+            run_menescope(args.draftnet, args.seeds, args.output, args.engine, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
+        else:
+            seeds_sbmls = list_files(args.seeds_dir, args.seeds_list)
+            run_menescope_batch(args.draftnet, seeds_sbmls, args.output, args.engine, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
     elif args.cmd == "seed":
-        run_meneseed(args.draftnet, args.output)
+        run_meneseed(args.draftnet, args.output, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
+    elif args.cmd == "serve":
+        run_meneserve(args.host, args.port, args.socket, args.preload)
     elif args.cmd == "scope_inc":
-        run_menescope_inc(args.draftnet, args.seeds, args.targets, args.output)
+        run_menescope_inc(args.draftnet, args.seeds, args.targets, args.output, args.engine, profile=args.profile, profile_trace=args.profile_trace, statistics=args.statistics)
     else:
         logger.critical("Invalid commands for mene.")
         parser.print_help()
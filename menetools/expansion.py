@@ -0,0 +1,794 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017-2024 Clémence Frioux & Arnaud Belcour - Inria Dyliss - Pleiade
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""Native Python implementation of the network expansion, computing the same
+fixpoints as the dscope rules of the ASP encodings without calling the solver.
+"""
+
+import heapq
+import logging
+
+from collections import defaultdict, deque
+
+from clyngor.as_pyasp import TermSet
+
+from menetools import profiling
+from menetools.network import Network
+
+logger = logging.getLogger('menetools.expansion')
+
+
+def unquote(argument):
+    """remove the ASP quotes surrounding a string argument
+
+    Args:
+        argument (str or int): argument of an Atom
+
+    Returns:
+        str or int: argument without quotes
+    """
+    if isinstance(argument, str) and len(argument) > 1 and argument[0] == '"' and argument[-1] == '"':
+        return argument[1:-1]
+    return argument
+
+
+def collect(predicate, *termsets):
+    """get the first argument of all atoms of a predicate
+
+    Args:
+        predicate (str): name of the predicate (e.g. seed or target)
+        *termsets (TermSet): ASP termsets to look into
+
+    Returns:
+        set: unquoted arguments
+    """
+    return {unquote(atom.arguments[0]) for termset in termsets for atom in termset
+            if atom.predicate == predicate}
+
+
+class MetabolicGraph:
+    """Reactions of a draft network indexed for the network expansion.
+
+    Reactions are stored with their distinct reactants and products, and
+    each reaction direction (forward, and backward for reversible reactions)
+    is registered as a consumer of its inputs.
+    """
+
+    def __init__(self, draft):
+        """
+        Args:
+            draft (TermSet or Network): dreaction, reversible, reactant and product atoms
+        """
+        self.reactions = set()
+        self.reversible = set()
+        self.reactants = defaultdict(set)
+        self.products = defaultdict(set)
+        # metabolites involved in a reactant or product atom
+        self.metabolites = set()
+        self._index = None
+        self._producers = None
+        if isinstance(draft, Network):
+            for reaction, reversible, reactants, products in draft.items():
+                self.reactions.add(reaction)
+                if reversible:
+                    self.reversible.add(reaction)
+                self.reactants[reaction].update(reactants)
+                self.products[reaction].update(products)
+                self.metabolites.update(reactants)
+                self.metabolites.update(products)
+            return
+        for atom in draft:
+            predicate = atom.predicate
+            if predicate == 'dreaction':
+                self.reactions.add(unquote(atom.arguments[0]))
+            elif predicate == 'reversible':
+                self.reversible.add(unquote(atom.arguments[0]))
+            elif predicate == 'reactant':
+                metabolite = unquote(atom.arguments[0])
+                self.reactants[unquote(atom.arguments[1])].add(metabolite)
+                self.metabolites.add(metabolite)
+            elif predicate == 'product':
+                metabolite = unquote(atom.arguments[0])
+                self.products[unquote(atom.arguments[1])].add(metabolite)
+                self.metabolites.add(metabolite)
+
+    def directions(self, reaction):
+        """get the directions in which a reaction can be fired
+
+        Args:
+            reaction (str): reaction ID
+
+        Returns:
+            list: (inputs, outputs) tuples
+        """
+        directions = [(self.reactants[reaction], self.products[reaction])]
+        if reaction in self.reversible:
+            directions.append((self.products[reaction], self.reactants[reaction]))
+        return directions
+
+    def index(self):
+        """register each reaction direction as a consumer of its inputs
+
+        The index is computed once and shared by the successive expansions of
+        the graph.
+
+        Returns:
+            list, list, dict, list: number of inputs and (reaction, outputs) of
+            each direction, directions consuming each metabolite and directions
+            without inputs
+        """
+        if self._index is None:
+            missing = []
+            outputs = []
+            consumers = defaultdict(list)
+            ready = []
+            for reaction in self.reactions:
+                for inputs, products in self.directions(reaction):
+                    direction = len(missing)
+                    missing.append(len(inputs))
+                    outputs.append((reaction, products))
+                    if inputs:
+                        for metabolite in inputs:
+                            consumers[metabolite].append(direction)
+                    else:
+                        ready.append(direction)
+            self._index = missing, outputs, consumers, ready
+        return self._index
+
+    def expand(self, seeds):
+        """compute the scope of seeds by forward chaining
+
+        Each reaction direction keeps the number of its inputs that are not yet
+        in the scope and is fired when this number reaches zero, so each
+        metabolite and each reaction is visited once.
+
+        Args:
+            seeds (set): metabolites initiating the expansion
+
+        Returns:
+            set, set: producible metabolites and activated reactions
+        """
+        missing, outputs, consumers, ready = self.index()
+        missing = list(missing)
+
+        scope = set()
+        activated = set()
+        queue = deque()
+
+        def add(metabolites):
+            for metabolite in metabolites:
+                if metabolite not in scope:
+                    scope.add(metabolite)
+                    queue.append(metabolite)
+
+        def fire(direction):
+            reaction, products = outputs[direction]
+            activated.add(reaction)
+            add(products)
+
+        add(seeds)
+        for direction in ready:
+            fire(direction)
+        while queue:
+            metabolite = queue.popleft()
+            for direction in consumers.get(metabolite, ()):
+                missing[direction] -= 1
+                if missing[direction] == 0:
+                    fire(direction)
+        return scope, activated
+
+    def expand_layers(self, seeds, targets=None):
+        """compute the scope of seeds layer by layer, as the incmode steps of
+        get_incremental_scope.lp
+
+        The seeds are at step 0 and the reaction directions whose inputs are
+        all producible at step t - 1 are fired at step t. The expansion stops
+        when all targets are producible, or at the fixpoint, so it always
+        terminates and each metabolite and reaction is visited once.
+
+        Args:
+            seeds (set): metabolites initiating the expansion
+            targets (set, optional): Defaults to None. metabolites to reach
+
+        Returns:
+            dict, dict: first step of each producible metabolite and of each activated reaction
+        """
+        missing, outputs, consumers, ready = self.index()
+        missing = list(missing)
+
+        metabolite_steps = dict.fromkeys(seeds, 0)
+        reaction_steps = {}
+        remaining = set(targets or ()) - metabolite_steps.keys()
+        frontier = list(metabolite_steps)
+        # directions without inputs are fired at the first step
+        firing = list(ready)
+        step = 0
+        while not targets or remaining:
+            for metabolite in frontier:
+                for direction in consumers.get(metabolite, ()):
+                    missing[direction] -= 1
+                    if missing[direction] == 0:
+                        firing.append(direction)
+            if not firing:
+                break
+            step += 1
+            frontier = []
+            for direction in firing:
+                reaction, products = outputs[direction]
+                reaction_steps.setdefault(reaction, step)
+                for metabolite in products:
+                    if metabolite not in metabolite_steps:
+                        metabolite_steps[metabolite] = step
+                        frontier.append(metabolite)
+                        remaining.discard(metabolite)
+            firing = []
+        return metabolite_steps, reaction_steps
+
+    def predecessors(self, targets):
+        """get the metabolites and reactions from which targets can be reached,
+        as predecessor/2 of get_paths.lp: the inputs of a reaction direction
+        are predecessors when one of its outputs is
+
+        Args:
+            targets (set): target metabolites
+
+        Returns:
+            set, set: predecessor metabolites and reactions producing a predecessor
+        """
+        if self._producers is None:
+            self._producers = defaultdict(list)
+            for reaction in self.reactions:
+                for inputs, outputs in self.directions(reaction):
+                    for metabolite in outputs:
+                        self._producers[metabolite].append((reaction, inputs))
+        metabolites = set(targets)
+        reactions = set()
+        queue = deque(metabolites)
+        while queue:
+            metabolite = queue.popleft()
+            for reaction, inputs in self._producers.get(metabolite, ()):
+                reactions.add(reaction)
+                for predecessor in inputs:
+                    if predecessor not in metabolites:
+                        metabolites.add(predecessor)
+                        queue.append(predecessor)
+        return metabolites, reactions
+
+
+def as_model(**predicates):
+    """format sets of arguments like a clingo model read by_arity
+
+    Args:
+        **predicates (iterable): unary atoms arguments for each predicate
+
+    Returns:
+        dict: model indexed by predicate, (predicate, arity) and predicate/arity
+    """
+    model = {}
+    for predicate, arguments in predicates.items():
+        arguments = frozenset((argument,) for argument in arguments)
+        if arguments:
+            model[predicate] = arguments
+            model[predicate, 1] = arguments
+            model[predicate + '/1'] = arguments
+    return model
+
+
+def scope_model(graph, seeds):
+    """compute the get_scope.lp model of seeds in an indexed network
+
+    Args:
+        graph (MetabolicGraph): metabolic network
+        seeds (TermSet): seed atoms
+
+    Returns:
+        dict: dscope, produced_seed, non_produced_seed, absent_seed and activated atoms
+    """
+    seeds = collect('seed', seeds)
+    true_seeds = seeds & graph.metabolites
+    scope, activated = graph.expand(true_seeds)
+
+    produced_seeds = set()
+    for reaction in activated:
+        produced_seeds.update(graph.products[reaction] & true_seeds)
+        if reaction in graph.reversible:
+            produced_seeds.update(graph.reactants[reaction] & true_seeds)
+
+    return as_model(dscope=scope, produced_seed=produced_seeds,
+                    non_produced_seed=true_seeds - produced_seeds,
+                    absent_seed=seeds - true_seeds, activated=activated)
+
+
+def acti_model(graph, seeds):
+    """compute the get_activated.lp model of seeds in an indexed network
+
+    Args:
+        graph (MetabolicGraph): metabolic network
+        seeds (TermSet): seed atoms
+
+    Returns:
+        dict: activ atoms
+    """
+    scope, activated = graph.expand(collect('seed', seeds))
+    return as_model(activ=activated)
+
+
+def unproducible_model(graph, seeds, targets):
+    """compute the get_unproducible_targets.lp model in an indexed network
+
+    Args:
+        graph (MetabolicGraph): metabolic network
+        seeds (TermSet): seed atoms
+        targets (TermSet): target atoms
+
+    Returns:
+        dict: unproducible_target and producible_target atoms
+    """
+    scope, activated = graph.expand(collect('seed', seeds, targets))
+    targets = collect('target', seeds, targets)
+    return as_model(unproducible_target=targets - scope,
+                    producible_target=targets & scope)
+
+
+@profiling.timed
+def get_scope(draft, seeds):
+    """native equivalent of query.get_scope (get_scope.lp)
+
+    Args:
+        draft (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+
+    Returns:
+        dict: dscope, produced_seed, non_produced_seed, absent_seed and activated atoms
+    """
+    return scope_model(MetabolicGraph(draft), seeds)
+
+
+def get_scope_batch(draft, seeds_list):
+    """native equivalent of query.get_scope_batch, indexing the network once
+
+    Args:
+        draft (TermSet or Network): metabolic network
+        seeds_list (list): seed TermSets
+
+    Yields:
+        dict: get_scope model of each seed TermSet
+    """
+    graph = MetabolicGraph(draft)
+    for seeds in seeds_list:
+        yield scope_model(graph, seeds)
+
+
+@profiling.timed
+def get_acti(draft, seeds):
+    """native equivalent of query.get_acti (get_activated.lp)
+
+    Args:
+        draft (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+
+    Returns:
+        dict: activ atoms
+    """
+    return acti_model(MetabolicGraph(draft), seeds)
+
+
+@profiling.timed
+def get_unproducible(draft, seeds, targets):
+    """native equivalent of query.get_unproducible (get_unproducible_targets.lp)
+
+    As for the ASP version, seeds and targets are recognized by their
+    predicate so the order of the two termsets does not matter.
+
+    Args:
+        draft (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+        targets (TermSet): target atoms
+
+    Returns:
+        dict: unproducible_target and producible_target atoms
+    """
+    return unproducible_model(MetabolicGraph(draft), seeds, targets)
+
+
+def get_unproducible_batch(draft, targets, seeds_list):
+    """native equivalent of query.get_unproducible_batch, indexing the network once
+
+    Args:
+        draft (TermSet or Network): metabolic network
+        targets (TermSet): target atoms
+        seeds_list (list): seed TermSets
+
+    Yields:
+        dict: get_unproducible model of each seed TermSet
+    """
+    graph = MetabolicGraph(draft)
+    for seeds in seeds_list:
+        yield unproducible_model(graph, seeds, targets)
+
+
+@profiling.timed
+def get_inc_scope(draft, seeds, targets=None):
+    """native equivalent of query.get_inc_scope (get_incremental_scope.lp),
+    with the steps of the activated reactions
+
+    Unlike the ASP version, the expansion stops at the fixpoint when some
+    targets are unproducible, and without targets it needs no previous
+    computation of the scope size.
+
+    Args:
+        draft (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+        targets (TermSet, optional): Defaults to None. target atoms
+
+    Returns:
+        dict: dscope and activated atoms, with their first step
+    """
+    graph = MetabolicGraph(draft)
+    metabolite_steps, reaction_steps = graph.expand_layers(
+        collect('seed', seeds), collect('target', targets) if targets else None)
+    model = {}
+    for predicate, steps in [('dscope', metabolite_steps), ('activated', reaction_steps)]:
+        arguments = frozenset(steps.items())
+        if arguments:
+            model[predicate] = arguments
+            model[predicate, 2] = arguments
+            model[predicate + '/2'] = arguments
+    return model
+
+
+@profiling.timed
+def prune_network(graph, seeds, targets, cofactors=None, forward=True):
+    """restrict a network to the reactions that can take part in the production
+    of targets, before solving the path or cofactor encodings
+
+    A reaction is kept if it produces a predecessor of a target (backward
+    reachability) and, when forward is True, if it is activated from the seeds
+    and the cofactors (forward reachability). Cofactors that are not
+    predecessors of a target can not change the production of targets and
+    are removed.
+
+    Args:
+        graph (MetabolicGraph): metabolic network
+        seeds (TermSet): seed atoms
+        targets (TermSet): target atoms
+        cofactors (TermSet, optional): Defaults to None. cofactor atoms, with or without weights
+        forward (bool, optional): Defaults to True. also remove the reactions that are not activated
+
+    Returns:
+        Network, TermSet, dict: pruned network, pruned cofactors (None if not
+        given) and numbers of kept and removed reactions, metabolites and cofactors
+    """
+    metabolites, reactions = graph.predecessors(collect('target', targets))
+    if forward:
+        sources = collect('seed', seeds)
+        if cofactors is not None:
+            sources |= collect('cofactor', cofactors)
+        scope, activated = graph.expand(sources)
+        reactions &= activated
+
+    network = Network()
+    for reaction in sorted(reactions):
+        network.add_reaction(reaction, reaction in graph.reversible,
+                             sorted(graph.reactants[reaction]), sorted(graph.products[reaction]))
+    report = {'kept_reactions': len(network.reactions),
+              'removed_reactions': len(graph.reactions) - len(network.reactions),
+              'kept_metabolites': len(network.metabolites),
+              'removed_metabolites': len(graph.metabolites) - len(network.metabolites)}
+    if cofactors is not None:
+        cofactors_list = list(cofactors)
+        cofactors = TermSet(atom for atom in cofactors_list if unquote(atom.arguments[0]) in metabolites)
+        report['kept_cofactors'] = len(cofactors)
+        report['removed_cofactors'] = len(cofactors_list) - len(cofactors)
+    return network, cofactors, report
+
+
+class ScopeState:
+    """Scope and activated reactions of a network, maintained incrementally
+    while seeds and reactions are added or removed.
+
+    The semantics are the ones of get_scope.lp. Additions are propagated
+    forward from the new facts. Each metabolite of the scope has a rank,
+    0 for seeds, and is produced by an activated reaction whose inputs all
+    have a lower rank. When a fact is removed, the metabolites that lost
+    such a support are deleted in the order of their ranks, then the ones
+    still produced by an activated reaction are derived again. Each edit
+    only visits the part of the network it affects.
+    """
+
+    def __init__(self, draft=None, seeds=None):
+        """
+        Args:
+            draft (TermSet, optional): Defaults to None. dreaction, reversible, reactant and product atoms
+            seeds (TermSet, optional): Defaults to None. seed atoms
+        """
+        # reaction -> (reactants, products, reversible)
+        self.reactions = {}
+        self.seeds = set()
+        self.scope = set()
+        self.activated = set()
+        # rank of each metabolite of the scope
+        self._rank = {}
+        # number of reactions in which each metabolite is a reactant or a product
+        self._occurrences = defaultdict(int)
+        # directions are (reaction, forward) tuples
+        self._missing = {}
+        self._consumers = defaultdict(set)
+        self._producers = defaultdict(set)
+        self._enabled = defaultdict(int)
+        self._changes = None
+        if draft is not None:
+            graph = MetabolicGraph(draft)
+            for reaction in graph.reactions:
+                self.add_reaction(reaction, graph.reactants[reaction], graph.products[reaction],
+                                  reaction in graph.reversible)
+        if seeds is not None:
+            for seed in collect('seed', seeds):
+                self.add_seed(seed)
+
+    def is_true_seed(self, metabolite):
+        """check that a metabolite is a seed involved in a reaction
+
+        Args:
+            metabolite (str): metabolite ID
+
+        Returns:
+            bool: True if the metabolite is a true_seed of get_scope.lp
+        """
+        return metabolite in self.seeds and self._occurrences[metabolite] > 0
+
+    def add_seed(self, seed):
+        """add a seed and the metabolites it makes producible
+
+        Args:
+            seed (str): metabolite ID
+
+        Returns:
+            dict: scope_added, scope_removed, activated_added and activated_removed sets
+        """
+        self._start()
+        self.seeds.add(seed)
+        if self.is_true_seed(seed):
+            self._derive([(seed, 0)])
+        return self._delta()
+
+    def remove_seed(self, seed):
+        """remove a seed and the metabolites that were only producible thanks to it
+
+        Args:
+            seed (str): metabolite ID
+
+        Returns:
+            dict: scope_added, scope_removed, activated_added and activated_removed sets
+        """
+        self._start()
+        if seed in self.seeds:
+            self.seeds.discard(seed)
+            self._rederive(self._delete([seed]))
+        return self._delta()
+
+    def add_reaction(self, reaction, reactants, products, reversible=False):
+        """add a reaction, or replace the reaction with the same ID
+
+        Args:
+            reaction (str): reaction ID
+            reactants (iterable): reactant IDs
+            products (iterable): product IDs
+            reversible (bool, optional): Defaults to False. reversible reaction
+
+        Returns:
+            dict: scope_added, scope_removed, activated_added and activated_removed sets
+        """
+        self._start()
+        if reaction in self.reactions:
+            self._remove_reaction(reaction)
+        reactants = frozenset(reactants)
+        products = frozenset(products)
+        self.reactions[reaction] = (reactants, products, reversible)
+        new_seeds = []
+        for metabolite in reactants | products:
+            self._occurrences[metabolite] += 1
+            if self._occurrences[metabolite] == 1 and metabolite in self.seeds:
+                new_seeds.append((metabolite, 0))
+        enabled = []
+        for direction, inputs, outputs in self._directions(reaction):
+            self._missing[direction] = len(inputs - self.scope)
+            for metabolite in inputs:
+                self._consumers[metabolite].add(direction)
+            for metabolite in outputs:
+                self._producers[metabolite].add(direction)
+            if self._missing[direction] == 0:
+                enabled.append(direction)
+        for direction in enabled:
+            self._enable(direction)
+        self._derive(new_seeds + [(metabolite, self._output_rank(direction)) for direction in enabled
+                                  for metabolite in self._outputs(direction)])
+        return self._delta()
+
+    def remove_reaction(self, reaction):
+        """remove a reaction and the metabolites that were only producible thanks to it
+
+        Args:
+            reaction (str): reaction ID
+
+        Returns:
+            dict: scope_added, scope_removed, activated_added and activated_removed sets
+        """
+        self._start()
+        if reaction in self.reactions:
+            self._remove_reaction(reaction)
+        return self._delta()
+
+    def model(self):
+        """get the current state as the model of get_scope.lp
+
+        Returns:
+            dict: dscope, produced_seed, non_produced_seed, absent_seed and activated atoms
+        """
+        true_seeds = set(seed for seed in self.seeds if self.is_true_seed(seed))
+        produced_seeds = set()
+        for reaction in self.activated:
+            reactants, products, reversible = self.reactions[reaction]
+            produced_seeds.update(products & true_seeds)
+            if reversible:
+                produced_seeds.update(reactants & true_seeds)
+        return as_model(dscope=self.scope, produced_seed=produced_seeds,
+                        non_produced_seed=true_seeds - produced_seeds,
+                        absent_seed=self.seeds - true_seeds, activated=self.activated)
+
+    def _directions(self, reaction):
+        reactants, products, reversible = self.reactions[reaction]
+        directions = [((reaction, True), reactants, products)]
+        if reversible:
+            directions.append(((reaction, False), products, reactants))
+        return directions
+
+    def _inputs(self, direction):
+        reactants, products, reversible = self.reactions[direction[0]]
+        return reactants if direction[1] else products
+
+    def _outputs(self, direction):
+        reactants, products, reversible = self.reactions[direction[0]]
+        return products if direction[1] else reactants
+
+    def _output_rank(self, direction):
+        return max((self._rank[metabolite] for metabolite in self._inputs(direction)), default=-1) + 1
+
+    def _remove_reaction(self, reaction):
+        removed = []
+        for direction, inputs, outputs in self._directions(reaction):
+            if self._missing[direction] == 0:
+                self._disable(direction)
+                removed.extend(outputs)
+            for metabolite in inputs:
+                self._consumers[metabolite].discard(direction)
+            for metabolite in outputs:
+                self._producers[metabolite].discard(direction)
+            del self._missing[direction]
+        reactants, products, reversible = self.reactions.pop(reaction)
+        for metabolite in reactants | products:
+            self._occurrences[metabolite] -= 1
+            if self._occurrences[metabolite] == 0:
+                # the metabolite is no longer a true seed
+                removed.append(metabolite)
+        self._rederive(self._delete(removed))
+
+    def _start(self):
+        self._changes = {}
+
+    def _touch(self, kind, element, present):
+        if (kind, element) not in self._changes:
+            self._changes[kind, element] = present
+
+    def _delta(self):
+        """get the changes of scope and activated reactions of the current edit
+
+        Returns:
+            dict: sets of metabolites added to and removed from the scope, and of
+            reactions activated and deactivated
+        """
+        delta = {'scope_added': set(), 'scope_removed': set(),
+                 'activated_added': set(), 'activated_removed': set()}
+        for (kind, element), present in self._changes.items():
+            current = self.scope if kind == 'scope' else self.activated
+            if element in current and not present:
+                delta[kind + '_added'].add(element)
+            elif element not in current and present:
+                delta[kind + '_removed'].add(element)
+        self._changes = None
+        return delta
+
+    def _enable(self, direction):
+        reaction = direction[0]
+        self._enabled[reaction] += 1
+        if self._enabled[reaction] == 1:
+            self._touch('activated', reaction, False)
+            self.activated.add(reaction)
+
+    def _disable(self, direction):
+        reaction = direction[0]
+        self._enabled[reaction] -= 1
+        if self._enabled[reaction] == 0:
+            del self._enabled[reaction]
+            self._touch('activated', reaction, True)
+            self.activated.discard(reaction)
+
+    def _derive(self, metabolites):
+        """add (metabolite, rank) tuples to the scope and propagate them forward"""
+        queue = deque(metabolites)
+        while queue:
+            metabolite, rank = queue.popleft()
+            if metabolite in self.scope:
+                continue
+            self._touch('scope', metabolite, False)
+            self.scope.add(metabolite)
+            self._rank[metabolite] = rank
+            for direction in self._consumers[metabolite]:
+                self._missing[direction] -= 1
+                if self._missing[direction] == 0:
+                    self._enable(direction)
+                    output_rank = self._output_rank(direction)
+                    queue.extend((output, output_rank) for output in self._outputs(direction))
+
+    def _supported(self, metabolite):
+        """check that a metabolite is a true seed or is produced by an activated
+        reaction whose inputs all have a lower rank"""
+        if self.is_true_seed(metabolite):
+            return True
+        rank = self._rank[metabolite]
+        return any(self._missing[direction] == 0
+                   and all(self._rank[input] < rank for input in self._inputs(direction))
+                   for direction in self._producers[metabolite])
+
+    def _delete(self, metabolites):
+        """remove from the scope the metabolites that lost their support, and
+        the ones that depended on them, in the order of their ranks
+
+        Returns:
+            set: deleted metabolites
+        """
+        deleted = set()
+        heap = [(self._rank[metabolite], metabolite) for metabolite in set(metabolites) if metabolite in self.scope]
+        heapq.heapify(heap)
+        while heap:
+            rank, metabolite = heapq.heappop(heap)
+            if metabolite not in self.scope or self._supported(metabolite):
+                continue
+            self._touch('scope', metabolite, True)
+            self.scope.discard(metabolite)
+            del self._rank[metabolite]
+            deleted.add(metabolite)
+            for direction in self._consumers[metabolite]:
+                if self._missing[direction] == 0:
+                    self._disable(direction)
+                    for output in self._outputs(direction):
+                        if output in self.scope:
+                            heapq.heappush(heap, (self._rank[output], output))
+                self._missing[direction] += 1
+        return deleted
+
+    def _rederive(self, deleted):
+        """derive again the deleted metabolites that are still produced"""
+        metabolites = []
+        for metabolite in deleted:
+            if self.is_true_seed(metabolite):
+                metabolites.append((metabolite, 0))
+                continue
+            ranks = [self._output_rank(direction) for direction in self._producers[metabolite]
+                     if self._missing[direction] == 0]
+            if ranks:
+                metabolites.append((metabolite, min(ranks)))
+        self._derive(metabolites)
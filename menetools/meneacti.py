@@ -19,26 +19,31 @@ import json
 import logging
 import sys
 
-from menetools import query, sbml
+from menetools import expansion, query, sbml, profiling
 from xml.etree.ElementTree import ParseError
 
 logger = logging.getLogger('menetools.meneacti')
 
 
-def run_meneacti(draft_sbml,seeds_sbml,output=None):
+@profiling.profiled
+def run_meneacti(draft_sbml,seeds_sbml,output=None,engine='asp'):
     """get activable reactions in a metabolic network, starting from seeds
     
     Args:
         draft_sbml (str): SBML metabolic network file
         seeds_sbml (str): SBML seeds file
         output (str): path to json output file
+        engine (str, optional): Defaults to 'asp'. 'asp' to use clingo, 'native' for the Python expansion
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
 
     Returns:
         list: activable reactions
     """
     logger.info(f'Reading draft network from {draft_sbml}')
     try:
-        draftnet = sbml.readSBMLnetwork_clyngor(draft_sbml, 'draft')
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
     except FileNotFoundError:
         logger.critical(f'File not found: {draft_sbml}')
         sys.exit(1)
@@ -58,19 +63,36 @@ def run_meneacti(draft_sbml,seeds_sbml,output=None):
 
     logger.info('\nChecking reaction activation in metabolic network')
     sys.stdout.flush()
-    model = query.get_acti(draftnet, seeds)
-    activ = []
-    for pred in model:
-        if pred == 'activ':
-            for a in model[pred, 1]:
-                activ.append(a[0])
+    if engine == 'native':
+        model = expansion.get_acti(draftnet, seeds)
+    else:
+        model = query.get_acti(draftnet, seeds)
+    activ = acti_results(model)['activ']
     logger.info(' ' + str(len(activ)) + ' activable reactions:')
     logger.info('\n'.join(activ))
 
     results = {}
     results['activ'] = activ
+    profiling.add_report(results)
     if output:
         with open(output, "w") as output_file:
             json.dump(results, output_file, indent=True, sort_keys=True)
 
     return activ
+
+
+def acti_results(model):
+    """format a get_acti model
+
+    Args:
+        model (dict): model of query.get_acti or expansion.get_acti
+
+    Returns:
+        dict: activ list
+    """
+    activ = []
+    for pred in model:
+        if pred == 'activ':
+            for a in model[pred, 1]:
+                activ.append(a[0])
+    return {'activ': activ}
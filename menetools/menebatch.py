@@ -0,0 +1,173 @@
+#!python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017-2024 Clémence Frioux & Arnaud Belcour - Inria Dyliss - Pleiade
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+from menetools import expansion, query, sbml, profiling
+from menetools.menecheck import check_results
+from menetools.menescope import scope_results
+from xml.etree.ElementTree import ParseError
+
+logger = logging.getLogger('menetools.menebatch')
+
+# seeds, targets and engine shared by all the networks of a worker
+shared = {}
+
+
+def init_worker(seeds, targets, engine, instrumentation=(False, False)):
+    """store the inputs shared by all networks, sent once to each worker
+
+    Args:
+        seeds (TermSet): seed atoms
+        targets (TermSet): target atoms, None to only compute the scope
+        engine (str): 'asp' or 'native'
+        instrumentation (tuple, optional): Defaults to (False, False). profiling.worker_settings of the run
+    """
+    profiling.init_worker(instrumentation)
+    shared['seeds'] = seeds
+    shared['targets'] = targets
+    shared['engine'] = engine
+
+
+@profiling.worker_task
+def run_network(draft_sbml):
+    """compute the scope, and the producibility of targets, of one network
+
+    Args:
+        draft_sbml (str): SBML metabolic network file
+
+    Returns:
+        dict: menescope (and menecheck) results of the network, or the error
+        preventing to read it
+    """
+    seeds = shared['seeds']
+    targets = shared['targets']
+    engine = shared['engine']
+    results = {'network': draft_sbml}
+    try:
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
+    except FileNotFoundError:
+        results['error'] = f'File not found: {draft_sbml}'
+        return results
+    except ParseError:
+        results['error'] = f'Invalid syntax in SBML file: {draft_sbml}'
+        return results
+    except SystemExit:
+        results['error'] = f'Invalid SBML file: {draft_sbml}'
+        return results
+
+    if engine == 'native':
+        graph = expansion.MetabolicGraph(draftnet)
+        del draftnet
+        results.update(scope_results(expansion.scope_model(graph, seeds)))
+        if targets is not None:
+            results.update(check_results(expansion.unproducible_model(graph, seeds, targets)))
+    else:
+        results.update(scope_results(query.get_scope(draftnet, seeds)))
+        if targets is not None:
+            results.update(check_results(query.get_unproducible(draftnet, targets, seeds)))
+    return results
+
+
+@profiling.profiled
+def run_menebatch(draft_sbmls,seeds_sbml,targets_sbml=None,output=None,processes=None,engine='asp'):
+    """get the scope, and the producibility of targets, of many metabolic networks
+    with the same seeds, spreading the networks over a pool of processes
+
+    Args:
+        draft_sbmls (list): SBML metabolic network files
+        seeds_sbml (str): SBML seeds file
+        targets_sbml (str, optional): Defaults to None. SBML targets file
+        output (str, optional): Defaults to None. path to jsonl output file, one line per network
+        processes (int, optional): Defaults to None. number of processes, all the CPUs if None
+        engine (str, optional): Defaults to 'asp'. 'asp' to use clingo, 'native' for the Python expansion
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
+
+    Returns:
+        dict: menescope (and menecheck) results for each network
+    """
+    logger.info(f'Reading seeds from {seeds_sbml}')
+    try:
+        seeds = sbml.readSBMLspecies_clyngor(seeds_sbml,'seed')
+    except FileNotFoundError:
+        logger.critical(f'File not found: {seeds_sbml}')
+        sys.exit(1)
+    except ParseError:
+        logger.critical(f'Invalid syntax in SBML file: {seeds_sbml}')
+        sys.exit(1)
+
+    targets = None
+    if targets_sbml:
+        logger.info(f'Reading targets from {targets_sbml}')
+        try:
+            targets = sbml.readSBMLspecies_clyngor(targets_sbml, 'target')
+        except FileNotFoundError:
+            logger.critical(f"File not found: {targets_sbml}")
+            sys.exit(1)
+        except ParseError:
+            logger.critical(f"Invalid syntax in SBML file: {targets_sbml}")
+            sys.exit(1)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(draft_sbmls)))
+    logger.info(f'\nComputing {len(draft_sbmls)} networks with {processes} processes')
+    sys.stdout.flush()
+
+    all_results = {}
+    output_file = open(output, "w") if output else None
+    pool = None
+    try:
+        if processes == 1:
+            init_worker(seeds, targets, engine, profiling.worker_settings())
+            network_results = map(run_network, draft_sbmls)
+        else:
+            # Seeds and targets are sent once to each worker and the networks
+            # one by one, so that a worker only holds the network it computes.
+            pool = multiprocessing.Pool(processes, initializer=init_worker,
+                                        initargs=(seeds, targets, engine, profiling.worker_settings()))
+            network_results = pool.imap(run_network, draft_sbmls)
+        for results in network_results:
+            draft_sbml = results.pop('network')
+            profiling.merge(results)
+            if 'error' in results:
+                logger.warning(results['error'])
+            elif targets is not None:
+                logger.info(f"{draft_sbml}: {len(results['scope'])} compounds on scope, "
+                            f"{len(results['producible_target'])} producible targets")
+            else:
+                logger.info(f"{draft_sbml}: {len(results['scope'])} compounds on scope")
+            all_results[draft_sbml] = results
+            if output_file:
+                output_file.write(json.dumps({'network': draft_sbml, **results}, sort_keys=True) + '\n')
+                output_file.flush()
+        if output_file:
+            profiling.write_report_line(output_file)
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+        if output_file:
+            output_file.close()
+
+    return all_results
@@ -19,13 +19,14 @@ import json
 import logging
 import sys
 
-from menetools import utils, query, sbml
+from menetools import utils, expansion, query, sbml, profiling
 from xml.etree.ElementTree import ParseError
 
 logger = logging.getLogger('menetools.menecheck')
 
 
-def run_menecheck(draft_sbml,seeds_sbml,targets_sbml,output=None):
+@profiling.profiled
+def run_menecheck(draft_sbml,seeds_sbml,targets_sbml,output=None,engine='asp'):
     """checks the producibility of targets from seeds in a metabolic network
     
     Args:
@@ -33,13 +34,17 @@ def run_menecheck(draft_sbml,seeds_sbml,targets_sbml,output=None):
         seeds_sbml (str): SBML file
         targets_sbml (str): SBML file
         output (str): path to json output file
+        engine (str, optional): Defaults to 'asp'. 'asp' to use clingo, 'native' for the Python expansion
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
 
     Returns:
         list, list: model, lists of unproducible and producibile targets
     """
     logger.info(f'Reading draft network from {draft_sbml}')
     try:
-        draftnet = sbml.readSBMLnetwork_clyngor(draft_sbml, 'draft')
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
     except FileNotFoundError:
         logger.critical(f'File not found: {draft_sbml}')
         sys.exit(1)
@@ -69,27 +74,120 @@ def run_menecheck(draft_sbml,seeds_sbml,targets_sbml,output=None):
 
     logger.info('\nChecking draftnet for unproducible targets')
     print(f'Number of targets: {len(targets)}')
-    model = query.get_unproducible(draftnet, targets, seeds)
-    unprod = []
-    prod = []
-    for pred in model :
-        if pred == 'unproducible_target':
-            for a in model[pred, 1]:
-                unprod.append(a[0])
-        elif pred == 'producible_target':
-            for a in model[pred, 1]:
-                prod.append(a[0])
+    if engine == 'native':
+        model = expansion.get_unproducible(draftnet, targets, seeds)
+    else:
+        model = query.get_unproducible(draftnet, targets, seeds)
+    results = check_results(model)
+    unprod = results['unproducible_target']
+    prod = results['producible_target']
     logger.info(f'\n{len(prod)} producible targets:')
     logger.info('\n'.join(prod))
     logger.info(f"\n{len(unprod)} unproducible targets:")
     logger.info('\n'.join(unprod))
 
-    results = {}
-    results['producible_target'] = prod
-    results['unproducible_target'] = unprod
+    profiling.add_report(results)
     if output:
         with open(output, "w") as output_file:
             json.dump(results, output_file, indent=True, sort_keys=True)
 
     utils.clean_up()
     return unprod, prod
+
+
+@profiling.profiled
+def run_menecheck_batch(draft_sbml,seeds_sbmls,targets_sbml,output=None,engine='asp'):
+    """checks the producibility of targets in a metabolic network for several sets
+    of seeds, reading (and with the asp engine, grounding) the network only once
+    
+    Args:
+        draft_sbml (str): metabolic network SBML file
+        seeds_sbmls (list): SBML seeds files
+        targets_sbml (str): SBML file
+        output (str): path to jsonl output file, one line per seeds file
+        engine (str, optional): Defaults to 'asp'. 'asp' to use clingo, 'native' for the Python expansion
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
+
+    Returns:
+        dict: producible and unproducible targets for each seeds file
+    """
+    logger.info(f'Reading draft network from {draft_sbml}')
+    try:
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
+    except FileNotFoundError:
+        logger.critical(f'File not found: {draft_sbml}')
+        sys.exit(1)
+    except ParseError:
+        logger.critical(f'Invalid syntax in SBML file: {draft_sbml}')
+        sys.exit(1)
+
+    logger.info(f'Reading {len(seeds_sbmls)} seeds files')
+    seeds_list = []
+    for seeds_sbml in seeds_sbmls:
+        try:
+            seeds_list.append(sbml.readSBMLspecies_clyngor(seeds_sbml,'seed'))
+        except FileNotFoundError:
+            logger.critical(f'File not found: {seeds_sbml}')
+            sys.exit(1)
+        except ParseError:
+            logger.critical(f'Invalid syntax in SBML file: {seeds_sbml}')
+            sys.exit(1)
+
+    logger.info(f'Reading targets from {targets_sbml}')
+    try:
+        targets = sbml.readSBMLspecies_clyngor(targets_sbml, 'target')
+    except FileNotFoundError:
+        logger.critical(f"File not found: {targets_sbml}")
+        sys.exit(1)
+    except ParseError:
+        logger.critical(f"Invalid syntax in SBML file: {targets_sbml}")
+        sys.exit(1)
+
+    logger.info('\nChecking draftnet for unproducible targets for each seeds file')
+    logger.info(f'Number of targets: {len(targets)}')
+    if engine == 'native':
+        models = expansion.get_unproducible_batch(draftnet, targets, seeds_list)
+    else:
+        models = query.get_unproducible_batch(draftnet, targets, seeds_list)
+
+    all_results = {}
+    output_file = open(output, "w") if output else None
+    try:
+        for seeds_sbml, model in zip(seeds_sbmls, models):
+            results = check_results(model)
+            logger.info(f"{seeds_sbml}: {len(results['producible_target'])} producible targets, "
+                        f"{len(results['unproducible_target'])} unproducible targets")
+            all_results[seeds_sbml] = results
+            if output_file:
+                output_file.write(json.dumps({'seeds': seeds_sbml, **results}, sort_keys=True) + '\n')
+                output_file.flush()
+        if output_file:
+            profiling.write_report_line(output_file)
+    finally:
+        if output_file:
+            output_file.close()
+
+    return all_results
+
+
+def check_results(model):
+    """format a get_unproducible model
+
+    Args:
+        model (dict): model of query.get_unproducible or expansion.get_unproducible
+
+    Returns:
+        dict: producible_target and unproducible_target lists
+    """
+    unprod = []
+    prod = []
+    for pred in model :
+        if pred == 'unproducible_target':
+            for a in model[pred, 1]:
+                unprod.append(a[0])
+        elif pred == 'producible_target':
+            for a in model[pred, 1]:
+                prod.append(a[0])
+    return {'producible_target': prod, 'unproducible_target': unprod}
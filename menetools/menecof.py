@@ -15,14 +15,16 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
+import functools
 import json
 import logging
 import re
 import sys
 
-from .utils import clean_up
-from .query import get_unproducible, get_cofs_weighted, get_cofs, get_intersection_of_optimal_solutions_cof, get_union_of_optimal_solutions_cof, get_optimal_solutions_cof
-from .sbml import readSBMLspecies_clyngor, make_weighted_list_of_species, readSBMLnetwork_clyngor
+from . import expansion, profiling
+from .utils import clean_up, SolutionStream
+from .query import get_unproducible, get_cofs_multishot, quote
+from .sbml import readSBMLspecies_clyngor, make_weighted_list_of_species, readSBMLnetwork_indexed
 from clyngor.as_pyasp import TermSet, Atom
 from xml.etree.ElementTree import ParseError
 
@@ -47,7 +49,39 @@ def convert_to_coded_id(uncoded):
     return uncoded
 
 
-def run_menecof(draft_sbml,seeds_sbml,targets_sbml,cofactors_txt=None,weights=None,suffix=None,enumeration=None,output=None):
+def read_cofactors(cofactors_txt, weights=False, suffix=None):
+    """read a cofactors file, with one identifier per line, followed by a
+    tabulation and its weight if weighted
+
+    Args:
+        cofactors_txt (str): cofactors file
+        weights (bool, optional): Defaults to False. True if cofactors_txt is weighted
+        suffix (str, optional): Defaults to None. suffix to be added to the identifiers
+
+    Raises:
+        ValueError: if the file is tabulated and not weighted, or the reverse
+
+    Returns:
+        TermSet: cofactor atoms
+    """
+    with open(cofactors_txt, 'r') as f:
+        cofactors_list = f.read().splitlines()
+    cofactors = TermSet()
+    for elem in cofactors_list:
+        data = elem.split('\t')
+        if weights and len(data) < 2:
+            raise ValueError('Input cofactor file is not tabulated (at least not on every line). '
+                             'Please check the file, maybe you did not mean to use --weight option?')
+        if not weights and len(data) > 1:
+            raise ValueError('A tabulated file was given as input cofactors. '
+                             'Are you sure you did not mean to use the weight option?')
+        cofactor = quote(convert_to_coded_id(data[0]) + (suffix or ''))
+        cofactors.add(Atom('cofactor', [cofactor, data[1]] if weights else [cofactor]))
+    return cofactors
+
+
+@profiling.profiled
+def run_menecof(draft_sbml,seeds_sbml,targets_sbml,cofactors_txt=None,weights=None,suffix=None,enumeration=None,output=None,persist_weights=False,prune=False,time_limit=None,solve_limit=None,threads=1,stream_jsonl=None,on_solution=None,max_solutions=None,project=True):
     """propose cofactor whose producibility could unblock the producibility of targets
     
     Args:
@@ -59,14 +93,27 @@ def run_menecof(draft_sbml,seeds_sbml,targets_sbml,cofactors_txt=None,weights=No
         suffix (str, optional): Defaults to None. suffix to be added to metabolites in metabolic model
         enumeration (bool, optional): Defaults to None. enumeration boolean
         output (str): path to json output file
+        persist_weights (bool, optional): Defaults to False. store the weights of the network species next to it and reuse them
+        prune (bool, optional): Defaults to False. restrict the network to the reactions that can produce the targets
+        time_limit (float, optional): Defaults to None. seconds given to the solvings
+        solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving, <conflicts>[,<restarts>]
+        threads (int, optional): Defaults to 1. number of clingo threads
+        stream_jsonl (str, optional): Defaults to None. jsonl file to which each enumerated solution is written as soon as it is found, which enables enumeration
+        on_solution (callable, optional): Defaults to None. called with the cofactors of each enumerated solution as soon as it is found, which enables enumeration
+        max_solutions (int, optional): Defaults to None. maximal number of enumerated solutions, all if None
+        project (bool, optional): Defaults to True. enumerate only distinct sets of cofactors
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
     
     Returns:
-        TermSet,str,TermSet,TermSet,list,list,list: ASP models and lists with cofactors and (un)producible targets
+        TermSet,str,TermSet,TermSet,list,list,list: ASP models and lists with cofactors and (un)producible targets,
+        the first being None when the solutions are streamed
     """
     results = {}
     logger.info(f'Reading draft network from {draft_sbml}')
     try:
-        draftnet = readSBMLnetwork_clyngor(draft_sbml, 'draft')
+        draftnet = readSBMLnetwork_indexed(draft_sbml, 'draft')
     except FileNotFoundError:
         logger.critical(f'File not found: {draft_sbml}')
         sys.exit(1)
@@ -94,47 +141,22 @@ def run_menecof(draft_sbml,seeds_sbml,targets_sbml,cofactors_txt=None,weights=No
         logger.critical(f"Invalid syntax in SBML file: {targets_sbml}")
         sys.exit(1)
 
-    if weights and cofactors_txt:
-        logger.info('Reading cofactors with weights from {cofactors_txt}')
-        with open(cofactors_txt,'r') as f:
-            cofactors_list = f.read().splitlines()
-        cofactors = TermSet()
-        for elem in cofactors_list:
-            try:
-                data = elem.split('\t')
-                if suffix != None:
-                    cofactors.add(Term('cofactor', ["\""+convert_to_coded_id(data[0]) + suffix + "\"", data[1]]))
-                else:
-                    cofactors.add(Term('cofactor', ["\""+convert_to_coded_id(data[0]) + "\"", data[1]]))
-            except:
-                logger.critical('Input cofactor file is not tabulated (at least not on every line)\
-                \n Please check the file, maybe you did not mean to use --weight option?\
-                \nUnsuitable input file... Quitting program')
-                quit()
-
-    elif cofactors_txt:
-        logger.info('Reading cofactors from {cofactors_txt}')
-        with open(cofactors_txt,'r') as f:
-            cofactors_list = f.read().splitlines()
-        cofactors = TermSet()
-        for elem in cofactors_list:
-            if '\t' in elem:
-                logger.critical('A tabulated file was given as input cofactors. \
-                \nAre you sure you did not mean to use the weight option? \
-                \nUnsuitable input file... Quitting program')
-                quit()
-            if suffix != None:
-                cofactors.add(Term('cofactor', ["\""+convert_to_coded_id(elem) + suffix + "\""]))
-            else:
-                cofactors.add(Term('cofactor', ["\""+convert_to_coded_id(elem) + "\""]))
-
+    if cofactors_txt:
+        logger.info(f'Reading cofactors from {cofactors_txt}')
+        try:
+            cofactors = read_cofactors(cofactors_txt, weights, suffix)
+        except FileNotFoundError:
+            logger.critical(f'File not found: {cofactors_txt}')
+            sys.exit(1)
+        except ValueError as error:
+            logger.critical(f'{error}\nUnsuitable input file... Quitting program')
+            quit()
     else:
         logger.warning('No cofactors file is given as input.')
         logger.info('Research of cofactors will be done in the network itself')
-        species_and_weights = make_weighted_list_of_species(draft_sbml)
-        cofactors = TermSet()
-        for elem in species_and_weights:
-            cofactors.add(Atom('cofactor', ["\""+elem+"\"",+species_and_weights[elem]]))
+        species_and_weights = make_weighted_list_of_species(draft_sbml, persist_weights)
+        cofactors = TermSet(Atom('cofactor', ["\""+elem+"\"",+species_and_weights[elem]])
+                            for elem in species_and_weights)
         weights = True
 
     logger.info('\nChecking draft network for unproducible targets before cofactors selection ...')
@@ -148,156 +170,150 @@ def run_menecof(draft_sbml,seeds_sbml,targets_sbml,cofactors_txt=None,weights=No
     logger.info(f'{len(unprod)} unproducible targets:')
     logger.info('\n'.join(unprod))
 
+    if prune:
+        # only the reactions producing predecessors of the targets that are
+        # activated from the seeds and all the cofactors are grounded
+        draftnet, cofactors, report = expansion.prune_network(expansion.MetabolicGraph(draftnet), seeds, targets, cofactors)
+        results['pruning'] = report
+        logger.info(f"\nPruned network: {report['kept_reactions']} reactions kept, {report['removed_reactions']} removed, "
+                    f"{report['kept_cofactors']} cofactors kept, {report['removed_cofactors']} removed")
+
     logger.info('\nChecking minimal sets of cofactors to produce all targets ...')
     sys.stdout.flush()
-    if weights:
-        model = get_cofs_weighted(draftnet, targets, seeds, cofactors)
-        optimum = model[1]
-        # optimum = model.score
-        if len(optimum) == 2:
-            # it means that all targets can be produced with the selected cofactors
-            optimum = [0] + optimum
-        optimum = ','.join(map(str, optimum))
-        #print(optimum)
-
-    else:
-        model = get_cofs(draftnet, targets, seeds, cofactors)
-        # optimum = model.score
-        optimum = model[1]
-        if len(optimum) == 1:
-            # it means that all targets can be produced with the selected cofactors
-            optimum = [0] + optimum
-        optimum = ','.join(map(str, optimum))
-    logger.info('Optimum score {optimum}')
-    # solumodel = model.to_list()
+    stream = None
+    on_model = None
+    if stream_jsonl or on_solution:
+        # the solutions are reported as soon as they are enumerated instead
+        # of being kept until the end
+        enumeration = True
+        stream = SolutionStream(stream_jsonl, on_solution)
+        on_model = functools.partial(stream_solution, stream)
+    # the optimisation, intersection, union and enumeration are successive
+    # solvings of the same grounding
+    try:
+        cof_models = get_cofs_multishot(draftnet, seeds, targets, cofactors, weights, enumeration,
+                                        max_solutions or 0, time_limit, solve_limit, threads, on_model, project)
+    finally:
+        if stream:
+            stream.close()
+    model = cof_models['optimal']
+    optimum = cof_models['optimum']
+    logger.info(f'Optimum score {optimum}')
+    if not cof_models['optimality_proven']:
+        logger.warning('Limit reached: the optimum is the best score found so far, not proven')
+    results['optimality_proven'] = cof_models['optimality_proven']
+    results['complete'] = cof_models['complete']
     unproduced_targets = []
-    chosen_cofactors = []
     newly_producible_targets = []
+    chosen_cofactors = get_needed_cofactors(model[0])
     for pred in model[0]:
-        if pred == 'needed_cof':
-            if model[0][pred, 2]:
-                for a in model[0][pred, 2]:
-                    chosen_cofactors.append((a[0],a[1]))
-            else:
-                for a in model[0][pred, 1]:
-                    chosen_cofactors.append((a[0],None))
-        elif pred == 'still_unprod':
+        if pred == 'still_unprod':
             for a in model[0][pred, 1]:
                 unproduced_targets.append(a[0])
         elif pred == 'newly_prod':
             for a in model[0][pred, 1]:
                 newly_producible_targets.append(a[0])
-    # for p in solumodel:
-    #     if p.pred() == "needed_cof":
-    #         cof = p.arg(0)
-    #         try:
-    #             weight = p.arg(1)
-    #         except:
-    #             weight = None
-    #         chosen_cofactors.append((cof,weight))
-    #     elif p.pred() == "still_unprod":
-    #         tgt = p.arg(0)
-    #         unproduced_targets.append(tgt)
-    #     else:
-    #         newly_producible_targets.append(p.arg(0))
     results['chosen_cofactors'] = chosen_cofactors
     results['newly_producible_targets'] = newly_producible_targets
 
     logger.info(f'Still {len(unproduced_targets)} unproducible targets:')
     logger.info('\n'.join(unproduced_targets))
     logger.info('\nSelected cofactors:')
-    for cofactor in chosen_cofactors:
-        if cofactor[1] == None:
-            logger.info(cofactor[0])
-        else:
-            logger.info(f'{cofactor[0]} ({str(cofactor[1])})')
+    log_cofactors(chosen_cofactors)
     logger.info(f'\n{len(newly_producible_targets)} newly producible targets:')
     logger.info(str(newly_producible_targets))
 
-
     logger.info('\nIntersection of solutions') # with size', optimum, '
-    intersection = get_intersection_of_optimal_solutions_cof(draftnet, seeds, targets, cofactors, optimum, weights)
-    # solumodel = intersection_model.to_list()
-    intersection_icofactors = []
-    # for p in solumodel:
-    #     if p.pred() == "needed_cof":
-    #         cof = p.arg(0)
-    #         try:
-    #             weight = p.arg(1)
-    #         except:
-    #             weight = None
-    #         intersection_icofactors.append((cof,weight))
-        #print('\nSelected cofactors:')
-    intersection_model = intersection[0]
-    for pred in intersection_model:
-        if pred == 'needed_cof':
-            if intersection_model[pred, 2]:
-                for a in intersection_model[pred, 2]:
-                    intersection_icofactors.append((a[0],a[1]))
-            else:
-                for a in intersection_model[pred, 1]:
-                    intersection_icofactors.append((a[0],None))
+    intersection_icofactors = get_needed_cofactors(cof_models['intersection'][0])
     results['intersection_icofactors'] = intersection_icofactors
-    for cofactor in intersection_icofactors:
-        if cofactor[1] == None:
-            logger.info(cofactor[0])
-        else:
-            logger.info(f'{cofactor[0]} ({str(cofactor[1])})')
+    log_cofactors(intersection_icofactors)
 
     logger.info('\nUnion of solutions') # with size', optimum, '
-    union = get_union_of_optimal_solutions_cof(draftnet, seeds, targets, cofactors, optimum, weights)
-    union_model= union[0]
-    union_icofactors = []
-    for pred in union_model:
-        if pred == 'needed_cof':
-            if union_model[pred, 2]:
-                for a in union_model[pred, 2]:
-                    union_icofactors.append((a[0],a[1]))
-            else:
-                for a in union_model[pred, 1]:
-                    union_icofactors.append((a[0],None))
-        #print('\nSelected cofactors:')
+    union_icofactors = get_needed_cofactors(cof_models['union'][0])
     results['union_icofactors'] = union_icofactors
-    for cofactor in union_icofactors:
-        if cofactor[1] == None:
-            logger.info(cofactor[0])
-        else:
-            logger.info(f'{cofactor[0]} ({str(cofactor[1])})')
+    log_cofactors(union_icofactors)
+
+    if stream:
+        logger.info(f'\n{stream.count} solutions with size {optimum} streamed')
+        if stream.count == max_solutions:
+            logger.info(f'Enumeration stopped at {max_solutions} solutions')
+        results['enumerated'] = stream.count
+        clean_up()
+        profiling.add_report(results)
+        if output:
+            with open(output, "w") as output_file:
+                json.dump(results, output_file, indent=True, sort_keys=True)
+        return None, optimum, set(union_icofactors), set(intersection_icofactors), set(chosen_cofactors), set(unprod), set(newly_producible_targets)
 
     if enumeration:
         logger.info(f'\nComputing all solutions with size {optimum}')
-        all_models =  get_optimal_solutions_cof(draftnet, seeds, targets, cofactors, optimum, weights)
-        count = 1
         all_models_lst = []
-        for model in all_models:
+        for count, model in enumerate(cof_models['all_optimal'], start=1):
             logger.info(f'\nSolution {str(count)}:')
-            count+=1
-            current_cofactors = []
-            for pred in model[0]:
-                if pred == 'needed_cof':
-                    if model[0][pred, 2]:
-                        for a in model[0][pred, 2]:
-                            current_cofactors.append((a[0],a[1]))
-                    else:
-                        for a in model[0][pred, 1]:
-                            current_cofactors.append((a[0],None))
-            #print('\nSelected cofactors:')
-            for cofactor in current_cofactors:
-                if cofactor[1] == None:
-                    logger.info(cofactor[0])
-                else:
-                    logger.info(f'{cofactor[0]} ({str(cofactor[1])})')
+            current_cofactors = get_needed_cofactors(model[0])
+            log_cofactors(current_cofactors)
             all_models_lst.append(current_cofactors)
+        if len(all_models_lst) == max_solutions:
+            logger.info(f'\nEnumeration stopped at {max_solutions} solutions')
         clean_up()
+        profiling.add_report(results)
         if output:
             with open(output, "w") as output_file:
                 json.dump(results, output_file, indent=True, sort_keys=True)
         return all_models_lst, optimum, set(union_icofactors), set(intersection_icofactors), set(chosen_cofactors), set(unprod), set(newly_producible_targets)
 
 
+    profiling.add_report(results)
     if output:
         with open(output, "w") as output_file:
             json.dump(results, output_file, indent=True, sort_keys=True)
 
     clean_up()
     return model, optimum, set(union_icofactors), set(intersection_icofactors), set(chosen_cofactors), set(unprod), set(newly_producible_targets)
+
+
+def get_needed_cofactors(model):
+    """get the cofactors selected in a get_cofs model
+
+    Args:
+        model (dict): model of the cofactor encoding
+
+    Returns:
+        list: (cofactor, weight) tuples, weight being None without weights
+    """
+    cofactors = []
+    for pred in model:
+        if pred == 'needed_cof':
+            if (pred, 2) in model:
+                for a in model[pred, 2]:
+                    cofactors.append((a[0],a[1]))
+            else:
+                for a in model[pred, 1]:
+                    cofactors.append((a[0],None))
+    return cofactors
+
+
+def stream_solution(stream, model):
+    """log and report a set of cofactors as soon as it is enumerated
+
+    Args:
+        stream (SolutionStream): stream of the solutions
+        model (tuple): model of the cofactor encoding and its cost
+    """
+    cofactors = get_needed_cofactors(model[0])
+    logger.info(f'\nSolution {stream.count + 1}:')
+    log_cofactors(cofactors)
+    stream.add({'cofactors': cofactors}, cofactors)
+
+
+def log_cofactors(cofactors):
+    """log cofactors with their weight if any
+
+    Args:
+        cofactors (list): (cofactor, weight) tuples
+    """
+    for cofactor in cofactors:
+        if cofactor[1] == None:
+            logger.info(cofactor[0])
+        else:
+            logger.info(f'{cofactor[0]} ({str(cofactor[1])})')
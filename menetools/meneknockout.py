@@ -0,0 +1,181 @@
+#!python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017-2024 Clémence Frioux & Arnaud Belcour - Inria Dyliss - Pleiade
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+from menetools import expansion, sbml, profiling
+from xml.etree.ElementTree import ParseError
+
+logger = logging.getLogger('menetools.meneknockout')
+
+# scope state of the whole network and targets, built once in each worker
+shared = {}
+
+
+def init_worker(draftnet, seeds, targets):
+    """build the scope of the whole network, shared by all the knockouts of a worker
+
+    Args:
+        draftnet (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+        targets (set): target IDs
+    """
+    shared['state'] = expansion.ScopeState(draftnet, seeds)
+    shared['targets'] = targets
+
+
+def knockout_reaction(reaction):
+    """remove a reaction from the shared scope state, then restore it
+
+    Args:
+        reaction (str): reaction ID
+
+    Returns:
+        tuple: reaction, and dict of the lost scope, deactivated reactions and
+        unproducible targets
+    """
+    state = shared['state']
+    reactants, products, reversible = state.reactions[reaction]
+    delta = state.remove_reaction(reaction)
+    state.add_reaction(reaction, reactants, products, reversible)
+    return reaction, knockout_results(delta, shared['targets'])
+
+
+def knockout_results(delta, targets):
+    """format the delta of a knockout
+
+    Args:
+        delta (dict): delta of ScopeState.remove_reaction
+        targets (set): target IDs
+
+    Returns:
+        dict: lost scope, deactivated reactions and unproducible targets
+    """
+    return {'lost_scope': sorted(delta['scope_removed']),
+            'deactivated_reactions': sorted(delta['activated_removed']),
+            'unproducible_target': sorted(delta['scope_removed'] & targets)}
+
+
+@profiling.profiled
+def run_meneknockout(draft_sbml,seeds_sbml,targets_sbml=None,reactions=None,output=None,processes=None):
+    """remove each reaction of a metabolic network in turn and report how much
+    the scope shrinks and which targets become unproducible
+
+    Args:
+        draft_sbml (str): SBML metabolic network file
+        seeds_sbml (str): SBML seeds file
+        targets_sbml (str, optional): Defaults to None. SBML targets file
+        reactions (list, optional): Defaults to None. IDs of the reactions to knock out, all the reactions if None
+        output (str, optional): Defaults to None. path to json output file
+        processes (int, optional): Defaults to None. number of processes, all the CPUs if None
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
+
+    Returns:
+        dict: scope and unproducible targets of the whole network, and results of each knockout
+    """
+    logger.info(f'Reading draft network from {draft_sbml}')
+    try:
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
+    except FileNotFoundError:
+        logger.critical(f'File not found: {draft_sbml}')
+        sys.exit(1)
+    except ParseError:
+        logger.critical(f'Invalid syntax in SBML file: {draft_sbml}')
+        sys.exit(1)
+
+    logger.info(f'Reading seeds from {seeds_sbml}')
+    try:
+        seeds = sbml.readSBMLspecies_clyngor(seeds_sbml,'seed')
+    except FileNotFoundError:
+        logger.critical(f'File not found: {seeds_sbml}')
+        sys.exit(1)
+    except ParseError:
+        logger.critical(f'Invalid syntax in SBML file: {seeds_sbml}')
+        sys.exit(1)
+
+    targets = set()
+    if targets_sbml:
+        logger.info(f'Reading targets from {targets_sbml}')
+        try:
+            targets = set(expansion.collect('target', sbml.readSBMLspecies_clyngor(targets_sbml, 'target')))
+        except FileNotFoundError:
+            logger.critical(f"File not found: {targets_sbml}")
+            sys.exit(1)
+        except ParseError:
+            logger.critical(f"Invalid syntax in SBML file: {targets_sbml}")
+            sys.exit(1)
+
+    state = expansion.ScopeState(draftnet, seeds)
+    if reactions is None:
+        reactions = sorted(state.reactions)
+    else:
+        for reaction in reactions:
+            if reaction not in state.reactions:
+                logger.warning(f'Reaction {reaction} is not in the metabolic network')
+        reactions = [reaction for reaction in reactions if reaction in state.reactions]
+
+    results = {}
+    results['scope'] = sorted(state.scope)
+    results['unproducible_target'] = sorted(targets - state.scope)
+    results['knockouts'] = {}
+
+    # Removing a reaction that is not activated changes neither the scope nor
+    # the activated reactions: only the activated ones are knocked out, each
+    # one updating the scope of the whole network instead of computing it again.
+    knockouts = [reaction for reaction in reactions if reaction in state.activated]
+    del state
+    logger.info(f'\n{len(results["scope"])} compounds on scope, {len(knockouts)} activated reactions out of {len(reactions)} to knock out')
+    sys.stdout.flush()
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(knockouts)))
+    pool = None
+    try:
+        if processes == 1:
+            init_worker(draftnet, seeds, targets)
+            knockout_results_iter = map(knockout_reaction, knockouts)
+        else:
+            pool = multiprocessing.Pool(processes, initializer=init_worker,
+                                        initargs=(draftnet, seeds, targets))
+            knockout_results_iter = pool.imap(knockout_reaction, knockouts,
+                                              chunksize=max(1, len(knockouts) // (4 * processes)))
+        knocked_out = dict(knockout_results_iter)
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+    empty = {'lost_scope': [], 'deactivated_reactions': [], 'unproducible_target': []}
+    for reaction in reactions:
+        results['knockouts'][reaction] = knocked_out.get(reaction, empty)
+        if results['knockouts'][reaction]['lost_scope']:
+            logger.info(f"{reaction}: {len(results['knockouts'][reaction]['lost_scope'])} compounds lost, "
+                        f"{len(results['knockouts'][reaction]['unproducible_target'])} unproducible targets")
+
+    profiling.add_report(results)
+    if output:
+        with open(output, "w") as output_file:
+            json.dump(results, output_file, indent=True, sort_keys=True)
+
+    return results
@@ -15,18 +15,26 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
+import functools
 import json
 import logging
+import multiprocessing
+import os
 import sys
+import threading
 
 from clyngor.as_pyasp import TermSet, Atom
-from menetools import utils, query, sbml
+from menetools import expansion, utils, query, sbml, profiling
 from xml.etree.ElementTree import ParseError
 
 logger = logging.getLogger('menetools.menepath')
 
+# network, seeds and options shared by all the targets of a worker
+shared = {}
 
-def run_menepath(draft_sbml,seeds_sbml,targets_sbml,min_size=None,enumeration=None,output=None):
+
+@profiling.profiled
+def run_menepath(draft_sbml,seeds_sbml,targets_sbml,min_size=None,enumeration=None,output=None,processes=1,prune=False,time_limit=None,solve_limit=None,threads=1,stream_jsonl=None,on_solution=None,max_solutions=None,project=True):
     """Get production pathways of targets in metabolic networks, started from seeds
     
     Args:
@@ -36,14 +44,27 @@ def run_menepath(draft_sbml,seeds_sbml,targets_sbml,min_size=None,enumeration=No
         min_size (bool, optional): Defaults to None. minimal size paths
         enumeration (bool, optional): Defaults to None. enumeration of all paths
         output (str): path to json output file
+        processes (int, optional): Defaults to 1. number of targets computed in parallel, all the CPUs if None
+        prune (bool, optional): Defaults to False. restrict the network of each target to the reactions that can produce it
+        time_limit (float, optional): Defaults to None. seconds given to the solving of each target
+        solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving, <conflicts>[,<restarts>]
+        threads (int, optional): Defaults to 1. number of clingo threads solving each target
+        stream_jsonl (str, optional): Defaults to None. jsonl file to which each enumerated path is written as soon as it is found, which enables enumeration
+        on_solution (callable, optional): Defaults to None. called with the target and the reactions of each enumerated path as soon as it is found, which enables enumeration
+        max_solutions (int, optional): Defaults to None. maximal number of enumerated paths of each target, all if None
+        project (bool, optional): Defaults to True. enumerate only distinct sets of reactions
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
 
     Returns:
-        TermSet, set, set, set, set: Model, unproducible targets and paths
+        dict, set, dict, dict, dict: all paths (if enumeration and not streamed), unproducible
+        targets and one path, union and intersection of paths for each producible target
     """
     results = {}
     logger.info(f'Reading draft network from {draft_sbml}')
     try:
-        draftnet = sbml.readSBMLnetwork_clyngor(draft_sbml, 'draft')
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
     except FileNotFoundError:
         logger.critical(f'File not found: {draft_sbml}')
         sys.exit(1)
@@ -74,124 +95,351 @@ def run_menepath(draft_sbml,seeds_sbml,targets_sbml,min_size=None,enumeration=No
     logger.info('\nChecking network for unproducible targets')
     sys.stdout.flush()
     model = query.get_unproducible(draftnet, targets, seeds)
-    # unproducible_targets_atoms = set()
-    producible_targets_atoms = set()
+    producible_targets = []
     unproducible_targets_lst = []
 
     for pred in model :
         if pred == 'unproducible_target':
             for a in model[pred, 1]:
-                # unproducible_targets_atoms.add(Atom('unproducible_targets', ['"'+a[0]+'"']))
                 unproducible_targets_lst.append(a[0])
         elif pred == 'producible_target':
             for a in model[pred, 1]:
-                producible_targets_atoms.add(Atom('target', ['"'+a[0]+'"']))
+                producible_targets.append(a[0])
+    producible_targets.sort()
     results['unproducible_targets_lst'] = unproducible_targets_lst
 
     logger.info(f'{len(unproducible_targets_lst)} unproducible targets:')
     logger.info("\n".join(unproducible_targets_lst))
 
-    for t in producible_targets_atoms:
-        single_target = TermSet()
-        single_target.add(t)
+    results['one_path'] = {}
+    results['union_path'] = {}
+    results['intersection_path'] = {}
+    results['optimality_proven'] = {}
+    results['complete'] = {}
+    stream = None
+    if stream_jsonl or on_solution:
+        # the paths are reported as soon as they are enumerated instead of
+        # being kept until the end
+        enumeration = True
+        stream = utils.SolutionStream(stream_jsonl, on_solution)
+        results['enumerated'] = {target: 0 for target in producible_targets}
+    elif enumeration:
+        results['all_paths'] = {}
+    if prune:
+        results['pruning'] = {}
 
-        logger.info(f'\n{single_target}')
-        draft_str = 'draft'
-        draftfact = TermSet()
-        draftatom = Atom('draft', ["\""+draft_str+"\""])
-        draftfact.add(draftatom)
-        lp_instance   = TermSet.union(draftnet,draftfact,single_target,seeds)
+    if processes is None:
+        # each process solves with its own threads
+        processes = (os.cpu_count() or 1) // max(1, threads)
+    processes = max(1, min(processes, len(producible_targets)))
+    if min_size:
+        logger.info(f'\nComputing cardinality-minimal production paths of {len(producible_targets)} targets with {processes} processes')
+    else:
+        logger.info(f'\nComputing production paths of {len(producible_targets)} targets with {processes} processes')
+    sys.stdout.flush()
 
-    # one solution, minimal or not, depending on option
-        if min_size:
-            logger.info(f'\nComputing one solution of cardinality-minimal production paths for {t}')
-        else:
-            logger.info(f'\nComputing one solution of production paths for {t}')
-        # """
-        one_model = query.get_paths(lp_instance, min_size)
-        one_path = []
-        for pred in one_model[0]:
-            if pred == 'selected':
-                for a in one_model[0][pred, 2]:
-                    one_path.append(a[0])
-        results['one_path'] = one_path
-        optimum = one_model[1]
-        if optimum:
-            optimum = ','.join(map(str, optimum))
-        logger.info(f'Solution size {len(one_path)} reactions')
-        logger.info('\n'.join(one_path))
-        # """
-        """
-        one_model = query.get_paths(lp_instance, min_size)
-        print(one_model.score)
-        optimum = one_model.score
-        print('Solution size ',len(one_model), ' reactions')
-        utils.print_met(one_model.to_list())
-        """
-
-    # union of solutions
-        if min_size:
-            logger.info(f'\nComputing union of cardinality-minimal production paths for {t}')
-        else:
-            logger.info(f'\nComputing union of production paths for {t}')
-        union = query.get_union_of_paths(lp_instance, optimum, min_size)
-        union_model = union[0]
-        union_path = []
-        for pred in union_model:
-            if pred == 'selected':
-                for a in union_model[pred, 2]:
-                    union_path.append(a[0])
-        results['union_path'] = union_path
-        logger.info(f'Union size {len(union_path)} reactions')
-        logger.info('\n'.join(union_path))
-
-    # intersection of solutions
-        if min_size:
-            logger.info(f'\nComputing intersection of cardinality-minimal production paths for {t}')
+    pool = None
+    queue = None
+    receiver = None
+    try:
+        if processes == 1:
+            on_path = functools.partial(stream_path, stream, results) if stream else None
+            init_worker(draftnet, seeds, min_size, enumeration, prune, time_limit, solve_limit, threads,
+                        max_solutions, project, profiling.worker_settings(), on_path)
+            target_results = map(get_target_paths, producible_targets)
         else:
-            logger.info(f'\nComputing intersection of production paths for {t}')
-        intersection = query.get_intersection_of_paths(lp_instance, optimum, min_size)
-        intersection_model = intersection[0]
-        intersection_path = []
-        for pred in intersection_model:
-            if pred == 'selected':
-                for a in intersection_model[pred, 2]:
-                    intersection_path.append(a[0])
-        results['intersection_path'] = intersection_path
-        logger.info(f'Intersection size {len(intersection_path)} reactions')
-        logger.info('\n'.join(intersection_path))
-
-    # if wanted, get enumeration of all solutions
-        if enumeration:
-            if min_size:
-                logger.info(f'\nComputing all cardinality-minimal production paths for {t} - {optimum}')
+            on_path = None
+            if stream:
+                # The workers send their paths through a pipe as they are
+                # found, blocking when it is full, and a thread reports them.
+                queue = multiprocessing.SimpleQueue()
+                on_path = functools.partial(send_path, queue)
+                receiver = threading.Thread(target=receive_paths, args=(queue, stream, results), daemon=True)
+                receiver.start()
+            # The network and seeds are sent once to each worker and the
+            # targets one by one.
+            pool = multiprocessing.Pool(processes, initializer=init_worker,
+                                        initargs=(draftnet, seeds, min_size, enumeration, prune,
+                                                  time_limit, solve_limit, threads, max_solutions, project,
+                                                  profiling.worker_settings(), on_path))
+            target_results = pool.imap(get_target_paths, producible_targets)
+        for target, paths in zip(producible_targets, target_results):
+            profiling.merge(paths)
+            if prune:
+                report = paths['pruning']
+                logger.info(f"\nPruned network of {target}: {report['kept_reactions']} reactions kept, "
+                            f"{report['removed_reactions']} removed")
+                results['pruning'][target] = report
+            log_target_paths(target, paths, min_size)
+            if not paths['complete']:
+                logger.warning(f'Limit reached for {target}: the paths are the best found so far')
+            results['optimality_proven'][target] = paths['optimality_proven']
+            results['complete'][target] = paths['complete']
+            results['one_path'][target] = paths['one_path']
+            results['union_path'][target] = paths['union_path']
+            results['intersection_path'][target] = paths['intersection_path']
+            if 'all_paths' in paths:
+                results['all_paths'][target] = paths['all_paths']
+        if receiver:
+            # all the paths are sent once all the targets are solved
+            queue.put(None)
+            receiver.join()
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+        if stream:
+            stream.close()
+    if stream:
+        if 'error' in results:
+            raise results.pop('error')
+        logger.info(f"\n{stream.count} paths streamed")
+    if enumeration and max_solutions:
+        for target in producible_targets:
+            if stream:
+                count = results['enumerated'][target]
             else:
-                logger.info(f'\nComputing all production paths for {t}')
-
-            all_models = query.get_all_paths(lp_instance, optimum, min_size)
-            all_models_lst = []
-            count = 1
-            for model in all_models:
-                current_enum_path=[]
-                for pred in model:
-                    if pred == 'selected':
-                        for a in model[pred, 2]:
-                            current_enum_path.append(a[0])
-                logger.info(f'\nSolution {str(count)} of size : {str(len(current_enum_path))} reactions:')
-                count+=1
-                logger.info('\n'.join(current_enum_path))
-                all_models_lst.append(current_enum_path)
-            if output:
-                with open(output, "w") as output_file:
-                    json.dump(results, output_file, indent=True, sort_keys=True)
-
-            utils.clean_up()
-            return all_models_lst, set(unproducible_targets_lst), set(one_path), set(union_path), set(intersection_path)
+                count = len(results['all_paths'][target])
+            if count == max_solutions:
+                logger.info(f'Enumeration of the paths of {target} stopped at {max_solutions} paths')
 
+    profiling.add_report(results)
     if output:
         with open(output, "w") as output_file:
             json.dump(results, output_file, indent=True, sort_keys=True)
 
-    #TODO store for all targets
     utils.clean_up()
-    return model, set(unproducible_targets_lst), set(one_path), set(union_path), set(intersection_path)
+    return (results.get('all_paths'), set(unproducible_targets_lst),
+            {target: set(path) for target, path in results['one_path'].items()},
+            {target: set(path) for target, path in results['union_path'].items()},
+            {target: set(path) for target, path in results['intersection_path'].items()})
+
+
+def init_worker(draftnet, seeds, min_size, enumeration, prune=False, time_limit=None, solve_limit=None, threads=1,
+                max_solutions=None, project=True, instrumentation=(False, False), on_path=None):
+    """store the inputs shared by all targets, sent once to each worker
+
+    Args:
+        draftnet (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+        min_size (bool): minimal size paths
+        enumeration (bool): enumeration of all paths
+        prune (bool, optional): Defaults to False. prune the network for each target
+        time_limit (float, optional): Defaults to None. seconds given to the solving of each target
+        solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving
+        threads (int, optional): Defaults to 1. number of clingo threads
+        max_solutions (int, optional): Defaults to None. maximal number of enumerated paths of each target, all if None
+        project (bool, optional): Defaults to True. enumerate only distinct sets of reactions
+        instrumentation (tuple, optional): Defaults to (False, False). profiling.worker_settings of the run
+        on_path (callable, optional): Defaults to None. called with the target and each enumerated path instead of keeping them
+    """
+    profiling.init_worker(instrumentation)
+    if prune:
+        shared['graph'] = expansion.MetabolicGraph(draftnet)
+        shared['seeds'] = seeds
+        shared['instance'] = None
+    else:
+        shared['instances'] = path_instance(draftnet, seeds)
+    shared['min_size'] = min_size
+    shared['enumeration'] = enumeration
+    shared['prune'] = prune
+    shared['solving'] = time_limit, solve_limit, threads, max_solutions, project
+    shared['on_path'] = on_path
+
+
+def path_instance(draftnet, seeds):
+    """gather the facts of the path encoding shared by all targets, the
+    network being kept as such until clingo reads its facts
+
+    Args:
+        draftnet (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+
+    Returns:
+        list: network, and TermSet of the draft and seed atoms
+    """
+    draftfact = TermSet(seeds)
+    draftfact.add(Atom('draft', ["\""+'draft'+"\""]))
+    return [draftnet, draftfact]
+
+
+def get_selected(model):
+    """get the reactions selected in a path model
+
+    Args:
+        model (dict): model of a get_paths query
+
+    Returns:
+        list: selected reactions
+    """
+    path = []
+    for pred in model:
+        if pred == 'selected':
+            for a in model[pred, 2]:
+                path.append(a[0])
+    return path
+
+
+@profiling.worker_task
+def get_target_paths(target):
+    """compute the paths producing a target in a worker
+
+    Args:
+        target (str): producible target
+
+    Returns:
+        dict: one_path, optimum, union_path, intersection_path, all_paths and
+        pruning report if the network is pruned
+    """
+    if not shared['prune']:
+        return compute_target_paths(shared['instances'], target, shared['min_size'], shared['enumeration'],
+                                    *shared['solving'], shared['on_path'])
+
+    # Reactions that are not activated can only be part of non-minimal
+    # paths, so they are kept unless paths are cardinality-minimal.
+    targets = TermSet([Atom('target', [query.quote(target)])])
+    draftnet, cofactors, report = expansion.prune_network(shared['graph'], shared['seeds'], targets,
+                                                          forward=bool(shared['min_size']))
+    instances = path_instance(draftnet, shared['seeds'])
+    paths = compute_target_paths(instances, target, shared['min_size'], shared['enumeration'], *shared['solving'],
+                                 shared['on_path'])
+    paths['pruning'] = report
+    return paths
+
+
+def compute_target_paths(instances, target, min_size, enumeration, time_limit=None, solve_limit=None, threads=1,
+                         max_solutions=None, project=True, on_path=None):
+    """compute one path, the union and the intersection of paths, and if wanted
+    all the paths, producing a target
+
+    Args:
+        instances (list): facts returned by path_instance
+        target (str): producible target
+        min_size (bool): minimal size paths
+        enumeration (bool): enumeration of all paths
+        time_limit (float, optional): Defaults to None. seconds given to the solvings
+        solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving
+        threads (int, optional): Defaults to 1. number of clingo threads
+        max_solutions (int, optional): Defaults to None. maximal number of enumerated paths, all if None
+        project (bool, optional): Defaults to True. enumerate only distinct sets of reactions
+        on_path (callable, optional): Defaults to None. called with the target and each enumerated path instead of keeping them in all_paths
+
+    Returns:
+        dict: one_path, optimum, union_path, intersection_path, all_paths,
+        optimality_proven and complete
+    """
+    single_target = TermSet()
+    single_target.add(Atom('target', [query.quote(target)]))
+
+    # one grounding solved for one path, the union, the intersection and the enumeration
+    on_model = functools.partial(report_path, on_path, target) if on_path else None
+    models = query.get_paths_multishot(instances + [single_target], min_size, enumeration, max_solutions or 0,
+                                       time_limit, solve_limit, threads, on_model, project)
+    paths = {}
+    paths['one_path'] = get_selected(models['one_path'][0])
+    optimum = models['one_path'][1]
+    if optimum:
+        optimum = ','.join(map(str, optimum))
+    paths['optimum'] = optimum
+    paths['optimality_proven'] = models['optimality_proven']
+    paths['complete'] = models['complete']
+    paths['union_path'] = get_selected(models['union_path'][0])
+    paths['intersection_path'] = get_selected(models['intersection_path'][0])
+    if 'all_paths' in models:
+        paths['all_paths'] = [get_selected(model) for model in models['all_paths']]
+    return paths
+
+
+def report_path(on_path, target, model):
+    """give an enumerated path to on_path as soon as it is found
+
+    Args:
+        on_path (callable): called with the target and the reactions of the path
+        target (str): producible target
+        model (dict): model of a get_paths query
+    """
+    on_path(target, get_selected(model))
+
+
+def send_path(queue, target, path):
+    """send a path enumerated in a worker to the main process
+
+    Args:
+        queue (multiprocessing.SimpleQueue): pipe read by receive_paths
+        target (str): producible target
+        path (list): reactions of the path
+    """
+    queue.put((target, path))
+
+
+def receive_paths(queue, stream, results):
+    """report the paths sent by the workers until None is received
+
+    An error of the report is stored under error in results, and the next
+    paths are still received so that the workers are never blocked.
+
+    Args:
+        queue (multiprocessing.SimpleQueue): pipe written by send_path
+        stream (SolutionStream): stream of the paths
+        results (dict): results of run_menepath
+    """
+    for item in iter(queue.get, None):
+        if 'error' not in results:
+            try:
+                stream_path(stream, results, *item)
+            except Exception as error:
+                results['error'] = error
+
+
+def stream_path(stream, results, target, path):
+    """log and report an enumerated path as soon as it is found
+
+    Args:
+        stream (SolutionStream): stream of the paths
+        results (dict): results of run_menepath, counting the paths of each target
+        target (str): producible target
+        path (list): reactions of the path
+    """
+    results['enumerated'][target] += 1
+    logger.info(f"\nSolution {results['enumerated'][target]} for {target} of size : {len(path)} reactions:")
+    logger.info('\n'.join(path))
+    stream.add({'target': target, 'path': path}, target, path)
+
+
+def log_target_paths(target, paths, min_size):
+    """log the paths computed for a target
+
+    Args:
+        target (str): producible target
+        paths (dict): result of get_target_paths
+        min_size (bool): minimal size paths
+    """
+    if min_size:
+        logger.info(f'\nOne solution of cardinality-minimal production paths for {target}')
+    else:
+        logger.info(f'\nOne solution of production paths for {target}')
+    logger.info(f"Solution size {len(paths['one_path'])} reactions")
+    logger.info('\n'.join(paths['one_path']))
+
+    if min_size:
+        logger.info(f'\nUnion of cardinality-minimal production paths for {target}')
+    else:
+        logger.info(f'\nUnion of production paths for {target}')
+    logger.info(f"Union size {len(paths['union_path'])} reactions")
+    logger.info('\n'.join(paths['union_path']))
+
+    if min_size:
+        logger.info(f'\nIntersection of cardinality-minimal production paths for {target}')
+    else:
+        logger.info(f'\nIntersection of production paths for {target}')
+    logger.info(f"Intersection size {len(paths['intersection_path'])} reactions")
+    logger.info('\n'.join(paths['intersection_path']))
+
+    if 'all_paths' in paths:
+        if min_size:
+            logger.info(f"\nAll cardinality-minimal production paths for {target} - {paths['optimum']}")
+        else:
+            logger.info(f'\nAll production paths for {target}')
+        for count, path in enumerate(paths['all_paths'], start=1):
+            logger.info(f'\nSolution {str(count)} of size : {str(len(path))} reactions:')
+            logger.info('\n'.join(path))
@@ -19,27 +19,32 @@ import json
 import logging
 import sys
 
-from menetools import query, sbml
+from menetools import expansion, query, sbml, profiling
 from xml.etree.ElementTree import ParseError
 
 
 logger = logging.getLogger('menetools.menescope')
 
 
-def run_menescope(draft_sbml,seeds_sbml,output=None):
+@profiling.profiled
+def run_menescope(draft_sbml,seeds_sbml,output=None,engine='asp'):
     """get producible metabolites in a metabolic network, starting from seeds
     
     Args:
         draft_sbml (str): SBML metabolic network file
         seeds_sbml (str): SBML seeds file
         output (str): path to json output file
+        engine (str, optional): Defaults to 'asp'. 'asp' to use clingo, 'native' for the Python expansion
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
     
     Returns:
         list: producible compounds
     """
     logger.info(f'Reading draft network from {draft_sbml}')
     try:
-        draftnet = sbml.readSBMLnetwork_clyngor(draft_sbml, 'draft')
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
     except FileNotFoundError:
         logger.critical(f'File not found: {draft_sbml}')
         sys.exit(1)
@@ -59,7 +64,106 @@ def run_menescope(draft_sbml,seeds_sbml,output=None):
 
     logger.info('\nChecking draft network scope')
     sys.stdout.flush()
-    model = query.get_scope(draftnet, seeds)
+    if engine == 'native':
+        model = expansion.get_scope(draftnet, seeds)
+    else:
+        model = query.get_scope(draftnet, seeds)
+    results = scope_results(model)
+    scope = results['scope']
+    produced_seeds = results['produced_seeds']
+    non_produced_seeds = results['non_produced_seeds']
+    absent_seeds = results['absent_seeds']
+    logger.info(' ' + str(len(scope)) + ' compounds on scope:')
+    logger.info('\n'.join(scope))
+    logger.info(' ' + str(len(produced_seeds)) + ' seeds are producible:')
+    logger.info('\n'.join(produced_seeds))
+    logger.info(' ' + str(len(non_produced_seeds)) + ' seeds are not producible:')
+    logger.info('\n'.join(non_produced_seeds))
+    logger.info(' ' + str(len(absent_seeds)) + ' seeds that were provided as input are absent from the network:')
+    logger.info('\n'.join(absent_seeds))
+
+    profiling.add_report(results)
+    if output:
+        with open(output, "w") as output_file:
+            json.dump(results, output_file, indent=True, sort_keys=True)
+
+    return results
+
+
+@profiling.profiled
+def run_menescope_batch(draft_sbml,seeds_sbmls,output=None,engine='asp'):
+    """get producible metabolites in a metabolic network for several sets of seeds,
+    reading (and with the asp engine, grounding) the network only once
+    
+    Args:
+        draft_sbml (str): SBML metabolic network file
+        seeds_sbmls (list): SBML seeds files
+        output (str): path to jsonl output file, one line per seeds file
+        engine (str, optional): Defaults to 'asp'. 'asp' to use clingo, 'native' for the Python expansion
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
+    
+    Returns:
+        dict: menescope results for each seeds file
+    """
+    logger.info(f'Reading draft network from {draft_sbml}')
+    try:
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
+    except FileNotFoundError:
+        logger.critical(f'File not found: {draft_sbml}')
+        sys.exit(1)
+    except ParseError:
+        logger.critical(f'Invalid syntax in SBML file: {draft_sbml}')
+        sys.exit(1)
+
+    logger.info(f'Reading {len(seeds_sbmls)} seeds files')
+    seeds_list = []
+    for seeds_sbml in seeds_sbmls:
+        try:
+            seeds_list.append(sbml.readSBMLspecies_clyngor(seeds_sbml,'seed'))
+        except FileNotFoundError:
+            logger.critical(f'File not found: {seeds_sbml}')
+            sys.exit(1)
+        except ParseError:
+            logger.critical(f'Invalid syntax in SBML file: {seeds_sbml}')
+            sys.exit(1)
+
+    logger.info('\nChecking draft network scope for each seeds file')
+    sys.stdout.flush()
+    if engine == 'native':
+        models = expansion.get_scope_batch(draftnet, seeds_list)
+    else:
+        models = query.get_scope_batch(draftnet, seeds_list)
+
+    all_results = {}
+    output_file = open(output, "w") if output else None
+    try:
+        for seeds_sbml, model in zip(seeds_sbmls, models):
+            results = scope_results(model)
+            logger.info(f"{seeds_sbml}: {len(results['scope'])} compounds on scope")
+            all_results[seeds_sbml] = results
+            if output_file:
+                output_file.write(json.dumps({'seeds': seeds_sbml, **results}, sort_keys=True) + '\n')
+                output_file.flush()
+        if output_file:
+            profiling.write_report_line(output_file)
+    finally:
+        if output_file:
+            output_file.close()
+
+    return all_results
+
+
+def scope_results(model):
+    """format a get_scope model
+    
+    Args:
+        model (dict): model of query.get_scope or expansion.get_scope
+    
+    Returns:
+        dict: scope, produced_seeds, non_produced_seeds and absent_seeds lists
+    """
     scope = []
     produced_seeds = []
     non_produced_seeds = []
@@ -77,18 +181,5 @@ def run_menescope(draft_sbml,seeds_sbml,output=None):
         if pred == 'absent_seed':
             for a in model[pred, 1]:
                 absent_seeds.append(a[0])
-    logger.info(' ' + str(len(scope)) + ' compounds on scope:')
-    logger.info('\n'.join(scope))
-    logger.info(' ' + str(len(produced_seeds)) + ' seeds are producible:')
-    logger.info('\n'.join(produced_seeds))
-    logger.info(' ' + str(len(non_produced_seeds)) + ' seeds are not producible:')
-    logger.info('\n'.join(non_produced_seeds))
-    logger.info(' ' + str(len(absent_seeds)) + ' seeds that were provided as input are absent from the network:')
-    logger.info('\n'.join(absent_seeds))
 
-    results = {'scope': scope, 'produced_seeds': produced_seeds, 'non_produced_seeds': non_produced_seeds, 'absent_seeds': absent_seeds}
-    if output:
-        with open(output, "w") as output_file:
-            json.dump(results, output_file, indent=True, sort_keys=True)
-
-    return results
+    return {'scope': scope, 'produced_seeds': produced_seeds, 'non_produced_seeds': non_produced_seeds, 'absent_seeds': absent_seeds}
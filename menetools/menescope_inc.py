@@ -19,15 +19,16 @@ import json
 import logging
 import sys
 
-from menetools import utils, query, sbml
-from  clyngor.as_pyasp import Atom
+from menetools import expansion, query, sbml, profiling
+from clyngor.as_pyasp import TermSet, Atom
 from xml.etree.ElementTree import ParseError
 
 
 logger = logging.getLogger('menetools.menescope_inc')
 
 
-def run_menescope_inc(draft_sbml,seeds_sbml,targets_sbml,output=None):
+@profiling.profiled
+def run_menescope_inc(draft_sbml,seeds_sbml,targets_sbml,output=None,engine='asp'):
     """identifies the number of steps needed by the expansion algorithm to reach either (1) specific targets or (2) all producible compounds.
     
     Args:
@@ -35,13 +36,17 @@ def run_menescope_inc(draft_sbml,seeds_sbml,targets_sbml,output=None):
         seeds_sbml (str): SBML seeds file
         targets_sbml (str): SBML targets file
         output (str): path to json output file
+        engine (str, optional): Defaults to 'asp'. 'asp' to use clingo, 'native' for the Python layered expansion
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
     
     Returns:
         dict: with 2 subdicts containing the steps and their associated producible compounds
     """
     logger.info(f'Reading draft network from {draft_sbml}')
     try:
-        draftnet = sbml.readSBMLnetwork_clyngor(draft_sbml, 'draft')
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
     except FileNotFoundError:
         logger.critical(f'File not found: {draft_sbml}')
         sys.exit(1)
@@ -70,47 +75,24 @@ def run_menescope_inc(draft_sbml,seeds_sbml,targets_sbml,output=None):
         except ParseError:
             logger.critical(f"Invalid syntax in SBML file: {targets_sbml}")
             sys.exit(1)
+    else:
+        targets = None
 
-        # Check if all targets are producible, if not stop the script.
-        # As the incremental scope will never end if there is unproducible targets.
-        logger.info('\nChecking network for unproducible targets')
-        sys.stdout.flush()
-        model = query.get_unproducible(draftnet, targets, seeds)
-
-        unproducible_targets_lst = []
-        for pred in model :
-            if pred == 'unproducible_target':
-                for a in model[pred, 1]:
-                    unproducible_targets_lst.append(a[0])
-
-        if len(unproducible_targets_lst) > 0:
-            logger.critical('There is unproducible targets in {0}, incremental scope will enter an infinite loop due to them. Remove them if you want to continue:'.format(targets_sbml))
-            logger.critical("\n".join(unproducible_targets_lst))
-            sys.exit()
-
-    # If no targets are given mene scope_inc will predict the number of steps needed to produce all producible compounds (first computed by menescope to have a goal).
-    if not targets_sbml:
+    if engine == 'native':
+        # The layered expansion stops at the fixpoint, the unproducible
+        # targets are the ones it did not reach.
+        logger.info('\nChecking draft network incremental scope')
         sys.stdout.flush()
-        # Compute the producible compounds.
-        model = query.get_scope(draftnet, seeds)
-        scope = []
-        for pred in model:
-            if pred == 'dscope':
-                for a in model[pred, 1]:
-                    scope.append(a[0])
-        scope_size = len(scope)
-        # Add the number of producible compounds as the maxscope to reach.
-        seeds.add(Atom('maxscope', [str(scope_size)]))
-        utils.to_file(draftnet, 'test.lp')
-        utils.to_file(seeds, 'test.lp')
-
-    # Compute incremental scope.
-    logger.info('\nChecking draft network incremental scope')
-    sys.stdout.flush()
-    if targets_sbml:
-        model = query.get_inc_scope(draftnet, seeds, targets)
+        model = expansion.get_inc_scope(draftnet, seeds, targets)
+        if targets:
+            reached = set(a[0] for a in model.get(('dscope', 2), ()))
+            unproducible_targets_lst = sorted(expansion.collect('target', targets) - reached)
+            if len(unproducible_targets_lst) > 0:
+                logger.critical('There is unproducible targets in {0}. Remove them if you want to continue:'.format(targets_sbml))
+                logger.critical("\n".join(unproducible_targets_lst))
+                sys.exit()
     else:
-        model = query.get_inc_scope(draftnet, seeds)
+        model = get_asp_inc_scope(draftnet, seeds, targets, targets_sbml)
 
     incremental_scope = {}
     for pred in model:
@@ -142,8 +124,62 @@ def run_menescope_inc(draft_sbml,seeds_sbml,targets_sbml,output=None):
             logger.info('{0} new metabolites producible at step {1}'.format(len(step_produced[step]), step))
 
     results = {'incremental_scope': incremental_scope, 'step_produced': step_produced}
+    if engine == 'native':
+        results['incremental_activation'] = dict(model.get(('activated', 2), ()))
+    profiling.add_report(results)
     if output:
         with open(output, "w") as output_file:
             json.dump(results, output_file, indent=True, sort_keys=True)
 
     return results
+
+
+def get_asp_inc_scope(draftnet, seeds, targets, targets_sbml):
+    """compute the incremental scope with the incmode encoding, which needs the
+    targets to be producible, or the size of the scope, to stop
+
+    Args:
+        draftnet (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+        targets (TermSet): target atoms, None to reach all producible compounds
+        targets_sbml (str): SBML targets file, for the error message
+
+    Returns:
+        dict: dscope atoms with their steps
+    """
+    if targets:
+        # Check if all targets are producible, if not stop the script.
+        # As the incremental scope will never end if there is unproducible targets.
+        logger.info('\nChecking network for unproducible targets')
+        sys.stdout.flush()
+        model = query.get_unproducible(draftnet, targets, seeds)
+
+        unproducible_targets_lst = []
+        for pred in model :
+            if pred == 'unproducible_target':
+                for a in model[pred, 1]:
+                    unproducible_targets_lst.append(a[0])
+
+        if len(unproducible_targets_lst) > 0:
+            logger.critical('There is unproducible targets in {0}, incremental scope will enter an infinite loop due to them. Remove them if you want to continue:'.format(targets_sbml))
+            logger.critical("\n".join(unproducible_targets_lst))
+            sys.exit()
+
+    # If no targets are given mene scope_inc will predict the number of steps needed to produce all producible compounds (first computed by menescope to have a goal).
+    else:
+        sys.stdout.flush()
+        # Compute the producible compounds.
+        model = query.get_scope(draftnet, seeds)
+        scope = []
+        for pred in model:
+            if pred == 'dscope':
+                for a in model[pred, 1]:
+                    scope.append(a[0])
+        scope_size = len(scope)
+        # Add the number of producible compounds as the maxscope to reach.
+        seeds = TermSet.union(seeds, TermSet([Atom('maxscope', [str(scope_size)])]))
+
+    # Compute incremental scope.
+    logger.info('\nChecking draft network incremental scope')
+    sys.stdout.flush()
+    return query.get_inc_scope(draftnet, seeds, targets)
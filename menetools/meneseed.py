@@ -19,12 +19,13 @@ import json
 import logging
 import sys
 
-from menetools import query, sbml
+from menetools import query, sbml, profiling
 from xml.etree.ElementTree import ParseError
 
 logger = logging.getLogger('menetools.meneseed')
 
 
+@profiling.profiled
 def run_meneseed(draft_sbml, output=None):
     """
     Identify seeds in a metabolic network.
@@ -32,13 +33,16 @@ def run_meneseed(draft_sbml, output=None):
     Args:
         draft_sbml (str): SBML metabolic network file
         output (str): path to json output file
+        profile (bool or Profiler, optional): Defaults to False. record the wall time and peak memory of each phase, in the given Profiler if any
+        profile_trace (str, optional): Defaults to None. Chrome trace file of the phases, which enables profiling
+        statistics (bool or list, optional): Defaults to False. add the clingo statistics of each solving to the json output, and to the given list if any
     
     Returns:
         dictionary: seeds compounds    
     """
     logger.info(f'Reading draft network from {draft_sbml}')
     try:        
-        draftnet = sbml.readSBMLnetwork_clyngor(draft_sbml, 'draft')
+        draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
     except FileNotFoundError:
         logger.critical(f'File not found: {draft_sbml}')
         sys.exit(1)
@@ -62,6 +66,7 @@ def run_meneseed(draft_sbml, output=None):
     )
     logger.info('\n'.join(seeds))
 
+    profiling.add_report(results)
     if output:
         with open(output, "w") as output_file:
             json.dump(results, output_file, indent=True, sort_keys=True)
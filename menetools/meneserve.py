@@ -0,0 +1,454 @@
+#!python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017-2024 Clémence Frioux & Arnaud Belcour - Inria Dyliss - Pleiade
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+import json
+import logging
+import os
+import socketserver
+import stat
+import sys
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from menetools import expansion, query, sbml
+from menetools.meneacti import acti_results
+from menetools.menecheck import check_results
+from menetools.menecof import get_needed_cofactors, read_cofactors
+from menetools.menepath import compute_target_paths, path_instance
+from menetools.menescope import scope_results
+from clyngor.as_pyasp import TermSet, Atom
+from xml.etree.ElementTree import ParseError
+
+logger = logging.getLogger('menetools.meneserve')
+
+
+class ResidentNetwork:
+    """Metabolic network parsed once and kept in memory by the server, with
+    the structures derived from it built at the first request needing them.
+    """
+
+    def __init__(self, draft_sbml):
+        """
+        Args:
+            draft_sbml (str): SBML metabolic network file
+        """
+        self.draft_sbml = draft_sbml
+        self.mtime = os.path.getmtime(draft_sbml)
+        try:
+            self.draftnet = sbml.readSBMLnetwork_indexed(draft_sbml, 'draft')
+        except ParseError:
+            raise ValueError(f'Invalid syntax in SBML file: {draft_sbml}')
+        except SystemExit:
+            raise ValueError(f'Invalid SBML file: {draft_sbml}')
+        self._graph = None
+        self._programs = {}
+        self._cofactors = None
+
+    @property
+    def graph(self):
+        """MetabolicGraph: network indexed for the native expansion
+        """
+        if self._graph is None:
+            self._graph = expansion.MetabolicGraph(self.draftnet)
+        return self._graph
+
+    def program(self, prg, predicates):
+        """get an encoding grounded once with the network, where the atoms of
+        predicates can be set for each network metabolite
+
+        Args:
+            prg (str): path to the ASP encoding
+            predicates (tuple): predicates of the atoms changing between requests (seed, target)
+
+        Returns:
+            query.GroundedProgram: grounded program
+        """
+        if prg not in self._programs:
+            variable_atoms = [Atom(predicate, [query.quote(metabolite)])
+                              for predicate in predicates for metabolite in self.graph.metabolites]
+            self._programs[prg] = query.GroundedProgram(prg, [self.draftnet], variable_atoms)
+        return self._programs[prg]
+
+    @property
+    def cofactors(self):
+        """TermSet: weighted cofactor atoms made of the species of the network
+        """
+        if self._cofactors is None:
+            species_and_weights = sbml.make_weighted_list_of_species(self.draft_sbml)
+            self._cofactors = TermSet(Atom('cofactor', [query.quote(elem), species_and_weights[elem]])
+                                      for elem in species_and_weights)
+        return self._cofactors
+
+
+class NetworkStore:
+    """Networks and species files kept in memory between requests, read again
+    when their file is modified.
+    """
+
+    def __init__(self):
+        self.networks = {}
+        self.species_files = {}
+
+    def network(self, draft_sbml):
+        """get a resident network, reading it if needed
+
+        Args:
+            draft_sbml (str): SBML metabolic network file
+
+        Returns:
+            ResidentNetwork: parsed network
+        """
+        draft_sbml = os.path.abspath(draft_sbml)
+        network = self.networks.get(draft_sbml)
+        if network is None or network.mtime != os.path.getmtime(draft_sbml):
+            logger.info(f'Reading draft network from {draft_sbml}')
+            network = ResidentNetwork(draft_sbml)
+            self.networks[draft_sbml] = network
+        return network
+
+    def species(self, species, predicate):
+        """get the atoms of species given as a list of identifiers or as a
+        SBML file, which is kept in memory
+
+        Args:
+            species (list or str): species identifiers or SBML file
+            predicate (str): predicate of the atoms (seed or target)
+
+        Returns:
+            TermSet: species atoms
+        """
+        if isinstance(species, list):
+            return identifier_atoms(species, predicate)
+        species_sbml = os.path.abspath(species)
+        mtime = os.path.getmtime(species_sbml)
+        key = (species_sbml, predicate)
+        if key not in self.species_files or self.species_files[key][0] != mtime:
+            try:
+                atoms = sbml.readSBMLspecies_clyngor(species_sbml, predicate)
+            except ParseError:
+                raise ValueError(f'Invalid syntax in SBML file: {species}')
+            except SystemExit:
+                raise ValueError(f'Invalid SBML file: {species}')
+            self.species_files[key] = (mtime, atoms)
+        return self.species_files[key][1]
+
+    def cofactors(self, cofactors, weights=False):
+        """get the cofactor atoms given as a list of identifiers or as a
+        cofactors file, one per line as for mene cof, which is kept in memory
+
+        Args:
+            cofactors (list or str): cofactor identifiers or cofactors file
+            weights (bool, optional): Defaults to False. True if the cofactors file is weighted
+
+        Returns:
+            TermSet: cofactor atoms
+        """
+        if isinstance(cofactors, list):
+            return identifier_atoms(cofactors, 'cofactor')
+        cofactors_txt = os.path.abspath(cofactors)
+        mtime = os.path.getmtime(cofactors_txt)
+        key = (cofactors_txt, 'cofactor', bool(weights))
+        if key not in self.species_files or self.species_files[key][0] != mtime:
+            self.species_files[key] = (mtime, read_cofactors(cofactors_txt, weights))
+        return self.species_files[key][1]
+
+
+def identifier_atoms(identifiers, predicate):
+    """build the atoms of identifiers given in a request, rejecting the
+    identifiers that cannot be species or reaction IDs
+
+    Args:
+        identifiers (list): species identifiers
+        predicate (str): predicate of the atoms (seed, target or cofactor)
+
+    Raises:
+        ValueError: if an identifier is not a string or contains quotes, backslashes or control characters
+
+    Returns:
+        TermSet: atoms of the identifiers
+    """
+    atoms = TermSet()
+    for identifier in identifiers:
+        if (not isinstance(identifier, str) or not identifier or not identifier.isprintable()
+                or '"' in identifier or '\\' in identifier):
+            raise ValueError(f'Invalid identifier: {identifier!r}')
+        atoms.add(Atom(predicate, [query.quote(identifier)]))
+    return atoms
+
+
+def split_species(network, species):
+    """separate the species atoms of network metabolites from the others,
+    which can not be set in the resident groundings
+
+    Args:
+        network (ResidentNetwork): metabolic network
+        species (TermSet): seed or target atoms
+
+    Returns:
+        TermSet, set: atoms of network metabolites and identifiers of the other species
+    """
+    inside = TermSet()
+    outside = set()
+    for atom in species:
+        metabolite = expansion.unquote(atom.arguments[0])
+        if metabolite in network.graph.metabolites:
+            inside.add(atom)
+        else:
+            outside.add(metabolite)
+    return inside, outside
+
+
+def extend_model(model, predicate, arguments):
+    """add unary atoms to a model
+
+    Args:
+        model (dict): model read by_arity
+        predicate (str): predicate of the atoms
+        arguments (iterable): arguments of the atoms
+
+    Returns:
+        dict: new model
+    """
+    extension = expansion.as_model(**{predicate: arguments})
+    model = dict(model)
+    for key, atoms in extension.items():
+        model[key] = model.get(key, frozenset()) | atoms
+    return model
+
+
+def get_model(network, engine, command, seeds, targets=None):
+    """compute the scope, acti or check model with the native expansion or
+    with the resident grounding of the network
+
+    The resident groundings only know the seeds and targets that are network
+    metabolites. The other ones are absent seeds for the scope, have no
+    effect on the activated reactions, and are producible targets only if
+    they are seeds.
+
+    Args:
+        network (ResidentNetwork): metabolic network
+        engine (str): 'asp' or 'native'
+        command (str): scope, acti or check
+        seeds (TermSet): seed atoms
+        targets (TermSet, optional): Defaults to None. target atoms for check
+
+    Returns:
+        dict: model
+    """
+    if engine == 'native':
+        if command == 'scope':
+            return expansion.scope_model(network.graph, seeds)
+        if command == 'acti':
+            return expansion.acti_model(network.graph, seeds)
+        return expansion.unproducible_model(network.graph, seeds, targets)
+
+    seeds_inside, seeds_outside = split_species(network, seeds)
+    if command == 'scope':
+        model = network.program(query.scope_prg, ('seed',)).last_model(seeds_inside)[0]
+        return extend_model(model, 'absent_seed', seeds_outside)
+    if command == 'acti':
+        return network.program(query.acti_prg, ('seed',)).last_model(seeds_inside)[0]
+    targets_inside, targets_outside = split_species(network, targets)
+    model = network.program(query.unproducible_prg, ('seed', 'target')).last_model(seeds_inside, targets_inside)[0]
+    model = extend_model(model, 'producible_target', targets_outside & seeds_outside)
+    return extend_model(model, 'unproducible_target', targets_outside - seeds_outside)
+
+
+def handle_request(store, request):
+    """answer a scope, check, acti, path or cof request
+
+    Args:
+        store (NetworkStore): resident networks
+        request (dict): command, draftnet, seeds, targets and options
+
+    Returns:
+        dict: results of the command, as in the json output of the corresponding mene command
+    """
+    if not isinstance(request, dict):
+        raise ValueError('Invalid request: a json object is expected')
+    command = request.get('command')
+    if command not in ('scope', 'check', 'acti', 'path', 'cof'):
+        raise ValueError(f'Invalid command: {command}')
+    for key in ['draftnet', 'seeds'] + (['targets'] if command in ('check', 'path', 'cof') else []):
+        if key not in request:
+            raise ValueError(f'Missing {key} in {command} request')
+    if not isinstance(request['draftnet'], str):
+        raise ValueError('Invalid draftnet: a SBML file is expected')
+    for key in ['seeds', 'targets', 'cofactors']:
+        if key in request and not isinstance(request[key], (str, list)):
+            raise ValueError(f'Invalid {key}: a file or a list of identifiers is expected')
+    engine = request.get('engine', 'asp')
+    if engine not in ('asp', 'native'):
+        raise ValueError(f'Invalid engine: {engine}')
+
+    network = store.network(request['draftnet'])
+    seeds = store.species(request['seeds'], 'seed')
+    if command == 'scope':
+        return scope_results(get_model(network, engine, command, seeds))
+    if command == 'acti':
+        return acti_results(get_model(network, engine, command, seeds))
+
+    targets = store.species(request['targets'], 'target')
+    results = check_results(get_model(network, engine, 'check', seeds, targets))
+    if command == 'check':
+        return results
+
+    enumeration = request.get('enumerate', False)
+    max_solutions = request.get('max_solutions')
+    if command == 'path':
+        min_size = request.get('min', False)
+        instances = path_instance(network.draftnet, seeds)
+        paths = {}
+        for target in sorted(results['producible_target']):
+            paths[target] = compute_target_paths(instances, target, min_size, enumeration,
+                                                 max_solutions=max_solutions)
+        path_results = {'unproducible_targets_lst': results['unproducible_target']}
+        for key in ['one_path', 'union_path', 'intersection_path'] + (['all_paths'] if enumeration else []):
+            path_results[key] = {target: paths[target][key] for target in paths}
+        return path_results
+
+    if 'cofactors' in request:
+        weighted = bool(request.get('weights', False)) and not isinstance(request['cofactors'], list)
+        cofactors = store.cofactors(request['cofactors'], weighted)
+    else:
+        cofactors = network.cofactors
+        weighted = True
+    cof_models = query.get_cofs_multishot(network.draftnet, seeds, targets, cofactors, weighted, enumeration,
+                                          max_solutions or 0)
+    cof_results = {'unprod': results['unproducible_target'], 'optimum': cof_models['optimum']}
+    optimal = cof_models['optimal'][0]
+    cof_results['chosen_cofactors'] = get_needed_cofactors(optimal)
+    cof_results['newly_producible_targets'] = [a[0] for a in optimal.get(('newly_prod', 1), ())]
+    cof_results['intersection_icofactors'] = get_needed_cofactors(cof_models['intersection'][0])
+    cof_results['union_icofactors'] = get_needed_cofactors(cof_models['union'][0])
+    if enumeration:
+        cof_results['all_optimal'] = [get_needed_cofactors(model) for model, cost in cof_models['all_optimal']]
+    return cof_results
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler answering json requests posted to the server, and listing
+    the resident networks on GET.
+    """
+
+    def send_json(self, code, content):
+        body = json.dumps(content, sort_keys=True).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.send_json(200, {'networks': sorted(self.server.store.networks)})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            results = handle_request(self.server.store, request)
+        except FileNotFoundError as error:
+            self.send_json(404, {'error': f'File not found: {error.filename}'})
+        except (ValueError, OSError) as error:
+            self.send_json(400, {'error': str(error)})
+        except RuntimeError as error:
+            # clingo rejects the facts or the options of the request
+            self.send_json(400, {'error': f'Invalid input: {error}'})
+        except SystemExit:
+            # the readers exit on invalid inputs
+            self.send_json(400, {'error': 'Invalid input files'})
+        except Exception:
+            logger.exception('Error while answering a request')
+            self.send_json(500, {'error': 'Internal server error'})
+        else:
+            self.send_json(200, results)
+
+    def address_string(self):
+        # client address of Unix sockets is empty
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class UnixHTTPServer(socketserver.UnixStreamServer):
+        """HTTP server listening on a Unix socket."""
+else:
+    # no Unix sockets on Windows
+    UnixHTTPServer = None
+
+
+def make_server(host='127.0.0.1', port=8000, socket_path=None, store=None):
+    """create the server, on a Unix socket if socket_path is given and on
+    host:port otherwise
+
+    Args:
+        host (str, optional): Defaults to '127.0.0.1'. address to listen to
+        port (int, optional): Defaults to 8000. port to listen to, 0 for any free port
+        socket_path (str, optional): Defaults to None. Unix socket file
+        store (NetworkStore, optional): Defaults to None. resident networks, new store if None
+
+    Returns:
+        socketserver.BaseServer: server, requests are answered one at a time
+    """
+    if socket_path:
+        if UnixHTTPServer is None:
+            raise ValueError('Unix sockets are not supported on this platform, use host and port')
+        if os.path.lexists(socket_path):
+            # only the stale socket of a previous server is replaced
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise ValueError(f'{socket_path} exists and is not a socket')
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, RequestHandler)
+    else:
+        server = HTTPServer((host, port), RequestHandler)
+    server.store = store if store is not None else NetworkStore()
+    return server
+
+
+def run_meneserve(host='127.0.0.1', port=8000, socket_path=None, preload=None):
+    """answer scope, check, acti, path and cof json requests, keeping the
+    parsed networks, and their groundings, in memory between requests
+
+    Args:
+        host (str, optional): Defaults to '127.0.0.1'. address to listen to
+        port (int, optional): Defaults to 8000. port to listen to
+        socket_path (str, optional): Defaults to None. Unix socket file, instead of host:port
+        preload (list, optional): Defaults to None. SBML networks read before listening
+    """
+    if socket_path and UnixHTTPServer is None:
+        logger.critical('Unix sockets are not supported on this platform, use --host and --port')
+        sys.exit(1)
+    if socket_path and os.path.lexists(socket_path) and not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+        logger.critical(f'{socket_path} exists and is not a socket, give another --socket file')
+        sys.exit(1)
+    store = NetworkStore()
+    for draft_sbml in preload or []:
+        store.network(draft_sbml)
+    server = make_server(host, port, socket_path, store)
+    if socket_path:
+        logger.info(f'Listening on {socket_path}')
+    else:
+        logger.info(f'Listening on http://{server.server_address[0]}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017-2024 Clémence Frioux & Arnaud Belcour - Inria Dyliss - Pleiade
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""Compact representation of a metabolic network, with interned metabolite and
+reaction IDs and the reactants and products of the reactions stored as
+compressed sparse row arrays. It is turned into ASP facts only when a solver
+needs them.
+"""
+
+import re
+
+from array import array
+
+from clyngor.as_pyasp import Atom
+
+
+def quote(name):
+    """write a string as an ASP string
+
+    Args:
+        name (str): string without quotes
+
+    Returns:
+        str: quoted and escaped string
+    """
+    return '"' + name.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def unquote(string):
+    """read an ASP string written by quote
+
+    Args:
+        string (str): quoted and escaped string
+
+    Returns:
+        str: string without quotes
+    """
+    return re.sub(r'\\(.)', lambda match: '\n' if match.group(1) == 'n' else match.group(1), string[1:-1])
+
+
+class Network:
+    """Metabolic network indexed by integers.
+
+    Metabolites and reactions are numbered in the order they are added. The
+    reactants of reaction i are reactant_indices[reactant_offsets[i]:reactant_offsets[i + 1]],
+    and the same for products. Iterating over a network yields its dreaction,
+    reversible, reactant and product atoms, so that it can be given wherever
+    the TermSet of readSBMLnetwork_clyngor is expected.
+    """
+
+    def __init__(self):
+        self.metabolites = []
+        self.reactions = []
+        self.metabolite_index = {}
+        self.reaction_index = {}
+        self.reversible = array('b')
+        self.reactant_offsets = array('i', [0])
+        self.reactant_indices = array('i')
+        self.product_offsets = array('i', [0])
+        self.product_indices = array('i')
+
+    def intern(self, metabolite):
+        """get the index of a metabolite, numbering it if it is new
+
+        Args:
+            metabolite (str): metabolite ID
+
+        Returns:
+            int: metabolite index
+        """
+        index = self.metabolite_index.get(metabolite)
+        if index is None:
+            index = len(self.metabolites)
+            self.metabolite_index[metabolite] = index
+            self.metabolites.append(metabolite)
+        return index
+
+    def add_reaction(self, reaction, reversible, reactants, products):
+        """add a reaction at the end of the network
+
+        Args:
+            reaction (str): reaction ID, not yet in the network
+            reversible (bool): reversible reaction
+            reactants (iterable): reactant IDs
+            products (iterable): product IDs
+
+        Returns:
+            int: reaction index
+        """
+        index = len(self.reactions)
+        self.reaction_index[reaction] = index
+        self.reactions.append(reaction)
+        self.reversible.append(reversible)
+        # distinct species, as the atoms of a TermSet
+        self.reactant_indices.extend(self.intern(metabolite) for metabolite in dict.fromkeys(reactants))
+        self.reactant_offsets.append(len(self.reactant_indices))
+        self.product_indices.extend(self.intern(metabolite) for metabolite in dict.fromkeys(products))
+        self.product_offsets.append(len(self.product_indices))
+        return index
+
+    def merged(self, definitions):
+        """get a copy of the network where reactions are extended with other
+        definitions, as the union of the facts of all their definitions
+
+        Args:
+            definitions (dict): reversible, reactant and product IDs of the other
+                definitions of network reactions, by reaction ID
+
+        Returns:
+            Network: new network, with the reactions in the same order
+        """
+        network = Network()
+        for reaction, reversible, reactants, products in self.items():
+            if reaction in definitions:
+                other_reversible, other_reactants, other_products = definitions[reaction]
+                reversible = reversible or other_reversible
+                reactants = reactants + other_reactants
+                products = products + other_products
+            network.add_reaction(reaction, reversible, reactants, products)
+        return network
+
+    def reactants(self, reaction):
+        """get the reactants of a reaction
+
+        Args:
+            reaction (int): reaction index
+
+        Returns:
+            array: metabolite indices
+        """
+        return self.reactant_indices[self.reactant_offsets[reaction]:self.reactant_offsets[reaction + 1]]
+
+    def products(self, reaction):
+        """get the products of a reaction
+
+        Args:
+            reaction (int): reaction index
+
+        Returns:
+            array: metabolite indices
+        """
+        return self.product_indices[self.product_offsets[reaction]:self.product_offsets[reaction + 1]]
+
+    def items(self):
+        """iterate over the reactions with their IDs
+
+        Yields:
+            str, bool, list, list: reaction, reversible, reactant and product IDs
+        """
+        metabolites = self.metabolites
+        for index, reaction in enumerate(self.reactions):
+            yield (reaction, bool(self.reversible[index]),
+                   [metabolites[metabolite] for metabolite in self.reactants(index)],
+                   [metabolites[metabolite] for metabolite in self.products(index)])
+
+    def __len__(self):
+        return (len(self.reactions) + sum(self.reversible)
+                + len(self.reactant_indices) + len(self.product_indices))
+
+    def __iter__(self):
+        quoted = [quote(metabolite) for metabolite in self.metabolites]
+        for index, reaction in enumerate(self.reactions):
+            reaction = quote(reaction)
+            yield Atom('dreaction', [reaction])
+            if self.reversible[index]:
+                yield Atom('reversible', [reaction])
+            for metabolite in self.reactants(index):
+                yield Atom('reactant', [quoted[metabolite], reaction])
+            for metabolite in self.products(index):
+                yield Atom('product', [quoted[metabolite], reaction])
@@ -0,0 +1,407 @@
+# Copyright (C) 2017-2024 Clémence Frioux & Arnaud Belcour - Inria Dyliss - Pleiade
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+import contextlib
+import functools
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+logger = logging.getLogger('menetools.profiling')
+
+# profiler recording the phases of the current run, None when not profiling
+active = None
+
+# solver statistics of the current run, None when not collected
+solver_statistics = None
+
+# process of the current run, the other processes are its workers
+run_pid = None
+
+# timed functions being called and task of the worker, labelling the solver statistics
+calls = []
+task = None
+
+# context of the phases when not profiling
+no_phase = contextlib.nullcontext()
+
+
+def peak_rss():
+    """get the peak resident memory of the process, since the last
+    reset_peak_rss on Linux
+
+    Returns:
+        int: peak resident memory in kB, None where it cannot be read, as on Windows
+    """
+    try:
+        with open('/proc/self/status') as status:
+            return int(re.search(r'VmHWM:\s+(\d+)', status.read()).group(1))
+    except (OSError, AttributeError):
+        pass
+    try:
+        # Unix only
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def reset_peak_rss():
+    """reset the peak resident memory of the process to its current resident
+    memory, which is only possible on Linux
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+class Profiler:
+    """Wall time and peak memory of the phases of a run.
+
+    The phases are nested: a run_mene* function contains SBML readings and
+    query.py calls, which contain the fact loading, grounding, solving and
+    model decoding of clingo. The peak resident memory of each phase is
+    measured from its start on Linux, and from the start of the process
+    elsewhere.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.phases = []
+        self.stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name, category, **args):
+        """record the wall time and peak memory of a phase
+
+        Args:
+            name (str): name of the phase
+            category (str): category of the phase, the module of the call
+            **args: details of the phase given in the Chrome trace
+        """
+        current = peak_rss()
+        if current is not None:
+            for outer in self.stack:
+                outer['peak_rss_kb'] = max(outer['peak_rss_kb'], current)
+            reset_peak_rss()
+        record = {'name': name, 'category': category, 'pid': self.pid, 'depth': len(self.stack),
+                  'start': time.perf_counter(), 'peak_rss_kb': None if current is None else 0}
+        if args:
+            record['args'] = args
+        self.stack.append(record)
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - record['start']
+            if current is not None:
+                record['peak_rss_kb'] = max(record['peak_rss_kb'], peak_rss())
+            # a phase spanning the models of a generator may not end last
+            index = self.stack.index(record)
+            del self.stack[index]
+            if index and current is not None:
+                outer = self.stack[index - 1]
+                outer['peak_rss_kb'] = max(outer['peak_rss_kb'], record['peak_rss_kb'])
+            self.phases.append(record)
+
+    def report(self):
+        """get the phases recorded, the unfinished ones with their wall time so far
+
+        Returns:
+            dict: phases (list of dict sorted by start, in seconds from the start
+            of the profiler) and summary (count, wall and peak memory by phase name)
+        """
+        now = time.perf_counter()
+        phases = []
+        for record in self.phases + self.stack:
+            phase = dict(record, start=record['start'] - self.origin)
+            if 'wall' not in record:
+                phase['wall'] = now - record['start']
+            phases.append(phase)
+        phases.sort(key=lambda phase: (phase['start'], phase['depth']))
+        summary = {}
+        for phase in phases:
+            total = summary.setdefault(phase['name'], {'category': phase['category'], 'count': 0,
+                                                       'wall': 0.0, 'peak_rss_kb': 0})
+            total['count'] += 1
+            total['wall'] += phase['wall']
+            if phase['peak_rss_kb'] is None:
+                total['peak_rss_kb'] = None
+            elif total['peak_rss_kb'] is not None:
+                total['peak_rss_kb'] = max(total['peak_rss_kb'], phase['peak_rss_kb'])
+        return {'phases': phases, 'summary': summary}
+
+    def write_chrome_trace(self, filename):
+        """write the phases in the Chrome trace event format, readable by
+        chrome://tracing or https://ui.perfetto.dev
+
+        Args:
+            filename (str): output file
+        """
+        events = []
+        for phase in self.report()['phases']:
+            events.append({'name': phase['name'], 'cat': phase['category'], 'ph': 'X',
+                           'ts': phase['start'] * 1e6, 'dur': phase['wall'] * 1e6,
+                           'pid': phase['pid'], 'tid': phase['pid'],
+                           'args': dict(phase.get('args', {}), peak_rss_kb=phase['peak_rss_kb'])})
+        with open(filename, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+
+    def log_summary(self):
+        """log the wall time and peak memory by phase name, the longest first
+        """
+        summary = self.report()['summary']
+        logger.info('\nProfile (phase, count, wall time, peak memory):')
+        for name, total in sorted(summary.items(), key=lambda item: -item[1]['wall']):
+            memory = 'n/a' if total['peak_rss_kb'] is None else f"{total['peak_rss_kb'] / 1024:.1f} MB"
+            logger.info(f"{name}\t{total['count']}\t{total['wall']:.3f} s\t{memory}")
+
+
+def phase(name, category, **args):
+    """context of a phase recorded by the active profiler, if any
+
+    Args:
+        name (str): name of the phase
+        category (str): category of the phase
+        **args: details of the phase given in the Chrome trace
+
+    Returns:
+        context manager: phase of the active profiler, or a context doing nothing
+    """
+    if active is None:
+        return no_phase
+    return active.phase(name, category, **args)
+
+
+def timed(function):
+    """record each call of a function as a phase named after its module and
+    itself, as query.get_scope, in the category of its module
+    """
+    category = function.__module__.split('.')[-1]
+    name = category + '.' + function.__name__
+
+    @functools.wraps(function)
+    def timed_function(*args, **kwargs):
+        if active is None and solver_statistics is None:
+            return function(*args, **kwargs)
+        calls.append(name)
+        try:
+            with phase(name, category):
+                return function(*args, **kwargs)
+        finally:
+            calls.pop()
+    return timed_function
+
+
+def profiled(function):
+    """add the profile, profile_trace and statistics keyword arguments to a
+    run_mene* function, which activate a profiler during the run
+
+    profile is True or a Profiler object to record the phases in,
+    profile_trace a Chrome trace file to write the phases to, and statistics
+    True or a list to append the statistics of each solving to.
+    """
+    @functools.wraps(function)
+    def profiled_function(*args, profile=False, profile_trace=None, statistics=False, **kwargs):
+        global active, solver_statistics, run_pid
+        # an empty list given to fill is false
+        collect = isinstance(statistics, list) or bool(statistics)
+        if not profile and not profile_trace and not collect:
+            return function(*args, **kwargs)
+        profiler = None
+        if profile or profile_trace:
+            profiler = profile if isinstance(profile, Profiler) else Profiler()
+        records = None
+        if collect:
+            records = statistics if isinstance(statistics, list) else []
+        previous = active, solver_statistics, run_pid
+        active, solver_statistics, run_pid = profiler, records, os.getpid()
+        try:
+            with phase(function.__name__, 'run'):
+                result = function(*args, **kwargs)
+        finally:
+            active, solver_statistics, run_pid = previous
+        if profiler is not None:
+            profiler.log_summary()
+            if profile_trace:
+                profiler.write_chrome_trace(profile_trace)
+        if records is not None:
+            log_statistics(records)
+        return result
+    return profiled_function
+
+
+def add_statistics(record):
+    """add the statistics of a solving to the current run, labelled with
+    the timed function solving it and the task of the worker
+
+    Args:
+        record (dict): statistics of the solving
+    """
+    if solver_statistics is not None:
+        record['call'] = calls[-1] if calls else None
+        if task is not None:
+            record['task'] = task
+        solver_statistics.append(record)
+
+
+def summarize_statistics(records):
+    """sum the statistics of the solvings of a run
+
+    Args:
+        records (list): statistics of the solvings
+
+    Returns:
+        dict: number of solvings, largest grounding, total search effort and
+        whether the optimality of all the optimisations was proven
+    """
+    optimisations = [record for record in records if record['optimality_proven'] is not None]
+    return {'solvings': len(records),
+            'max_atoms': max((record['atoms'] for record in records), default=0),
+            'max_rules': max((record['rules'] for record in records), default=0),
+            'choices': sum(record['choices'] for record in records),
+            'conflicts': sum(record['conflicts'] for record in records),
+            'models': sum(record['models'] for record in records),
+            'solve_time': sum(record['solve_time'] for record in records),
+            'optimisation_time': sum(record['solve_time'] for record in optimisations),
+            'optimality_proven': all(record['optimality_proven'] for record in optimisations)
+            if optimisations else None}
+
+
+def log_statistics(records):
+    """log the statistics of the solvings of a run by timed function
+
+    Args:
+        records (list): statistics of the solvings
+    """
+    logger.info('\nSolver statistics (call, solvings, max atoms, max rules, choices, conflicts, models, solve time):')
+    calls_records = {}
+    for record in records:
+        calls_records.setdefault(record['call'], []).append(record)
+    for call, call_records in calls_records.items():
+        total = summarize_statistics(call_records)
+        logger.info(f"{call}\t{total['solvings']}\t{total['max_atoms']}\t{total['max_rules']}\t{total['choices']}\t"
+                    f"{total['conflicts']}\t{total['models']}\t{total['solve_time']:.3f} s")
+
+
+def report():
+    """get the report of the current run
+
+    Returns:
+        dict: profile (Profiler.report) when profiling, statistics (solvings
+        and their summary) when collecting the solver statistics
+    """
+    run_report = {}
+    if active is not None:
+        run_report['profile'] = active.report()
+    if solver_statistics is not None:
+        run_report['statistics'] = {'solvings': solver_statistics,
+                                    'summary': summarize_statistics(solver_statistics)}
+    return run_report
+
+
+def add_report(results):
+    """add the report of the current run to its results
+
+    Args:
+        results (dict): results written in the json output
+    """
+    results.update(report())
+
+
+def write_report_line(output_file):
+    """write the report of the current run as the last line of a jsonl output
+
+    Args:
+        output_file (file): jsonl output file
+    """
+    run_report = report()
+    if run_report:
+        output_file.write(json.dumps(run_report, sort_keys=True) + '\n')
+
+
+def worker_settings():
+    """
+    Returns:
+        tuple: whether the current run is profiled and collects the solver statistics
+    """
+    return active is not None, solver_statistics is not None
+
+
+def init_worker(settings):
+    """instrument a worker process of a run like the run
+
+    A worker gets a new profiler and statistics list, sent back with the
+    results of its tasks, while a run in a single process keeps its own.
+
+    Args:
+        settings (tuple): worker_settings of the run
+    """
+    global active, solver_statistics
+    if os.getpid() == run_pid:
+        return
+    profile, statistics = settings
+    active = Profiler() if profile else None
+    solver_statistics = [] if statistics else None
+
+
+def merge(results):
+    """add the phases and the solver statistics sent by a worker with the
+    results of a task to the current run
+
+    Args:
+        results (dict): results of a worker_task, whose instrumentation is removed
+    """
+    phases = results.pop('profile_phases', [])
+    records = results.pop('solver_statistics', [])
+    if active is not None:
+        active.phases.extend(phases)
+    if solver_statistics is not None:
+        solver_statistics.extend(records)
+
+
+def worker_task(function):
+    """record each task of a worker as a phase labelling its solver
+    statistics, and send the phases and statistics recorded in a worker
+    process with the results of the task, to be given to merge
+    """
+    category = function.__module__.split('.')[-1]
+    name = category + '.' + function.__name__
+
+    @functools.wraps(function)
+    def worker_function(argument):
+        global task
+        if active is None and solver_statistics is None:
+            return function(argument)
+        task = str(argument)
+        try:
+            with phase(name, category, argument=task):
+                results = function(argument)
+        finally:
+            task = None
+        if os.getpid() != run_pid:
+            if active is not None and active.phases:
+                results['profile_phases'], active.phases = active.phases, []
+            if solver_statistics:
+                results['solver_statistics'] = solver_statistics[:]
+                del solver_statistics[:]
+        return results
+    return worker_function
@@ -13,9 +13,15 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
 import os
-import clyngor
+import time
+import contextlib
+import clingo
+import weakref
 import logging
-from menetools import utils
+
+from collections import defaultdict
+from menetools import profiling
+from menetools.network import Network, quote, unquote
 
 logger = logging.getLogger('menetools.query')
 
@@ -30,272 +36,899 @@ cof_w_prg = os.path.join(*[root, 'encodings', 'get_cofs_weighted.lp'])
 dead_prg = os.path.join(*[root, 'encodings', 'get_deadends.lp'])
 seed_prg = os.path.join(*[root, 'encodings', 'get_seeds.lp'])
 inc_scope_prg = os.path.join(*[root, 'encodings', 'get_incremental_scope.lp'])
+portfolio_cfg = os.path.join(*[root, 'encodings', 'portfolio.cfg'])
 
+# projective enumeration onto the shown atoms, with the activity heuristic
+# and the progress saving of the backtracking enumerator
+project_mode = 'show,3'
 
-def get_scope(draft, seeds):
-    draft_f = utils.to_file(draft)
-    seed_f =  utils.to_file(seeds)
-    prg = [scope_prg, draft_f, seed_f]
-    options = ''
-    # solver = Gringo4Clasp()
-    # models = solver.run(prg,collapseTerms=True,collapseAtoms=False)
+# symbol tables of the control objects created in compact mode
+symbol_tables = weakref.WeakKeyDictionary()
+
+# encodings of the control objects, labelling their solver statistics
+control_encodings = weakref.WeakKeyDictionary()
+
+
+def compact_facts():
+    """check whether the facts are sent to clingo with integer IDs, which is
+    set with the MENETOOLS_COMPACT_FACTS environment variable
+
+    Returns:
+        bool: True if MENETOOLS_COMPACT_FACTS is set to a value other than 0
+    """
+    return os.environ.get('MENETOOLS_COMPACT_FACTS', '0') not in ('', '0')
+
+
+class SymbolTable:
+    """Integer IDs of the strings (species and reactions) sent to clingo.
+
+    The i-th string of the table is sent as the number -(i + 1). The numbers
+    of the encodings (steps, weights) are positive, so decoding a model only
+    has to look up the negative numbers in the table.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.numbers = {}
+
+    def number(self, name):
+        """get the symbol of a string, numbering it if it is new
+
+        Args:
+            name (str): string without quotes
+
+        Returns:
+            clingo.Symbol: negative number standing for the string
+        """
+        number = self.numbers.get(name)
+        if number is None:
+            self.names.append(name)
+            number = clingo.Number(-len(self.names))
+            self.numbers[name] = number
+        return number
+
+    def name(self, number):
+        """get the string of a number of the table
+
+        Args:
+            number (int): negative number
+
+        Returns:
+            str: string without quotes
+        """
+        return self.names[-number - 1]
+
+
+def to_symbol(argument, table=None):
+    """convert an Atom argument into a clingo symbol
+
+    Args:
+        argument (str or int): argument as written in ASP (quoted string, integer or constant)
+        table (SymbolTable, optional): Defaults to None. table numbering the strings, strings are sent as such if None
+
+    Returns:
+        clingo.Symbol: symbol of the argument
+    """
+    if isinstance(argument, int):
+        return clingo.Number(argument)
+    if len(argument) > 1 and argument[0] == '"' and argument[-1] == '"':
+        if table is not None:
+            return table.number(unquote(argument))
+        return clingo.String(unquote(argument))
+    if argument.lstrip('-').isdigit():
+        return clingo.Number(int(argument))
+    return clingo.Function(argument)
+
+
+def to_function(atom, table=None):
+    """convert an Atom into a clingo symbol
+
+    Args:
+        atom (Atom): atom of a TermSet
+        table (SymbolTable, optional): Defaults to None. table numbering the strings
+
+    Returns:
+        clingo.Symbol: symbol of the atom
+    """
+    return clingo.Function(atom.predicate, [to_symbol(argument, table) for argument in atom.arguments])
+
+
+def network_facts(network, table=None):
+    """write a Network as ASP facts, without building its atoms
+
+    Args:
+        network (Network): integer-indexed metabolic network
+        table (SymbolTable, optional): Defaults to None. table numbering the strings
+
+    Yields:
+        str: dreaction, reversible, reactant and product facts
+    """
+    if table is None:
+        string = quote
+    else:
+        def string(name):
+            return str(table.number(name).number)
+    metabolites = [string(metabolite) for metabolite in network.metabolites]
+    for index, reaction in enumerate(network.reactions):
+        reaction = string(reaction)
+        yield 'dreaction({0}).'.format(reaction)
+        if network.reversible[index]:
+            yield 'reversible({0}).'.format(reaction)
+        for metabolite in network.reactants(index):
+            yield 'reactant({0},{1}).'.format(metabolites[metabolite], reaction)
+        for metabolite in network.products(index):
+            yield 'product({0},{1}).'.format(metabolites[metabolite], reaction)
+
+
+def from_symbol(symbol, table=None):
+    """convert a clingo symbol into a Python value, discarding quotes
+
+    Args:
+        symbol (clingo.Symbol): argument of a symbol in a model
+        table (SymbolTable, optional): Defaults to None. table numbering the strings
+
+    Returns:
+        str or int: value of the argument
+    """
+    if symbol.type == clingo.SymbolType.String:
+        return symbol.string
+    if symbol.type == clingo.SymbolType.Number:
+        if table is not None and symbol.number < 0:
+            return table.name(symbol.number)
+        return symbol.number
+    return str(symbol)
+
+
+def decode(symbols, table=None):
+    """group the atoms of a model by predicate, like clyngor by_arity
+
+    Args:
+        symbols (list): clingo symbols of a model
+        table (SymbolTable, optional): Defaults to None. table numbering the strings
+
+    Returns:
+        dict: arguments indexed by predicate, (predicate, arity) and predicate/arity
+    """
+    with profiling.phase('decode', 'query'):
+        mapping = defaultdict(set)
+        for symbol in symbols:
+            arguments = tuple(from_symbol(argument, table) for argument in symbol.arguments)
+            mapping[symbol.name].add(arguments)
+            mapping[symbol.name, len(arguments)].add(arguments)
+            mapping['{}/{}'.format(symbol.name, len(arguments))].add(arguments)
+        return {predicate: frozenset(arguments) for predicate, arguments in mapping.items()}
+
+
+def add_facts(ctl, instances, table=None):
+    """add the atoms of TermSets as facts of the base program
+
+    The facts are given to clingo as one program text, which is parsed and
+    grounded faster than the same facts added one by one through the backend.
+
+    Args:
+        ctl (clingo.Control): control object, before grounding
+        instances (list): TermSets (or Networks) of facts
+        table (SymbolTable, optional): Defaults to None. table numbering the strings
+    """
+    facts = []
+    for termset in instances:
+        if isinstance(termset, Network):
+            facts.extend(network_facts(termset, table))
+        elif table is None:
+            facts.extend('{0}.'.format(atom) for atom in termset)
+        else:
+            facts.extend('{0}.'.format(to_function(atom, table)) for atom in termset)
+    ctl.add('base', [], ''.join(facts))
+
+
+def optimisation_options(threads=1):
+    """clingo options of the optimisation queries
+
+    With several threads, the threads compete with the configurations of
+    portfolio.cfg, core-guided optimisation on some threads and model-guided
+    optimisation on the others.
+
+    Args:
+        threads (int, optional): Defaults to 1. number of solving threads
+
+    Returns:
+        list: clingo command line options
+    """
+    if threads <= 1:
+        return ['--configuration', 'jumpy', '--opt-strategy=usc,oll']
+    return ['--configuration=' + portfolio_cfg, '--parallel-mode={}'.format(threads),
+            '--sat-prepro=2,iter=20,occ=25,time=240', '--trans-ext=dynamic']
+
+
+def ignore_messages(code, message):
+    """clingo logger discarding grounder information and warnings
+    """
+    pass
+
+
+def control(prg, instances, options='', nmodels=0, compact=None):
+    """create a clingo control object loaded with an encoding and its facts
+
+    Args:
+        prg (str): path to the ASP encoding
+        instances (list): TermSets of facts
+        options (str or list, optional): Defaults to ''. clingo command line options
+        nmodels (int, optional): Defaults to 0. number of models to compute, 0 for all
+        compact (bool, optional): Defaults to None. send the strings as integer IDs, see compact_facts if None
+
+    Returns:
+        clingo.Control: control object ready to be grounded
+    """
+    if compact is None:
+        compact = compact_facts()
+    if isinstance(options, str):
+        options = options.split()
+    with profiling.phase('facts', 'query', encoding=os.path.basename(prg)):
+        ctl = clingo.Control(options + ['--models={}'.format(nmodels)], logger=ignore_messages)
+        ctl.load(prg)
+        table = None
+        if compact:
+            table = SymbolTable()
+            symbol_tables[ctl] = table
+        add_facts(ctl, instances, table)
+    control_encodings[ctl] = os.path.basename(prg)
+    return ctl
+
+
+def ground(ctl, parts=(('base', []),)):
+    """ground parts of the program of a control object
+
+    Args:
+        ctl (clingo.Control): control object
+        parts (list, optional): Defaults to the base program. (name, arguments) of the parts to ground
+    """
+    with profiling.phase('ground', 'query'):
+        ctl.ground(list(parts))
+
+
+def solve(prg, instances, options='', nmodels=0):
+    """ground and solve an encoding in-process with the clingo module
+
+    Args:
+        prg (str): path to the ASP encoding
+        instances (list): TermSets of facts
+        options (str, optional): Defaults to ''. clingo command line options
+        nmodels (int, optional): Defaults to 0. number of models to compute, 0 for all
+
+    Yields:
+        dict, list, bool: model, its cost and whether its optimality is proven
+    """
+    ctl = control(prg, instances, options, nmodels)
+    ground(ctl)
+    yield from solve_control(ctl)
+
+
+class SolveBudget:
+    """Time and search limits shared by the successive solvings of a query.
+
+    A solving stopped by a limit reports the models found so far and the
+    budget records that the results of the query are not complete.
+    """
+
+    def __init__(self, time_limit=None, solve_limit=None):
+        """
+        Args:
+            time_limit (float, optional): Defaults to None. seconds given to all the solvings
+            solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving, <conflicts>[,<restarts>]
+        """
+        self.deadline = None if time_limit is None else time.monotonic() + time_limit
+        self.solve_limit = solve_limit
+        self.complete = True
+
+    def remaining(self):
+        """
+        Returns:
+            float: seconds left before the time limit, None without time limit
+        """
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - time.monotonic())
+
+
+def solve_budget(time_limit=None, solve_limit=None):
+    """create the budget of a query if it has limits
+
+    Args:
+        time_limit (float, optional): Defaults to None. seconds given to all the solvings
+        solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving
+
+    Returns:
+        SolveBudget: budget of the query, None without limits
+    """
+    if time_limit is None and solve_limit is None:
+        return None
+    return SolveBudget(time_limit, solve_limit)
+
+
+def solve_statistics(ctl):
+    """read the clingo statistics of the last solving of a control object
+
+    Args:
+        ctl (clingo.Control): control object after a solving
+
+    Returns:
+        dict: encoding, modes, size of the ground program, search effort,
+        models enumerated, solving time and whether the optimality of the
+        model is proven (None without optimisation)
+    """
+    statistics = ctl.statistics
+    summary = statistics['summary']
+    program = statistics['problem']['lp']
+    solvers = statistics['solving']['solvers']
+    # the enumerations bounded by a cost do not optimise
+    optimisation = bool(summary['costs']) and ctl.configuration.solve.opt_mode.split(',')[0] in ('opt', 'optN')
+    return {'encoding': control_encodings.get(ctl),
+            'enum_mode': ctl.configuration.solve.enum_mode,
+            'opt_mode': ctl.configuration.solve.opt_mode,
+            'atoms': int(program['atoms']),
+            'rules': int(program['rules']),
+            'choices': int(solvers['choices']),
+            'conflicts': int(solvers['conflicts']),
+            'restarts': int(solvers['restarts']),
+            'models': int(summary['models']['enumerated']),
+            'exhausted': bool(summary['exhausted']),
+            'solve_time': summary['times']['solve'],
+            'costs': [int(cost) for cost in summary['costs']],
+            'optimality_proven': bool(summary['models']['optimal']) if optimisation else None}
+
+
+def solve_control(ctl, enum_mode=None, opt_mode=None, nmodels=None, budget=None, first_model=False, project=None):
+    """solve a grounded control object, optionally changing its enumeration
+    and optimization modes so that the same grounding can be solved several times
+
+    Args:
+        ctl (clingo.Control): grounded control object
+        enum_mode (str, optional): Defaults to None. clingo --enum-mode, unchanged if None
+        opt_mode (str, optional): Defaults to None. clingo --opt-mode, unchanged if None
+        nmodels (int, optional): Defaults to None. number of models to compute, 0 for all, unchanged if None
+        budget (SolveBudget, optional): Defaults to None. limits stopping the solving
+        first_model (bool, optional): Defaults to False. wait for the first model even after the time limit
+        project (str, optional): Defaults to None. clingo --project, unchanged if None
+
+    Yields:
+        dict, list, bool: model, its cost and whether its optimality is proven
+    """
+    if enum_mode is not None:
+        ctl.configuration.solve.enum_mode = enum_mode
+    if opt_mode is not None:
+        ctl.configuration.solve.opt_mode = opt_mode
+    if nmodels is not None:
+        ctl.configuration.solve.models = str(nmodels)
+    if project is not None:
+        ctl.configuration.solve.project = project
+    table = symbol_tables.get(ctl)
+    with profiling.phase('solve', 'query', enum_mode=ctl.configuration.solve.enum_mode,
+                         opt_mode=ctl.configuration.solve.opt_mode):
+        try:
+            yield from solve_models(ctl, table, budget, first_model)
+        finally:
+            # also when the caller stops reading the models
+            if profiling.solver_statistics is not None:
+                profiling.add_statistics(solve_statistics(ctl))
+
+
+def solve_models(ctl, table, budget=None, first_model=False):
+    """solve a grounded control object with its current configuration
+
+    Args:
+        ctl (clingo.Control): grounded control object
+        table (SymbolTable): symbol table of the control object, None without compact facts
+        budget (SolveBudget, optional): Defaults to None. limits stopping the solving
+        first_model (bool, optional): Defaults to False. wait for the first model even after the time limit
+
+    Yields:
+        dict, list, bool: model, its cost and whether its optimality is proven
+    """
+    if budget is None:
+        with ctl.solve(yield_=True) as handle:
+            for model in handle:
+                yield decode(model.symbols(shown=True), table), model.cost, model.optimality_proven
+        return
+
+    ctl.configuration.solve.solve_limit = budget.solve_limit or 'umax,umax'
+    requested = int(ctl.configuration.solve.models)
+    found = 0
+    # The solving runs in a background thread so that it can be cancelled
+    # when the time limit is reached while waiting for the next model.
+    with ctl.solve(yield_=True, async_=True) as handle:
+        while True:
+            handle.resume()
+            timeout = budget.remaining()
+            if timeout is None or (first_model and not found):
+                handle.wait()
+            # once the time is up, a search ending at the same time is not awaited
+            elif timeout <= 0 or not handle.wait(timeout):
+                handle.cancel()
+                budget.complete = False
+                return
+            model = handle.model()
+            if model is None:
+                break
+            found += 1
+            yield decode(model.symbols(shown=True), table), model.cost, model.optimality_proven
+        result = handle.get()
+    # the search stops before the end of the search space only when the
+    # requested number of models is reached or the solve limit is hit
+    if not result.exhausted and (requested == 0 or found < requested):
+        budget.complete = False
+        if first_model and not found:
+            # the solve limit was hit before any model, search one without it
+            ctl.configuration.solve.solve_limit = 'umax,umax'
+            ctl.configuration.solve.models = '1'
+            with ctl.solve(yield_=True) as handle:
+                for model in handle:
+                    yield decode(model.symbols(shown=True), table), model.cost, model.optimality_proven
+            ctl.configuration.solve.models = str(requested)
+
+
+def last_model(prg, instances, options=''):
+    """get the last model reported by the solver, i.e. the unique model, the
+    optimal one or the consequences depending on the options
+
+    Args:
+        prg (str): path to the ASP encoding
+        instances (list): TermSets of facts
+        options (str, optional): Defaults to ''. clingo command line options
+
+    Returns:
+        dict, list: model and its cost
+    """
     best_model = None
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity:
-        best_model = model
-    os.unlink(draft_f)
-    os.unlink(seed_f)
+    for model, cost, optimality in solve(prg, instances, options):
+        best_model = model, cost
     return best_model
 
+
+class GroundedProgram:
+    """Encoding grounded once with facts that can be switched on and off.
+
+    The variable atoms are declared as external atoms, so that the program
+    can be solved for any subset of them without being grounded again.
+    """
+
+    def __init__(self, prg, instances, variable_atoms, options=''):
+        """
+        Args:
+            prg (str): path to the ASP encoding
+            instances (list): TermSets of facts shared by all the solvings
+            variable_atoms (iterable): atoms that can be set to true between solvings
+            options (str, optional): Defaults to ''. clingo command line options
+        """
+        self.ctl = control(prg, instances, options)
+        self.table = symbol_tables.get(self.ctl)
+        self.externals = set(to_function(atom, self.table) for atom in variable_atoms)
+        self.true_symbols = set()
+        with self.ctl.backend() as backend:
+            for symbol in self.externals:
+                backend.add_external(backend.add_atom(symbol), clingo.TruthValue.False_)
+        ground(self.ctl)
+
+    def last_model(self, *termsets):
+        """get the last model reported by the solver with only the atoms of
+        termsets set to true among the variable atoms
+
+        Args:
+            *termsets (TermSet): variable atoms to set to true
+
+        Returns:
+            dict, list: model and its cost
+        """
+        symbols = set(to_function(atom, self.table) for termset in termsets for atom in termset)
+        for symbol in self.true_symbols - symbols:
+            self.ctl.assign_external(symbol, False)
+        for symbol in symbols - self.true_symbols:
+            self.ctl.assign_external(symbol, True)
+        self.true_symbols = symbols
+        best_model = None
+        for model, cost, optimality in solve_control(self.ctl):
+            best_model = model, cost
+        return best_model
+
+
+def last_models(prg, instances, variable_instances, options=''):
+    """get the last model reported by the solver for each TermSet of
+    variable_instances, grounding the encoding only once
+
+    The atoms of all variable_instances are declared as external atoms, and
+    only the ones of the current TermSet are set to true before each solving.
+
+    Args:
+        prg (str): path to the ASP encoding
+        instances (list): TermSets of facts shared by all the solvings
+        variable_instances (iterable): TermSets of facts changing between solvings
+        options (str, optional): Defaults to ''. clingo command line options
+
+    Yields:
+        dict, list: model and its cost, for each TermSet of variable_instances
+    """
+    variable_instances = list(variable_instances)
+    program = GroundedProgram(prg, instances, (atom for termset in variable_instances for atom in termset), options)
+    for termset in variable_instances:
+        yield program.last_model(termset)
+
+
+@profiling.timed
+def get_scope(draft, seeds):
+    prg = scope_prg
+    options = ''
+    best_model = last_model(prg, [draft, seeds], options)
+    return best_model[0]
+
+def get_scope_batch(draft, seeds_list):
+    prg = scope_prg
+    options = ''
+    for best_model in last_models(prg, [draft], seeds_list, options):
+        yield best_model[0]
+
+@profiling.timed
 def get_acti(draft, seeds):
-    draft_f = utils.to_file(draft)
-    seed_f =  utils.to_file(seeds)
-    prg = [acti_prg, draft_f, seed_f]
+    prg = acti_prg
     options = ''
-    best_model = None
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity:
-        best_model = model
-    os.unlink(draft_f)
-    os.unlink(seed_f)
-    return best_model
+    best_model = last_model(prg, [draft, seeds], options)
+    return best_model[0]
 
 
+@profiling.timed
 def get_unproducible(draft, seeds, targets):
-    draft_f = utils.to_file(draft)
-    seed_f =  utils.to_file(seeds)
-    target_f = utils.to_file(targets)
-    prg = [unproducible_prg, draft_f, seed_f, target_f ]
+    prg = unproducible_prg
     options = ''
-    # solver = Gringo4Clasp()
-    # models = solver.run(prg,collapseTerms=True,collapseAtoms=False)
-    best_model = None
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity:
-        best_model = model
-    os.unlink(draft_f)
-    os.unlink(seed_f)
-    os.unlink(target_f)
-    return best_model
+    best_model = last_model(prg, [draft, seeds, targets], options)
+    return best_model[0]
 
+def get_unproducible_batch(draft, targets, seeds_list):
+    prg = unproducible_prg
+    options = ''
+    for best_model in last_models(prg, [draft, targets], seeds_list, options):
+        yield best_model[0]
+
+@profiling.timed
 def get_paths(instance, min_bool):
-    instance_f = utils.to_file(instance)
     if min_bool:
-        prg = [min_path_prg, instance_f]
+        prg = min_path_prg
     else:
-        prg = [path_prg, instance_f]
+        prg = path_prg
     options ='--configuration jumpy --opt-strategy=usc,oll'
-    # solver = Gringo4Clasp()
-    # models = solver.run(prg,collapseTerms=True,collapseAtoms=False)
-    best_model = None
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity.with_optimization:
-        best_model = model
-
+    best_model = last_model(prg, [instance], options)
     return best_model #models[0]
 
+@profiling.timed
 def get_union_of_paths(instance, optimum, min_bool):
-    instance_f = utils.to_file(instance)
     if min_bool:
-        prg = [min_path_prg, instance_f]
+        prg = min_path_prg
         options ='--configuration jumpy --opt-strategy=usc,oll --enum-mode=brave --opt-mode=optN,'+str(optimum)
     else:
-        prg = [path_prg, instance_f]
+        prg = path_prg
         options = '--configuration jumpy --opt-strategy=usc,oll --enum-mode=brave --opt-mode=ignore '
-    # solver = Gringo4Clasp(clasp_options=options)
-    # union = solver.run(prg, collapseTerms=True, collapseAtoms=False)
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity.with_optimization:
-        best_model = model
-
-    os.unlink(instance_f)
+    best_model = last_model(prg, [instance], options)
     return best_model #union[0]
 
+@profiling.timed
 def get_intersection_of_paths(instance, optimum, min_bool):
-    instance_f = utils.to_file(instance)
     if min_bool:
-        prg = [min_path_prg, instance_f]
+        prg = min_path_prg
         options = '--configuration jumpy --opt-strategy=usc,oll --enum-mode cautious --opt-mode=optN,' +str(optimum)
     else:
-        prg = [path_prg, instance_f]
+        prg = path_prg
         options = '--configuration jumpy --opt-strategy=usc,oll --enum-mode cautious --opt-mode=ignore'
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity.with_optimization:
-        best_model = model
-    # solver = Gringo4Clasp(clasp_options=options)
-    # intersec = solver.run(prg, collapseTerms=True, collapseAtoms=False)
-    #print(os.path.abspath(instance_f))
-    os.unlink(instance_f)
+    best_model = last_model(prg, [instance], options)
     return best_model #intersec[0]
 
+@profiling.timed
 def get_all_paths(instance, optimum, min_bool, nmodels=0):
-    instance_f = utils.to_file(instance)
     if min_bool:
-        prg = [min_path_prg, instance_f]
+        prg = min_path_prg
         options = '--configuration handy --opt-strategy=usc,oll --opt-mode=optN,' +str(optimum)
     else:
-        prg = [path_prg, instance_f]
+        prg = path_prg
         options = '--configuration handy --opt-strategy=usc,oll --opt-mode=enum'
-    # solver = Gringo4Clasp(clasp_options=options)
-    # models = solver.run(prg, collapseTerms=True, collapseAtoms=False)
-    models = clyngor.solve(prg, options=options, nb_model=nmodels, use_clingo_module=False).by_arity
+    models = solve(prg, [instance], options + ' --project=' + project_mode, nmodels)
     if min_bool:
-        allmodels = clyngor.opt_models_from_clyngor_answers(models)
+        # only keep the models of the enumeration of optimal models
+        allmodels = [model for model, cost, optimality in models if optimality]
     else:
-        allmodels = models
-    # allmodels = [model for model in models.by_arity.with_optimization]
-    # os.unlink(instance_f)
+        allmodels = [model for model, cost, optimality in models]
     return allmodels
 
+@profiling.timed
+def get_paths_multishot(instances, min_bool, enumeration=False, nmodels=0, time_limit=None, solve_limit=None, threads=1, on_model=None, project=True):
+    """get one path, the union and the intersection of paths, and if wanted all
+    the paths, grounding the encoding only once
+
+    Args:
+        instances (list): TermSets (or Networks) of the network, seeds, draft and single target facts
+        min_bool (bool): cardinality-minimal paths
+        enumeration (bool, optional): Defaults to False. enumerate all the paths
+        nmodels (int, optional): Defaults to 0. number of enumerated paths, 0 for all
+        time_limit (float, optional): Defaults to None. seconds given to all the solvings, the first path is always awaited
+        solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving, <conflicts>[,<restarts>]
+        threads (int, optional): Defaults to 1. number of solving threads
+        on_model (callable, optional): Defaults to None. called with each enumerated path as soon as it is found, instead of keeping it in all_paths
+        project (bool, optional): Defaults to True. enumerate only distinct sets of shown atoms
+
+    Returns:
+        dict: one_path, union_path and intersection_path (model, cost), all_paths models,
+        optimality_proven and complete booleans
+    """
+    paths = {}
+    if enumeration and on_model is None:
+        paths['all_paths'] = []
+    for key, value in iter_paths_multishot(instances, min_bool, enumeration, nmodels, time_limit, solve_limit, threads,
+                                           project):
+        if key != 'path':
+            paths[key] = value
+        elif on_model is None:
+            paths['all_paths'].append(value)
+        else:
+            on_model(value)
+    return paths
+
+
+def iter_paths_multishot(instances, min_bool, enumeration=False, nmodels=0, time_limit=None, solve_limit=None, threads=1, project=True):
+    """compute one path, the union and the intersection of paths, and if
+    wanted all the paths, grounding the encoding only once, and yield them as
+    soon as they are found
+
+    The optimum found by the first solving bounds the next ones, as for
+    get_union_of_paths, get_intersection_of_paths and get_all_paths. When a
+    limit stops the optimisation, the best path found so far is kept and the
+    next solvings consider all the paths no larger than it.
+
+    Args:
+        instances (list): TermSets (or Networks) of the network, seeds, draft and single target facts
+        min_bool (bool): cardinality-minimal paths
+        enumeration (bool, optional): Defaults to False. enumerate all the paths
+        nmodels (int, optional): Defaults to 0. number of enumerated paths, 0 for all
+        time_limit (float, optional): Defaults to None. seconds given to all the solvings, the first path is always awaited
+        solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving, <conflicts>[,<restarts>]
+        threads (int, optional): Defaults to 1. number of solving threads
+        project (bool, optional): Defaults to True. enumerate only distinct sets of shown atoms
+
+    Yields:
+        str, object: one_path (model, cost), optimality_proven (bool), union_path and
+        intersection_path (model, cost), then each enumerated path (model) under path,
+        and complete (bool) last
+    """
+    if min_bool:
+        prg = min_path_prg
+    else:
+        prg = path_prg
+    ctl = control(prg, instances, optimisation_options(threads))
+    ground(ctl)
+    budget = solve_budget(time_limit, solve_limit)
+
+    proven = True
+    if min_bool:
+        one_path = None
+        for model, cost, optimality in solve_control(ctl, 'auto', 'opt', 0, budget, first_model=True):
+            one_path = model, cost
+        proven = budget is None or budget.complete
+        optimum = ','.join(map(str, one_path[1]))
+        if proven:
+            opt_mode = 'optN,' + optimum
+        else:
+            # the paths as small as the best one found
+            opt_mode = 'enum,' + optimum
+    else:
+        # without optimization any model is a path, the first one is enough,
+        # the solving being closed before the next ones
+        with contextlib.closing(solve_control(ctl, 'auto', 'opt', 1, budget, first_model=True)) as models:
+            one_path = next(models)[:2]
+        opt_mode = 'ignore'
+    yield 'one_path', one_path
+    yield 'optimality_proven', proven
+
+    for key, enum_mode in [('union_path', 'brave'), ('intersection_path', 'cautious')]:
+        # stopped before any consequence, the path found is the closest
+        # approximation of both the union and the intersection
+        consequences = one_path
+        for model, cost, optimality in solve_control(ctl, enum_mode, opt_mode, 0, budget):
+            consequences = model, cost
+        yield key, consequences
+
+    if enumeration:
+        if not min_bool:
+            opt_mode = 'enum'
+        for model, cost, optimality in solve_control(ctl, 'auto', opt_mode, nmodels, budget,
+                                                     project=project_mode if project else 'no'):
+            # only keep the models of the enumeration of optimal models
+            if optimality or not (min_bool and proven):
+                yield 'path', model
+    yield 'complete', budget is None or budget.complete
+
+@profiling.timed
 def get_cofs(draft, seeds, targets, cofactors):
-    draft_f = utils.to_file(draft)
-    seed_f =  utils.to_file(seeds)
-    targets_f =  utils.to_file(targets)
-    cofactors_f =  utils.to_file(cofactors)
-    prg = [cof_prg, draft_f, seed_f, targets_f, cofactors_f]
-    # solver = Gringo4Clasp()
-    # models = solver.run(prg,collapseTerms=True,collapseAtoms=False)
-    #print(models)
-    # print(os.path.abspath(draft_f))
-    # print(os.path.abspath(seed_f))
-    # print(os.path.abspath(targets_f))
-    # print(os.path.abspath(cofactors_f))
-    best_model = None
+    prg = cof_prg
     options = ''
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity.with_optimization:
-        best_model = model
-    os.unlink(draft_f)
-    os.unlink(seed_f)
-    os.unlink(targets_f)
-    os.unlink(cofactors_f)
-
+    best_model = last_model(prg, [draft, seeds, targets, cofactors], options)
     return best_model #models[0]
 
+@profiling.timed
 def get_cofs_weighted(draft, seeds, targets, cofactors):
-    draft_f = utils.to_file(draft)
-    seed_f =  utils.to_file(seeds)
-    targets_f =  utils.to_file(targets)
-    cofactors_f =  utils.to_file(cofactors)
-    prg = [cof_w_prg, draft_f, seed_f, targets_f, cofactors_f]
+    prg = cof_w_prg
     options ='--configuration jumpy --opt-strategy=usc,oll'
-    # solver = Gringo4Clasp(clasp_options='--configuration jumpy --opt-strategy=usc,oll')
-    # models = solver.run(prg,collapseTerms=True,collapseAtoms=False)
-    #print(models)
-    # print(os.path.abspath(draft_f))
-    # print(os.path.abspath(seed_f))
-    # print(os.path.abspath(targets_f))
-    # print(os.path.abspath(cofactors_f))
-    best_model = None
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity.with_optimization:
-        best_model = model
-    os.unlink(draft_f)
-    os.unlink(seed_f)
-    os.unlink(targets_f)
-    os.unlink(cofactors_f)
+    best_model = last_model(prg, [draft, seeds, targets, cofactors], options)
     return best_model #models[0]
 
+@profiling.timed
 def get_intersection_of_optimal_solutions_cof(draft, seeds, targets, cofactors, optimum, weighted=False):
-    draft_f = utils.to_file(draft)
-    seed_f =  utils.to_file(seeds)
-    targets_f =  utils.to_file(targets)
-    cofactors_f =  utils.to_file(cofactors)
     if weighted:
-        prg = [cof_w_prg, draft_f, seed_f, targets_f, cofactors_f]
+        prg = cof_w_prg
     else:
-        prg = [cof_prg, draft_f, seed_f, targets_f, cofactors_f]
+        prg = cof_prg
     options='--configuration jumpy --opt-strategy=usc,oll --enum-mode=cautious --opt-mode=optN,'+str(optimum)
-    best_model = None
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity.with_optimization:
-        best_model = model
-    # solver = Gringo4Clasp(clasp_options=options)
-    # intersec = solver.run(prg, collapseTerms=True, collapseAtoms=False)
-    os.unlink(draft_f)
-    os.unlink(seed_f)
-    os.unlink(targets_f)
-    os.unlink(cofactors_f)
+    best_model = last_model(prg, [draft, seeds, targets, cofactors], options)
     return best_model #models[0]
 
 
+@profiling.timed
 def get_union_of_optimal_solutions_cof(draft, seeds, targets, cofactors, optimum, weighted=False):
-    draft_f = utils.to_file(draft)
-    seed_f =  utils.to_file(seeds)
-    targets_f =  utils.to_file(targets)
-    cofactors_f =  utils.to_file(cofactors)
     if weighted:
-        prg = [cof_w_prg, draft_f, seed_f, targets_f, cofactors_f]
+        prg = cof_w_prg
     else:
-        prg = [cof_prg, draft_f, seed_f, targets_f, cofactors_f]
-    options='--configuration jumpy --opt-strategy=usc,oll --enum-mode=cautious --opt-mode=optN,'+str(optimum)
-    # solver = Gringo4Clasp(clasp_options=options)
-    # union = solver.run(prg, collapseTerms=True, collapseAtoms=False)
-    best_model = None
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity.with_optimization:
-        best_model = model
-    os.unlink(draft_f)
-    os.unlink(seed_f)
-    os.unlink(targets_f)
-    os.unlink(cofactors_f)
+        prg = cof_prg
+    options='--configuration jumpy --opt-strategy=usc,oll --enum-mode=brave --opt-mode=optN,'+str(optimum)
+    best_model = last_model(prg, [draft, seeds, targets, cofactors], options)
     return best_model #models[0]
 
 
+@profiling.timed
 def get_optimal_solutions_cof(draft, seeds, targets, cofactors, optimum, weighted, nmodels=0):
-    draft_f = utils.to_file(draft)
-    seed_f =  utils.to_file(seeds)
-    targets_f =  utils.to_file(targets)
-    cofactors_f =  utils.to_file(cofactors)
     if weighted:
-        prg = [cof_w_prg, draft_f, seed_f, targets_f, cofactors_f]
+        prg = cof_w_prg
     else:
-        prg = [cof_prg, draft_f, seed_f, targets_f, cofactors_f]
+        prg = cof_prg
     options = '--configuration jumpy --opt-strategy=usc,oll --opt-mode=enum,' +str(optimum)
-    # solver = Gringo4Clasp(clasp_options=options)
-    # models = solver.run(prg, collapseTerms=True, collapseAtoms=False)
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    # print(os.path.abspath(draft_f), os.path.abspath(seed_f), os.path.abspath(targets_f), os.path.abspath(cofactors_f))
-    allmodels = [model for model in models.by_arity.with_optimization]
-    os.unlink(draft_f)
-    os.unlink(seed_f)
-    os.unlink(targets_f)
-    os.unlink(cofactors_f)
+    models = solve(prg, [draft, seeds, targets, cofactors], options + ' --project=' + project_mode, nmodels)
+    allmodels = [(model, cost) for model, cost, optimality in models]
     return allmodels
 
-def get_dead(draft):
-    draft_f = utils.to_file(draft)
+@profiling.timed
+def get_cofs_multishot(draft, seeds, targets, cofactors, weighted, enumeration=False, nmodels=0, time_limit=None, solve_limit=None, threads=1, on_model=None, project=True):
+    """get an optimal set of cofactors, the intersection and the union of the
+    optimal sets, and if wanted all of them, grounding the encoding only once
 
-    prg = [dead_prg, draft_f]
-    options = ''
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity:
-        best_model = model
+    Args:
+        draft (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+        targets (TermSet): target atoms
+        cofactors (TermSet): cofactor atoms, with weights if weighted
+        weighted (bool): use the weighted encoding
+        enumeration (bool, optional): Defaults to False. enumerate all the optimal sets
+        nmodels (int, optional): Defaults to 0. number of enumerated sets, 0 for all
+        time_limit (float, optional): Defaults to None. seconds given to all the solvings, the first set is always awaited
+        solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving, <conflicts>[,<restarts>]
+        threads (int, optional): Defaults to 1. number of solving threads
+        on_model (callable, optional): Defaults to None. called with each enumerated (model, cost) as soon as it is found, instead of keeping it in all_optimal
+        project (bool, optional): Defaults to True. enumerate only distinct sets of shown atoms
 
-    return best_model
+    Returns:
+        dict: optimal (model, cost), optimum (str), intersection and union (model, cost),
+        all_optimal (model, cost) list, optimality_proven and complete booleans
+    """
+    results = {}
+    if enumeration and on_model is None:
+        results['all_optimal'] = []
+    for key, value in iter_cofs_multishot(draft, seeds, targets, cofactors, weighted, enumeration, nmodels,
+                                          time_limit, solve_limit, threads, project):
+        if key != 'solution':
+            results[key] = value
+        elif on_model is None:
+            results['all_optimal'].append(value)
+        else:
+            on_model(value)
+    return results
+
+
+def iter_cofs_multishot(draft, seeds, targets, cofactors, weighted, enumeration=False, nmodels=0, time_limit=None, solve_limit=None, threads=1, project=True):
+    """compute an optimal set of cofactors, the intersection and the union of
+    the optimal sets, and if wanted all of them, grounding the encoding only
+    once, and yield them as soon as they are found
+
+    The optimum found by the optimisation bounds the cautious, brave and
+    enumeration solvings of the same control object. When a limit stops the
+    optimisation, the best set found so far is kept and the next solvings
+    consider all the sets no worse than it.
+
+    Args:
+        draft (TermSet or Network): metabolic network
+        seeds (TermSet): seed atoms
+        targets (TermSet): target atoms
+        cofactors (TermSet): cofactor atoms, with weights if weighted
+        weighted (bool): use the weighted encoding
+        enumeration (bool, optional): Defaults to False. enumerate all the optimal sets
+        nmodels (int, optional): Defaults to 0. number of enumerated sets, 0 for all
+        time_limit (float, optional): Defaults to None. seconds given to all the solvings, the first set is always awaited
+        solve_limit (str, optional): Defaults to None. clingo --solve-limit of each solving, <conflicts>[,<restarts>]
+        threads (int, optional): Defaults to 1. number of solving threads
+        project (bool, optional): Defaults to True. enumerate only distinct sets of shown atoms
+
+    Yields:
+        str, object: optimal (model, cost), optimality_proven (bool), optimum (str),
+        intersection and union (model, cost), then each enumerated set (model, cost)
+        under solution, and complete (bool) last
+    """
+    if weighted:
+        prg = cof_w_prg
+    else:
+        prg = cof_prg
+    ctl = control(prg, [draft, seeds, targets, cofactors], optimisation_options(threads))
+    ground(ctl)
+    budget = solve_budget(time_limit, solve_limit)
 
+    optimal = None
+    for model, cost, optimality in solve_control(ctl, 'auto', 'opt', 0, budget, first_model=True):
+        optimal = model, cost
+    yield 'optimal', optimal
+    proven = budget is None or budget.complete
+    yield 'optimality_proven', proven
+    # the encodings keep all their levels in the cost, whatever the network
+    optimum = ','.join(map(str, optimal[1]))
+    yield 'optimum', optimum
+    if proven:
+        opt_mode = 'optN,' + optimum
+    else:
+        # the sets as good as the best one found
+        opt_mode = 'enum,' + optimum
+
+    for key, enum_mode in [('intersection', 'cautious'), ('union', 'brave')]:
+        # stopped before any consequence, the set found is the closest
+        # approximation of both the intersection and the union
+        consequences = optimal
+        for model, cost, optimality in solve_control(ctl, enum_mode, opt_mode, 0, budget):
+            consequences = model, cost
+        yield key, consequences
+
+    if enumeration:
+        for model, cost, optimality in solve_control(ctl, 'auto', 'enum,' + optimum, nmodels, budget,
+                                                     project=project_mode if project else 'no'):
+            yield 'solution', (model, cost)
+    yield 'complete', budget is None or budget.complete
+
+@profiling.timed
+def get_dead(draft):
+    prg = dead_prg
+    options = ''
+    best_model = last_model(prg, [draft], options)
+    return best_model[0]
+
+@profiling.timed
 def get_seed(draft):
-    draft_f = utils.to_file(draft)
-    prg = [seed_prg, draft_f]
+    prg = seed_prg
     options = ''
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity:
-        best_model = model
-    return best_model
+    best_model = last_model(prg, [draft], options)
+    return best_model[0]
 
+@profiling.timed
 def get_inc_scope(draft, seeds, targets=None):
-    draft_f = utils.to_file(draft)
-    seed_f =  utils.to_file(seeds)
-    prg = [inc_scope_prg, draft_f, seed_f]
+    instances = [draft, seeds]
     if targets:
-        targets_f =  utils.to_file(targets)
-        prg.append(targets_f)
+        instances.append(targets)
 
     options = ''
+    ctl = control(inc_scope_prg, instances, options)
+    # incmode loop of the clingo application: ground one more step until
+    # the check program of the current step is satisfied
+    ctl.add('check', ['t'], '#external query(t).')
+    ground(ctl)
+    step = 0
     best_model = None
-    models = clyngor.solve(prg, options=options, use_clingo_module=False)
-    for model in models.discard_quotes.by_arity:
-        best_model = model
-    os.unlink(draft_f)
-    os.unlink(seed_f)
-    return best_model
\ No newline at end of file
+    while best_model is None:
+        parts = []
+        if step > 0:
+            ctl.release_external(clingo.Function('query', [clingo.Number(step - 1)]))
+            parts.append(('step', [clingo.Number(step)]))
+        parts.append(('check', [clingo.Number(step)]))
+        ground(ctl, parts)
+        ctl.assign_external(clingo.Function('query', [clingo.Number(step)]), True)
+        with profiling.phase('solve', 'query'), ctl.solve(yield_=True) as handle:
+            for model in handle:
+                best_model = decode(model.symbols(shown=True), symbol_tables.get(ctl))
+        if profiling.solver_statistics is not None:
+            profiling.add_statistics(solve_statistics(ctl))
+        step += 1
+    return best_model
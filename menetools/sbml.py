@@ -15,13 +15,23 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
+import hashlib
+import json
+import os
 import sys
+from collections import Counter
 from clyngor.as_pyasp import TermSet, Atom
+from menetools import profiling
+from menetools.network import Network
 import xml.etree.ElementTree as etree
 import logging
 
 logger = logging.getLogger('menetools.sbml')
 
+# Version of the content of the compiled network files, to be increased
+# when stream_model output changes.
+CACHE_VERSION = 2
+
 def get_model(sbml):
     """
     return the model of a SBML
@@ -97,6 +107,130 @@ def get_listOfProducts(reaction):
             break
     return listOfProducts
 
+def get_tag(element):
+    """
+    return the tag of an element without its namespace
+    """
+    if element.tag[0] == "{":
+        uri, tag = element.tag[1:].split("}")
+    else:
+        tag = element.tag
+    return tag
+
+def stream_model(filename):
+    """
+    Stream the species and reactions of a SBML model with iterparse.
+
+    Each species and reaction is yielded once its end tag is read, then it is
+    cleared and detached from the tree (as all the other elements of the
+    listOf* of the model), so that memory only holds one element at a time.
+
+    Yields ('species', species_id), ('reaction', (reaction_id, reversible,
+    reactants, products)) with reactants and products being lists of species
+    IDs (None if the list is missing), and ('listOfSpecies', None) and
+    ('listOfReactions', None) once these lists are read.
+    """
+    parents = []
+    for event, element in etree.iterparse(filename, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        # sbml > model > listOf* > element
+        if len(parents) == 3:
+            tag = get_tag(element)
+            if tag == "species":
+                yield 'species', element.attrib.get("id")
+            elif tag == "reaction":
+                reactionId = element.attrib.get("id")
+                reversible = element.attrib.get("reversible") == "true"
+                listOfReactants = get_listOfReactants(element)
+                if listOfReactants is not None:
+                    listOfReactants = [r.attrib.get("species") for r in listOfReactants]
+                listOfProducts = get_listOfProducts(element)
+                if listOfProducts is not None:
+                    listOfProducts = [p.attrib.get("species") for p in listOfProducts]
+                yield 'reaction', (reactionId, reversible, listOfReactants, listOfProducts)
+            element.clear()
+            del parents[-1][-1]
+        elif len(parents) == 2:
+            tag = get_tag(element)
+            if tag in ("listOfSpecies", "listOfReactions"):
+                yield tag, None
+            element.clear()
+
+def get_cache_file(filename, cache_dir):
+    """
+    return the path of the compiled version of a SBML file in a cache
+    directory, named after the SHA-256 of the SBML content
+    """
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return os.path.join(cache_dir, '{0}.v{1}.json'.format(sha.hexdigest(), CACHE_VERSION))
+
+def load_cache_file(cache_file):
+    """
+    return the species and reactions of a compiled network file as
+    stream_model yields them, raising ValueError if the file is invalid
+    """
+    with open(cache_file, encoding='utf-8') as f:
+        content = json.load(f)
+    if not isinstance(content, list):
+        raise ValueError('not a list of SBML elements')
+    elements = []
+    for element in content:
+        if not isinstance(element, list) or len(element) != 2:
+            raise ValueError('not a SBML element')
+        tag, value = element
+        if tag == 'reaction':
+            if not isinstance(value, list) or len(value) != 4:
+                raise ValueError('not a reaction')
+            value = tuple(value)
+        elements.append((tag, value))
+    return elements
+
+def read_model(filename, cache_dir=None):
+    """
+    Yield the species and reactions of a SBML model like stream_model,
+    using a compiled network cache if a cache directory is given (by default
+    the MENETOOLS_CACHE_DIR environment variable).
+
+    The cache file is keyed by the content of the SBML file, so it is used
+    whenever it exists. Otherwise the SBML is parsed and the cache is
+    written for the next reads.
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get('MENETOOLS_CACHE_DIR')
+    if not cache_dir:
+        yield from stream_model(filename)
+        return
+
+    cache_file = get_cache_file(filename, cache_dir)
+    if os.path.isfile(cache_file):
+        try:
+            content = load_cache_file(cache_file)
+        except (OSError, ValueError):
+            logger.warning(f'Invalid compiled network {cache_file}, it will be replaced')
+        else:
+            logger.info(f'Reading compiled network from {cache_file}')
+            yield from content
+            return
+
+    content = list(stream_model(filename))
+    os.makedirs(cache_dir, exist_ok=True)
+    # write in a temporary file first so that concurrent runs never read a partial cache
+    temporary_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+    try:
+        with open(temporary_file, 'w', encoding='utf-8') as f:
+            json.dump(content, f, separators=(',', ':'))
+        os.replace(temporary_file, cache_file)
+    finally:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+    yield from content
+
 def readSBMLnetwork(filename, name) :
     """
     Read a SBML network and turn it into ASP-friendly data
@@ -138,77 +272,127 @@ def readSBMLnetwork(filename, name) :
     #print(lpfacts)
     return lpfacts
 
-def readSBMLnetwork_clyngor(filename, name) :
+@profiling.timed
+def readSBMLnetwork_clyngor(filename, name, cache_dir=None) :
     """
     Read a SBML network and turn it into ASP-friendly data
+    (see read_model for the compiled network cache)
     """
     all_atoms = set()
-    tree = etree.parse(filename)
-    sbml = tree.getroot()
-    model = get_model(sbml)
-
-    listOfReactions = get_listOfReactions(model)
-    if listOfReactions is None:
-        logger.critical('No reaction in SBML '+filename)
-        sys.exit(1)
-    for e in listOfReactions:
-        if e.tag[0] == "{":
-            uri, tag = e.tag[1:].split("}")
-        else:
-            tag = e.tag
-        if tag == "reaction":
-            reactionId = e.attrib.get("id")
+    listOfReactions = None
+    for tag, content in read_model(filename, cache_dir):
+        if tag == "listOfReactions":
+            listOfReactions = True
+        elif tag == "reaction":
+            reactionId, reversible, listOfReactants, listOfProducts = content
             all_atoms.add(Atom('dreaction', ["\""+reactionId+"\""])) #, "\""+name+"\""
-            if(e.attrib.get("reversible")=="true"):
+            if reversible:
                 all_atoms.add(Atom('reversible', ["\""+reactionId+"\""]))
 
-            listOfReactants = get_listOfReactants(e)
             if listOfReactants == None :
                 logger.warning("\n Warning: " + reactionId + " listOfReactants=None")
             else:
                 for r in listOfReactants:
-                    all_atoms.add(Atom('reactant', ["\""+r.attrib.get("species")+"\"", "\""+reactionId+"\""])) #,"\""+name+"\""
+                    all_atoms.add(Atom('reactant', ["\""+r+"\"", "\""+reactionId+"\""])) #,"\""+name+"\""
 
-            listOfProducts = get_listOfProducts(e)
             if listOfProducts == None:
                 logger.warning("\n Warning: "+reactionId+ " listOfProducts=None")
             else:
                 for p in listOfProducts:
-                    all_atoms.add(Atom('product', ["\""+p.attrib.get("species")+"\"", "\""+reactionId+"\""])) #,"\""+name+"\""
+                    all_atoms.add(Atom('product', ["\""+p+"\"", "\""+reactionId+"\""])) #,"\""+name+"\""
+
+    if listOfReactions is None:
+        logger.critical('No reaction in SBML '+filename)
+        sys.exit(1)
 
     lpfacts = TermSet(all_atoms)
     #print(lpfacts)
     return lpfacts
 
 
-def make_weighted_list_of_species(network):
+@profiling.timed
+def readSBMLnetwork_indexed(filename, name, cache_dir=None) :
     """
-    Read a SBML network and return its list of species with weights
-    corresponding to their number of occurrences in reactions
+    Read a SBML network into an integer-indexed Network, that queries
+    turn into ASP facts only when a solver is called
+    (see read_model for the compiled network cache)
     """
-    tree = etree.parse(network)
-    sbml = tree.getroot()
-    model = get_model(sbml)
+    network = Network()
+    # other definitions of the reactions defined several times
+    duplicates = {}
+    listOfReactions = None
+    for tag, content in read_model(filename, cache_dir):
+        if tag == "listOfReactions":
+            listOfReactions = True
+        elif tag == "reaction":
+            reactionId, reversible, listOfReactants, listOfProducts = content
+            if listOfReactants == None :
+                logger.warning("\n Warning: " + reactionId + " listOfReactants=None")
+                listOfReactants = []
+            if listOfProducts == None:
+                logger.warning("\n Warning: "+reactionId+ " listOfProducts=None")
+                listOfProducts = []
+            if reactionId in network.reaction_index:
+                logger.warning("\n Warning: " + reactionId + " is defined several times, its definitions are merged")
+                other_reversible, other_reactants, other_products = duplicates.get(reactionId, (False, [], []))
+                duplicates[reactionId] = (other_reversible or reversible, other_reactants + listOfReactants,
+                                          other_products + listOfProducts)
+            else:
+                network.add_reaction(reactionId, reversible, listOfReactants, listOfProducts)
 
-    listOfSpecies = get_listOfSpecies(model)
+    if listOfReactions is None:
+        logger.critical('No reaction in SBML '+filename)
+        sys.exit(1)
 
-    species = {}
+    if duplicates:
+        # the reactions are stored in arrays that can only be extended at their end
+        network = network.merged(duplicates)
+    return network
 
-    for e in listOfSpecies:
-        if e.tag[0] == "{":
-            uri, tag = e.tag[1:].split("}")
-        else: tag = e.tag
+
+def get_weights_file(network):
+    """
+    return the path of the file storing the species weights of a SBML network
+    """
+    return network + '.weights.tsv'
+
+@profiling.timed
+def make_weighted_list_of_species(network, persist=False, cache_dir=None):
+    """
+    Read a SBML network and return its list of species with weights
+    corresponding to their number of occurrences in reactions.
+
+    Occurrences are counted in one pass over the reactants and products of
+    the reactions. With persist, the weights are written next to the network
+    (tabulated, as expected by menecof --weight) and read back from there as
+    long as the file is more recent than the network.
+    """
+    weights_file = get_weights_file(network)
+    if persist and os.path.isfile(weights_file) and os.path.getmtime(weights_file) >= os.path.getmtime(network):
+        logger.info(f'Reading species weights from {weights_file}')
+        species = {}
+        with open(weights_file, 'r') as f:
+            for line in f:
+                compound, weight = line.rstrip('\n').split('\t')
+                species[compound] = int(weight)
+        return species
+
+    species = []
+    occurrences = Counter()
+    for tag, content in read_model(network, cache_dir):
         if tag == "species":
-            species_id = e.attrib.get("id")
-            species[species_id] = {0}
-
-    with open(network,'r') as f:
-        contents = f.read()
-        for compound in species:
-            pattern = 'speciesReference species="{}"'.format(compound)
-            #print(pattern)
-            species[compound] = contents.count(pattern)
-            #print(compound, str(species[compound]))
+            species.append(content)
+        elif tag == "reaction":
+            reactionId, reversible, listOfReactants, listOfProducts = content
+            occurrences.update(listOfReactants or [])
+            occurrences.update(listOfProducts or [])
+    species = {compound: occurrences[compound] for compound in species}
+
+    if persist:
+        logger.info(f'Writing species weights to {weights_file}')
+        with open(weights_file, 'w') as f:
+            for compound in species:
+                f.write(f'{compound}\t{species[compound]}\n')
     return(species)
 
 
@@ -234,26 +418,20 @@ def readSBMLspecies(filename, speciestype) :
             lpfacts.add(Term(speciestype, ["\""+e.attrib.get("id")+"\""]))
     return lpfacts
 
+@profiling.timed
 def readSBMLspecies_clyngor(filename, speciestype) :
     """
     Read a SBML network return its species as seeds or targets
     """
     all_atoms = set()
+    listOfSpecies = None
+    for tag, content in stream_model(filename):
+        if tag == "listOfSpecies":
+            listOfSpecies = True
+        elif tag == "species":
+            all_atoms.add(Atom(speciestype, ["\""+content+"\""]))
 
-    tree = etree.parse(filename)
-    sbml = tree.getroot()
-    model = get_model(sbml)
-
-    listOfSpecies = get_listOfSpecies(model)
-    if listOfSpecies is not None:
-        for e in listOfSpecies:
-            if e.tag[0] == "{":
-                uri, tag = e.tag[1:].split("}")
-            else:
-                tag = e.tag
-            if tag == "species":
-                all_atoms.add(Atom(speciestype, ["\""+e.attrib.get("id")+"\""]))
-    else:
+    if listOfSpecies is None:
         sys.exit("Invalid SBML (missing species or listOfSpecies) " + filename)
 
     lpfacts = TermSet(all_atoms)
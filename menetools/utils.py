@@ -14,9 +14,9 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>
 
+import json
 import os
 import logging
-import tempfile
 
 logger = logging.getLogger('menetools.utils')
 
@@ -40,19 +40,57 @@ def print_met(predictions) :
         if p.pred() == "needed_mrxn" : logger.info(' ' + str(p.arg(0)))
         if p.pred() == "selected" : logger.info(' ' + str(p.arg(0)))
 
-def to_file(termset, outputfile=None):
-    """write (append) the content of the TermSet into a file
-    
+
+def list_files(directory=None, file_list=None):
+    """list the SBML files of a directory or the files of a one-per-line list
+
     Args:
-        termset (TermSet): ASP termset
-        outputfile (str, optional): Defaults to None. name of the output file
+        directory (str, optional): Defaults to None. directory of .sbml or .xml files
+        file_list (str, optional): Defaults to None. text file with one path per line
+
+    Returns:
+        list: paths of the files
     """
-    if outputfile:
-        f = open(outputfile, 'a')
-    else:
-        fd, outputfile = tempfile.mkstemp(suffix='.lp', prefix='menetools_')
-        f = os.fdopen(fd, 'a')
-    for t in termset:
-        f.write(str(t) + '.\n')
-    f.close()
-    return outputfile
+    if directory:
+        return sorted(os.path.join(directory, filename) for filename in os.listdir(directory)
+                      if filename.endswith(('.sbml', '.xml')))
+    with open(file_list, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class SolutionStream:
+    """Solutions of an enumeration reported as soon as they are found.
+
+    Each solution is written as a line of a jsonl file, flushed at once so
+    that the solutions survive an interrupted run, and given to a callback.
+    The solutions are not kept in memory.
+    """
+
+    def __init__(self, jsonl=None, on_solution=None):
+        """
+        Args:
+            jsonl (str, optional): Defaults to None. jsonl output file
+            on_solution (callable, optional): Defaults to None. called with each solution
+        """
+        self.output_file = open(jsonl, 'w') if jsonl else None
+        self.on_solution = on_solution
+        self.count = 0
+
+    def add(self, record, *arguments):
+        """report a solution
+
+        Args:
+            record (dict): json line of the solution, numbered from 1 under solution
+            *arguments: arguments given to on_solution
+        """
+        self.count += 1
+        record['solution'] = self.count
+        if self.output_file:
+            self.output_file.write(json.dumps(record, sort_keys=True) + '\n')
+            self.output_file.flush()
+        if self.on_solution is not None:
+            self.on_solution(*arguments)
+
+    def close(self):
+        if self.output_file:
+            self.output_file.close()
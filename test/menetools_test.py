@@ -4,9 +4,20 @@
 import json
 import os
 import pytest
+import shutil
 import subprocess
-
-from menetools import run_menecof, run_menescope, run_menecheck, run_menepath, run_meneacti, run_menedead, run_meneseed, run_menescope_inc
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+from menetools import run_menecof, run_menescope, run_menescope_batch, run_menecheck, run_menecheck_batch, run_menepath, run_meneacti, run_menedead, run_meneseed, run_menescope_inc, run_menebatch, run_meneknockout
+from menetools import expansion, profiling, query, sbml
+from menetools.expansion import ScopeState
+from menetools.network import Network
+from clyngor.as_pyasp import TermSet, Atom
+from menetools import menepath, meneserve
+from menetools.meneserve import make_server
 
 DRAFT_PATH = os.path.join(*['..', 'toy', 'tiny_toy', 'draft.xml'])
 SEED_PATH = os.path.join(*['..', 'toy', 'tiny_toy', 'seeds.xml'])
@@ -21,7 +32,8 @@ MENEINC_TARGETS_PATH = os.path.join('mene_scope_inc', 'targets.sbml')
 def test_menecof():
     print("*** test menecof ***")
     unproducible_targets = set(['M_T2_c', 'M_T1_c'])
-    # optimum_score = '1,2,31'
+    # all the levels are given: unproducible targets, cofactors that are targets, cofactors and weights
+    optimum_score = '0,1,2,-3'
     selected_cofactors = set([('M_c_c', 1), ('M_T1_c', 2)])
     newly_producible_targets = set(['M_T2_c', 'M_T1_c'])
     intersections = set([('M_c_c', 1), ('M_T1_c', 2)])
@@ -32,13 +44,157 @@ def test_menecof():
     print(unions)
     print(results[2])
     assert set(results[5]) == unproducible_targets
-    # assert results[1] == optimum_score
+    assert results[1] == optimum_score
     assert set(results[4]) == selected_cofactors
     assert set(results[6]) == newly_producible_targets
     assert set(results[3]) == intersections
     assert set(results[2]) == unions
 
 
+def test_menecof_prune():
+    print("*** test menecof prune ***")
+    results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True, prune=True)
+    expected = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True)
+
+    assert results[1:] == expected[1:]
+    assert sorted(map(sorted, results[0])) == sorted(map(sorted, expected[0]))
+
+
+def test_menecof_prune_all_cofactors(tmp_path):
+    print("*** test menecof prune all cofactors ***")
+    # M_l_c is not a predecessor of the targets, pruning removes it
+    cofactors_txt = os.path.join(tmp_path, 'cofactors.txt')
+    with open(cofactors_txt, 'w') as cofactors_file:
+        cofactors_file.write('M_l_c\n')
+    weighted_cofactors_txt = os.path.join(tmp_path, 'weighted_cofactors.txt')
+    with open(weighted_cofactors_txt, 'w') as cofactors_file:
+        cofactors_file.write('M_l_c\t3\n')
+    for cofactors, weights, optimum in [(cofactors_txt, False, '0,2,0'), (weighted_cofactors_txt, True, '2,0,0,0')]:
+        output = os.path.join(tmp_path, 'cof.json')
+        results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, cofactors, weights, prune=True, output=output)
+        with open(output) as output_file:
+            assert json.load(output_file)['pruning']['kept_cofactors'] == 0
+        expected = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, cofactors, weights)
+
+        assert results[1] == expected[1] == optimum
+        assert results[2:] == expected[2:]
+
+
+def test_menecof_limits(tmp_path):
+    print("*** test menecof limits ***")
+    output = os.path.join(tmp_path, 'cof.json')
+    results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, output=output, solve_limit='0')
+    with open(output) as output_file:
+        report = json.load(output_file)
+
+    # the first set found is kept and bounds the intersection and the union
+    assert report['optimality_proven'] is False
+    assert report['complete'] is False
+    assert results[3] <= results[4] <= results[2]
+
+    run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, output=output, time_limit=60)
+    with open(output) as output_file:
+        report = json.load(output_file)
+    assert report['optimality_proven'] is True
+    assert report['complete'] is True
+
+
+def test_menecof_threads():
+    print("*** test menecof threads ***")
+    results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True, threads=4)
+    expected = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True)
+
+    assert results[1:] == expected[1:]
+    assert sorted(map(sorted, results[0])) == sorted(map(sorted, expected[0]))
+
+
+def test_menecof_profile(tmp_path):
+    print("*** test menecof profile ***")
+    output = os.path.join(tmp_path, 'cof.json')
+    profiler = profiling.Profiler()
+    results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, output=output, profile=profiler)
+    expected = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH)
+
+    assert results == expected
+    assert profiling.active is None
+    summary = profiler.report()['summary']
+    for name in ['run_menecof', 'sbml.readSBMLnetwork_indexed', 'query.get_cofs_multishot',
+                 'facts', 'ground', 'solve', 'decode']:
+        assert summary[name]['count'] >= 1
+        assert summary[name]['wall'] <= summary['run_menecof']['wall']
+    assert summary['run_menecof']['count'] == 1
+    assert summary['run_menecof']['peak_rss_kb'] >= summary['solve']['peak_rss_kb'] > 0
+    # the reading of the network is timed by its reader, not by the read_model generator
+    assert 'sbml.read_model' not in summary
+    with open(output) as output_file:
+        assert json.load(output_file)['profile']['summary'].keys() == summary.keys()
+
+
+def test_menecof_profile_without_memory(monkeypatch):
+    print("*** test menecof profile without memory ***")
+    # the peak memory cannot be read on Windows
+    monkeypatch.setattr(profiling, 'peak_rss', lambda: None)
+    profiler = profiling.Profiler()
+    results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, profile=profiler)
+
+    assert results == run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH)
+    summary = profiler.report()['summary']
+    assert summary['run_menecof']['count'] == 1
+    assert summary['run_menecof']['peak_rss_kb'] is None
+    assert summary['solve']['peak_rss_kb'] is None
+
+
+def test_menecof_statistics(tmp_path):
+    print("*** test menecof statistics ***")
+    output = os.path.join(tmp_path, 'cof.json')
+    statistics = []
+    results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True, output=output,
+                          statistics=statistics)
+
+    assert results == run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True)
+    assert profiling.solver_statistics is None
+    optimisation = statistics[1]
+    assert optimisation['call'] == 'query.get_cofs_multishot'
+    assert optimisation['encoding'] == 'get_cofs_weighted.lp'
+    assert optimisation['optimality_proven'] is True
+    assert optimisation['costs'] == [0, 1, 2, -3]
+    assert optimisation['atoms'] > 0 and optimisation['rules'] > 0
+    assert [solving['enum_mode'] for solving in statistics[2:]] == ['cautious', 'brave', 'auto']
+    # the enumeration is bounded by the optimum, it does not optimise
+    assert statistics[-1]['optimality_proven'] is None
+    assert statistics[-1]['models'] == 1
+    with open(output) as output_file:
+        summary = json.load(output_file)['statistics']['summary']
+    assert summary['solvings'] == len(statistics)
+    assert summary['models'] == sum(solving['models'] for solving in statistics)
+    assert summary['optimality_proven'] is True
+
+
+def test_menecof_stream(tmp_path):
+    print("*** test menecof stream ***")
+    stream = os.path.join(tmp_path, 'cof.jsonl')
+    solutions = []
+    results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, stream_jsonl=stream, on_solution=solutions.append)
+    expected = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True)
+
+    assert results[0] is None
+    assert results[1:] == expected[1:]
+    assert solutions == expected[0]
+    with open(stream) as stream_file:
+        lines = [json.loads(line) for line in stream_file]
+    assert [line['solution'] for line in lines] == list(range(1, len(solutions) + 1))
+    assert [set(map(tuple, line['cofactors'])) for line in lines] == [set(solution) for solution in solutions]
+
+
+def test_menecof_max_solutions():
+    print("*** test menecof max solutions ***")
+    all_solutions = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True, project=False)[0]
+    solutions = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True, max_solutions=1)[0]
+
+    assert len(solutions) == 1
+    assert solutions[0] in all_solutions
+
+
 def test_menecof_cli():
     print("*** test menecof cli ***")
     unproducible_targets = set(['M_T2_c', 'M_T1_c'])
@@ -64,6 +220,25 @@ def test_menecof_cli():
     os.remove('test.json')
 
 
+def test_menecof_persist_weights(tmp_path):
+    print("*** test menecof persist weights ***")
+    selected_cofactors = set([('M_c_c', 1), ('M_T1_c', 2)])
+    draft_path = os.path.join(tmp_path, 'draft.xml')
+    shutil.copyfile(DRAFT_PATH, draft_path)
+
+    results = run_menecof(draft_path, SEED_PATH, TARGETS_PATH, persist_weights=True)
+    assert set(results[4]) == selected_cofactors
+
+    weights_path = draft_path + '.weights.tsv'
+    assert os.path.exists(weights_path)
+    weights = dict(line.rstrip('\n').split('\t') for line in open(weights_path))
+    assert weights['M_c_c'] == '1'
+    assert weights['M_T1_c'] == '2'
+
+    results = run_menecof(draft_path, SEED_PATH, TARGETS_PATH, persist_weights=True)
+    assert set(results[4]) == selected_cofactors
+
+
 def test_menescope():
     print("*** test menescope ***")
     scope = 9
@@ -101,6 +276,123 @@ def test_menescope_cli():
     os.remove('test.json')
 
 
+def test_menescope_native():
+    print("*** test menescope native ***")
+    compounds = ['M_e_c', 'M_g_c', 'M_S_c', 'M_f_c', 'M_S_b', 'M_i_c', 'M_d_c', 'M_T3_c', 'M_l_c']
+    results = run_menescope(DRAFT_PATH, SEED_PATH, engine='native')
+
+    assert set(results['scope']) == set(compounds)
+    assert set(results['produced_seeds']) == set(['M_S_c'])
+    assert set(results['non_produced_seeds']) == set(['M_l_c'])
+    assert set(results['absent_seeds']) == set(['M_foo_c'])
+
+
+def test_menescope_native_cli():
+    print("*** test menescope native cli ***")
+    compounds = ['M_e_c', 'M_g_c', 'M_S_c', 'M_f_c', 'M_S_b', 'M_i_c', 'M_d_c', 'M_T3_c', 'M_l_c']
+
+    subprocess.call(['mene', 'scope', '-d', DRAFT_PATH,
+                        '-s', SEED_PATH, '--engine', 'native', '--output', 'test.json'])
+
+    results = json.loads(open('test.json', 'r').read())
+
+    assert set(results['scope']) == set(compounds)
+    assert set(results['absent_seeds']) == set(['M_foo_c'])
+    os.remove('test.json')
+
+
+def test_menescope_cache(tmp_path, monkeypatch):
+    print("*** test menescope compiled network cache ***")
+    compounds = ['M_e_c', 'M_g_c', 'M_S_c', 'M_f_c', 'M_S_b', 'M_i_c', 'M_d_c', 'M_T3_c', 'M_l_c']
+    monkeypatch.setenv('MENETOOLS_CACHE_DIR', str(tmp_path))
+
+    results = run_menescope(DRAFT_PATH, SEED_PATH)
+    assert set(results['scope']) == set(compounds)
+    assert len(os.listdir(tmp_path)) == 1
+
+    results = run_menescope(DRAFT_PATH, SEED_PATH)
+    assert set(results['scope']) == set(compounds)
+    assert len(os.listdir(tmp_path)) == 1
+
+    # an invalid compiled network, as a truncated file, is rebuilt
+    cache_file = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+    for invalid in ['[["species", "M_S_c"], ["reac', '{"reaction": 1}', '[["reaction", "R_1"]]']:
+        with open(cache_file, 'w') as f:
+            f.write(invalid)
+        results = run_menescope(DRAFT_PATH, SEED_PATH)
+        assert set(results['scope']) == set(compounds)
+        assert sbml.load_cache_file(cache_file) == list(sbml.stream_model(DRAFT_PATH))
+
+
+def write_seeds_without_S(tmp_path):
+    with open(SEED_PATH) as seeds_file:
+        seeds = seeds_file.read().replace('  <species id="M_S_c" name="M_S_c" compartment="C_c"/>\n', '')
+    seeds_path = os.path.join(tmp_path, 'seeds_without_S.xml')
+    with open(seeds_path, 'w') as seeds_file:
+        seeds_file.write(seeds)
+    return seeds_path
+
+
+@pytest.mark.parametrize('engine', ['asp', 'native'])
+def test_menescope_batch(tmp_path, engine):
+    print("*** test menescope batch ***")
+    compounds = ['M_e_c', 'M_g_c', 'M_S_c', 'M_f_c', 'M_S_b', 'M_i_c', 'M_d_c', 'M_T3_c', 'M_l_c']
+    other_seeds_path = write_seeds_without_S(tmp_path)
+    output = os.path.join(tmp_path, 'scope.jsonl')
+    results = run_menescope_batch(DRAFT_PATH, [SEED_PATH, other_seeds_path], output, engine=engine)
+
+    assert set(results[SEED_PATH]['scope']) == set(compounds)
+    assert results[SEED_PATH]['produced_seeds'] == ['M_S_c']
+    assert set(results[other_seeds_path]['scope']) == set(compounds)
+    assert results[other_seeds_path]['produced_seeds'] == []
+
+    with open(output) as output_file:
+        rows = [json.loads(line) for line in output_file]
+    assert [row['seeds'] for row in rows] == [SEED_PATH, other_seeds_path]
+
+
+def test_menescope_batch_cli(tmp_path):
+    print("*** test menescope batch cli ***")
+    seeds_dir = os.path.join(tmp_path, 'seeds')
+    os.mkdir(seeds_dir)
+    shutil.copy(SEED_PATH, seeds_dir)
+    write_seeds_without_S(seeds_dir)
+    output = os.path.join(tmp_path, 'scope.jsonl')
+
+    subprocess.call(['mene', 'scope', '-d', DRAFT_PATH,
+                        '--seeds-dir', seeds_dir, '--output', output])
+
+    with open(output) as output_file:
+        rows = [json.loads(line) for line in output_file]
+    assert [os.path.basename(row['seeds']) for row in rows] == ['seeds.xml', 'seeds_without_S.xml']
+    assert [row['produced_seeds'] for row in rows] == [['M_S_c'], []]
+
+
+@pytest.mark.parametrize('engine', ['asp', 'native'])
+def test_menecheck_batch(tmp_path, capsys, engine):
+    print("*** test menecheck batch ***")
+    other_seeds_path = write_seeds_without_S(tmp_path)
+    seeds_list = os.path.join(tmp_path, 'seeds.txt')
+    with open(seeds_list, 'w') as seeds_list_file:
+        seeds_list_file.write(SEED_PATH + '\n' + other_seeds_path + '\n')
+    output = os.path.join(tmp_path, 'check.jsonl')
+
+    subprocess.call(['mene', 'check', '-d', DRAFT_PATH, '--seeds-list', seeds_list,
+                        '-t', TARGETS_PATH, '--engine', engine, '--output', output])
+    capsys.readouterr()
+    results = run_menecheck_batch(DRAFT_PATH, [SEED_PATH, other_seeds_path], TARGETS_PATH, engine=engine)
+    # the batch reports only through the logger
+    assert capsys.readouterr().out == ''
+
+    with open(output) as output_file:
+        rows = [json.loads(line) for line in output_file]
+    assert [row['seeds'] for row in rows] == [SEED_PATH, other_seeds_path]
+    for row in rows:
+        assert row['producible_target'] == ['M_T3_c']
+        assert set(row['unproducible_target']) == set(['M_T2_c', 'M_T1_c'])
+        assert set(results[row['seeds']]['unproducible_target']) == set(row['unproducible_target'])
+
+
 def test_meneacti():
     print("*** test meneacti ***")
     activ = 7
@@ -126,6 +418,14 @@ def test_meneacti_cli():
     os.remove('test.json')
 
 
+def test_meneacti_native():
+    print("*** test meneacti native ***")
+    reactions = ['R_boundary', 'R_import_S', 'R_7', 'R_5', 'R_4', 'R_3', 'R_6']
+    results = run_meneacti(DRAFT_PATH, SEED_PATH, engine='native')
+
+    assert set(results) == set(reactions)
+
+
 def test_menecheck():
     print("*** test menecheck ***")
     producible_targets = ['M_T3_c']
@@ -159,6 +459,14 @@ def test_menecheck_cli():
     os.remove('test.json')
 
 
+def test_menecheck_native():
+    print("*** test menecheck native ***")
+    unproducible_results, producible_results = run_menecheck(DRAFT_PATH, SEED_PATH, TARGETS_PATH, engine='native')
+
+    assert set(producible_results) == set(['M_T3_c'])
+    assert set(unproducible_results) == set(['M_T2_c', 'M_T1_c'])
+
+
 def test_menepath():
     print("*** test menepath ***")
     unproducible_targets = set(['M_T1_c', 'M_T2_c'])
@@ -168,9 +476,9 @@ def test_menepath():
 
     results = run_menepath(DRAFT_PATH, SEED_PATH, TARGETS_PATH)
     unproducible_results = results[1]
-    one_solution_results = results[2]
-    union_results = results[3]
-    intersection_results = results[4]
+    one_solution_results = results[2]['M_T3_c']
+    union_results = results[3]['M_T3_c']
+    intersection_results = results[4]['M_T3_c']
 
     assert set(unproducible_results) == unproducible_targets
     # assert set(one_solution_results) == one_solution
@@ -191,11 +499,194 @@ def test_menepath_cli():
     results = json.loads(open('test.json', 'r').read())
 
     assert set(results['unproducible_targets_lst']) == unproducible_targets
-    assert set(results['intersection_path']) == intersections
-    assert set(results['union_path']) == unions
+    assert set(results['intersection_path']['M_T3_c']) == intersections
+    assert set(results['union_path']['M_T3_c']) == unions
     os.remove('test.json')
 
 
+def test_menepath_min_enumeration():
+    print("*** test menepath min enumeration ***")
+    min_path = set(['R_4', 'R_5', 'R_3'])
+
+    results = run_menepath(DRAFT_PATH, SEED_PATH, TARGETS_PATH, min_size=True, enumeration=True)
+
+    assert [set(path) for path in results[0]['M_T3_c']] == [min_path]
+    assert results[2]['M_T3_c'] == min_path
+    assert results[3]['M_T3_c'] == min_path
+    assert results[4]['M_T3_c'] == min_path
+
+
+def test_menepath_parallel(tmp_path, monkeypatch):
+    print("*** test menepath parallel ***")
+    with open(TARGETS_PATH) as targets_file:
+        targets = targets_file.read().replace('M_T1_c', 'M_e_c')
+    targets_path = os.path.join(tmp_path, 'targets.xml')
+    with open(targets_path, 'w') as targets_file:
+        targets_file.write(targets)
+    unions = {'M_T3_c': set(['R_5', 'R_4', 'R_3', 'R_boundary', 'R_import_S']),
+              'M_e_c': set(['R_4', 'R_3', 'R_boundary', 'R_import_S'])}
+    intersections = {'M_T3_c': set(['R_4', 'R_5', 'R_3']),
+                     'M_e_c': set(['R_4', 'R_3'])}
+
+    results = run_menepath(DRAFT_PATH, SEED_PATH, targets_path, enumeration=True, processes=2)
+
+    assert results[1] == set(['M_T2_c'])
+    assert results[3] == unions
+    assert results[4] == intersections
+    assert set(results[0]) == set(['M_T3_c', 'M_e_c'])
+
+    # the API starts no process by default, nor when the CPUs are unknown
+    def no_pool(*args, **kwargs):
+        raise AssertionError('no pool expected')
+    monkeypatch.setattr(menepath.multiprocessing, 'Pool', no_pool)
+    assert run_menepath(DRAFT_PATH, SEED_PATH, targets_path)[3] == unions
+    monkeypatch.setattr(menepath.os, 'cpu_count', lambda: None)
+    assert run_menepath(DRAFT_PATH, SEED_PATH, targets_path, processes=None)[3] == unions
+
+
+def test_menepath_prune(tmp_path):
+    print("*** test menepath prune ***")
+    for min_size in [False, True]:
+        output = os.path.join(tmp_path, 'path.json')
+        results = run_menepath(DRAFT_PATH, SEED_PATH, TARGETS_PATH, min_size=min_size, enumeration=True,
+                               output=output, processes=1, prune=True)
+        expected = run_menepath(DRAFT_PATH, SEED_PATH, TARGETS_PATH, min_size=min_size, enumeration=True,
+                                processes=1)
+
+        assert results[1:] == expected[1:]
+        assert {target: set(map(frozenset, paths)) for target, paths in results[0].items()} == \
+            {target: set(map(frozenset, paths)) for target, paths in expected[0].items()}
+        with open(output) as output_file:
+            report = json.load(output_file)['pruning']['M_T3_c']
+        assert report['kept_reactions'] + report['removed_reactions'] == 16
+        assert report['removed_reactions'] > 0
+
+
+def test_menepath_limits_cli(tmp_path):
+    print("*** test menepath limits cli ***")
+    output = os.path.join(tmp_path, 'path.json')
+    subprocess.call(['mene', 'path', '-d', DRAFT_PATH,
+                        '-s', SEED_PATH,   '-t', TARGETS_PATH, '--min',
+                        '--time-limit', '0', '--output', output])
+    with open(output) as output_file:
+        results = json.load(output_file)
+
+    one_path = set(results['one_path']['M_T3_c'])
+    assert results['optimality_proven']['M_T3_c'] is False
+    assert results['complete']['M_T3_c'] is False
+    assert set(results['intersection_path']['M_T3_c']) <= one_path <= set(results['union_path']['M_T3_c'])
+
+
+def test_menepath_threads_cli(tmp_path):
+    print("*** test menepath threads cli ***")
+    output = os.path.join(tmp_path, 'path.json')
+    subprocess.call(['mene', 'path', '-d', DRAFT_PATH,
+                        '-s', SEED_PATH,   '-t', TARGETS_PATH, '--min',
+                        '--threads', '2', '--output', output])
+    with open(output) as output_file:
+        results = json.load(output_file)
+
+    min_path = set(['R_4', 'R_5', 'R_3'])
+    assert set(results['one_path']['M_T3_c']) == min_path
+    assert set(results['union_path']['M_T3_c']) == min_path
+    assert set(results['intersection_path']['M_T3_c']) == min_path
+
+
+def test_menepath_stream_cli(tmp_path):
+    print("*** test menepath stream cli ***")
+    with open(TARGETS_PATH) as targets_file:
+        targets = targets_file.read().replace('M_T1_c', 'M_e_c')
+    targets_path = os.path.join(tmp_path, 'targets.xml')
+    with open(targets_path, 'w') as targets_file:
+        targets_file.write(targets)
+    expected = run_menepath(DRAFT_PATH, SEED_PATH, targets_path, enumeration=True, processes=1)[0]
+    output = os.path.join(tmp_path, 'path.json')
+    stream = os.path.join(tmp_path, 'path.jsonl')
+    subprocess.call(['mene', 'path', '-d', DRAFT_PATH,
+                        '-s', SEED_PATH,   '-t', targets_path, '--processes', '2',
+                        '--stream-jsonl', stream, '--output', output])
+    with open(output) as output_file:
+        results = json.load(output_file)
+    with open(stream) as stream_file:
+        lines = [json.loads(line) for line in stream_file]
+
+    assert 'all_paths' not in results
+    assert results['enumerated'] == {target: len(paths) for target, paths in expected.items()}
+    assert sorted(line['solution'] for line in lines) == list(range(1, len(lines) + 1))
+    streamed = {}
+    for line in lines:
+        streamed.setdefault(line['target'], set()).add(frozenset(line['path']))
+    assert streamed == {target: set(map(frozenset, paths)) for target, paths in expected.items()}
+
+
+def test_menepath_max_solutions_cli(tmp_path):
+    print("*** test menepath max solutions cli ***")
+    expected = run_menepath(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True, processes=1, project=False)[0]
+    output = os.path.join(tmp_path, 'path.json')
+    subprocess.call(['mene', 'path', '-d', DRAFT_PATH,
+                        '-s', SEED_PATH,   '-t', TARGETS_PATH, '--enumerate',
+                        '--max-solutions', '2', '--output', output])
+    with open(output) as output_file:
+        results = json.load(output_file)
+
+    paths = set(map(frozenset, results['all_paths']['M_T3_c']))
+    assert len(expected['M_T3_c']) == 4
+    assert len(paths) == 2
+    assert paths <= set(map(frozenset, expected['M_T3_c']))
+
+
+def test_menepath_profile_cli(tmp_path):
+    print("*** test menepath profile cli ***")
+    with open(TARGETS_PATH) as targets_file:
+        targets = targets_file.read().replace('M_T1_c', 'M_e_c')
+    targets_path = os.path.join(tmp_path, 'targets.xml')
+    with open(targets_path, 'w') as targets_file:
+        targets_file.write(targets)
+    output = os.path.join(tmp_path, 'path.json')
+    trace = os.path.join(tmp_path, 'trace.json')
+    subprocess.call(['mene', 'path', '-d', DRAFT_PATH,
+                        '-s', SEED_PATH,   '-t', targets_path, '--enumerate',
+                        '--processes', '2', '--profile-trace', trace, '--output', output])
+    with open(output) as output_file:
+        results = json.load(output_file)
+    with open(trace) as trace_file:
+        events = json.load(trace_file)['traceEvents']
+
+    summary = results['profile']['summary']
+    assert summary['run_menepath']['count'] == 1
+    assert summary['menepath.get_target_paths']['count'] == 2
+    assert summary['query.get_paths_multishot']['count'] == 2
+    # the targets are solved in the worker processes
+    main_pid = next(event['pid'] for event in events if event['name'] == 'run_menepath')
+    assert all(event['pid'] != main_pid for event in events if event['name'] == 'query.get_paths_multishot')
+    assert all(event['ph'] == 'X' and event['dur'] >= 0 for event in events)
+    assert set(results['union_path']['M_T3_c']) == set(['R_5', 'R_4', 'R_3', 'R_boundary', 'R_import_S'])
+
+
+def test_menepath_statistics_cli(tmp_path):
+    print("*** test menepath statistics cli ***")
+    with open(TARGETS_PATH) as targets_file:
+        targets = targets_file.read().replace('M_T1_c', 'M_e_c')
+    targets_path = os.path.join(tmp_path, 'targets.xml')
+    with open(targets_path, 'w') as targets_file:
+        targets_file.write(targets)
+    output = os.path.join(tmp_path, 'path.json')
+    subprocess.call(['mene', 'path', '-d', DRAFT_PATH,
+                        '-s', SEED_PATH,   '-t', targets_path, '--min',
+                        '--processes', '2', '--statistics', '--output', output])
+    with open(output) as output_file:
+        results = json.load(output_file)
+    statistics = results['statistics']
+
+    optimisations = {solving['task']: solving for solving in statistics['solvings']
+                     if solving['call'] == 'query.get_paths_multishot' and solving['opt_mode'] == 'opt'}
+    assert optimisations['M_T3_c']['costs'] == [3]
+    assert optimisations['M_e_c']['costs'] == [2]
+    assert all(solving['encoding'] == 'get_min_paths.lp' for solving in optimisations.values())
+    assert statistics['summary']['optimality_proven'] is True
+    assert 'profile' not in results
+
+
 def test_menedead():
     non_consumed_metabolites = ["M_H_c", "M_B_c"]
     non_produced_metabolites = ['M_A_c', 'M_E_c']
@@ -289,6 +780,176 @@ def test_menescope_inc():
         assert set(step_production[step]) == set(results['step_produced'][step])
 
 
+def test_menescope_inc_native():
+    print("*** test menescope_inc native ***")
+    scope_step = {"M_A_c": 0, "M_C_c": 0,
+                "M_B_c": 1, "M_D_c": 1,
+                "M_E_c": 2,
+                "M_F_c": 3,
+                "M_G_c": 4, "M_H_c": 4
+                }
+    reaction_step = {"R_1": 1, "R_2": 1, "R_3": 2, "R_4": 3, "R_5": 4}
+    for targets in [MENEINC_TARGETS_PATH, None]:
+        results = run_menescope_inc(MENEINC_DRAFT_PATH, MENEINC_SEED_PATH, targets, engine='native')
+
+        assert results['incremental_scope'] == scope_step
+        assert results['incremental_activation'] == reaction_step
+
+    with pytest.raises(SystemExit):
+        run_menescope_inc(MENEINC_DRAFT_PATH, MENEINC_UNCORRECT_SEED_PATH, MENEINC_TARGETS_PATH, engine='native')
+
+
+def test_no_temporary_files(tmp_path, monkeypatch):
+    print("*** test no temporary files ***")
+    # the queries give the facts to clingo in memory
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    run_menepath(DRAFT_PATH, SEED_PATH, TARGETS_PATH, processes=1)
+    assert os.listdir(tmp_path) == []
+
+
+def test_network():
+    print("*** test network ***")
+    termset = sbml.readSBMLnetwork_clyngor(DRAFT_PATH, 'draft')
+    network = sbml.readSBMLnetwork_indexed(DRAFT_PATH, 'draft')
+
+    assert set(network) == set(termset)
+    assert len(network) == len(termset)
+    reaction = network.reaction_index['R_5']
+    assert [network.metabolites[metabolite] for metabolite in network.products(reaction)] == ['M_T3_c']
+    seeds = sbml.readSBMLspecies_clyngor(SEED_PATH, 'seed')
+    assert query.get_scope(network, seeds) == query.get_scope(termset, seeds)
+    assert expansion.get_scope(network, seeds) == expansion.get_scope(termset, seeds)
+
+
+def test_network_duplicate_reaction(tmp_path):
+    print("*** test network duplicate reaction ***")
+    with open(DRAFT_PATH) as draft_file:
+        draft = draft_file.read()
+    # R_5 defined again, reversible and with another reactant and product
+    duplicate = ('<reaction id="R_5" name="R_5" reversible="true">'
+                 '<listOfReactants><speciesReference species="M_c_c" stoichiometry="1"/></listOfReactants>'
+                 '<listOfProducts><speciesReference species="M_T2_c" stoichiometry="1"/>'
+                 '<speciesReference species="M_T3_c" stoichiometry="1"/></listOfProducts></reaction>')
+    draft_path = os.path.join(tmp_path, 'draft.xml')
+    with open(draft_path, 'w') as draft_file:
+        draft_file.write(draft.replace('</listOfReactions>', duplicate + '</listOfReactions>'))
+    termset = sbml.readSBMLnetwork_clyngor(draft_path, 'draft')
+    network = sbml.readSBMLnetwork_indexed(draft_path, 'draft')
+
+    assert set(network) == set(termset)
+    assert len(network) == len(termset)
+    assert network.reactions == sbml.readSBMLnetwork_indexed(DRAFT_PATH, 'draft').reactions
+    seeds = sbml.readSBMLspecies_clyngor(SEED_PATH, 'seed')
+    assert query.get_scope(network, seeds) == query.get_scope(termset, seeds)
+    assert (set(run_menescope(draft_path, SEED_PATH, engine='native')['scope'])
+            == set(run_menescope(draft_path, SEED_PATH)['scope']))
+
+
+def test_synthetic_network(tmp_path):
+    print("*** test synthetic network ***")
+    generator = os.path.join('..', 'benchmark', 'synthetic.py')
+    for directory in ['first', 'second']:
+        subprocess.check_call(['python', generator, '-o', os.path.join(tmp_path, directory),
+                               '-r', '50', '--seeds', '5', '--targets', '5', '--seed', '1'])
+        network = sbml.readSBMLnetwork_indexed(os.path.join(tmp_path, directory, 'network.sbml'), 'draft')
+        seeds = sbml.readSBMLspecies_clyngor(os.path.join(tmp_path, directory, 'seeds.sbml'), 'seed')
+
+        assert len(network.reactions) == 50
+        assert len(seeds) == 5
+    for name in ['network.sbml', 'seeds.sbml', 'targets.sbml']:
+        with open(os.path.join(tmp_path, 'first', name)) as first, open(os.path.join(tmp_path, 'second', name)) as second:
+            assert first.read() == second.read()
+
+
+def test_network_facts():
+    print("*** test network facts ***")
+    network = sbml.readSBMLnetwork_indexed(DRAFT_PATH, 'draft')
+    termset = sbml.readSBMLnetwork_clyngor(DRAFT_PATH, 'draft')
+    seeds = sbml.readSBMLspecies_clyngor(SEED_PATH, 'seed')
+    targets = sbml.readSBMLspecies_clyngor(TARGETS_PATH, 'target')
+
+    # the facts of a Network are written from its arrays, those of a TermSet from its atoms
+    for prg, instances in [(query.scope_prg, [seeds]), (query.unproducible_prg, [seeds, targets])]:
+        models = []
+        for draft in [network, termset]:
+            ctl = query.control(prg, [draft] + instances)
+            ctl.ground([('base', [])])
+            models.append([model for model, cost, optimality in query.solve_control(ctl)][-1])
+        assert models[0] == models[1]
+    assert ('M_T3_c',) in models[1]['producible_target']
+
+
+def test_compact_facts(monkeypatch):
+    print("*** test compact facts ***")
+    network = sbml.readSBMLnetwork_indexed(DRAFT_PATH, 'draft')
+    termset = sbml.readSBMLnetwork_clyngor(DRAFT_PATH, 'draft')
+    seeds = sbml.readSBMLspecies_clyngor(SEED_PATH, 'seed')
+    targets = sbml.readSBMLspecies_clyngor(TARGETS_PATH, 'target')
+
+    # the integer IDs are mapped back to the SBML identifiers in the models
+    for draft in [network, termset]:
+        for prg, instances in [(query.scope_prg, [seeds]), (query.unproducible_prg, [seeds, targets])]:
+            models = []
+            for compact in [False, True]:
+                ctl = query.control(prg, [draft] + instances, compact=compact)
+                ctl.ground([('base', [])])
+                models.append([model for model, cost, optimality in query.solve_control(ctl)][-1])
+            assert models[0] == models[1]
+
+    cof_results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True)
+    path_results = run_menepath(DRAFT_PATH, SEED_PATH, TARGETS_PATH)
+    scope = query.get_scope(network, seeds)
+    monkeypatch.setenv('MENETOOLS_COMPACT_FACTS', '1')
+    assert query.compact_facts()
+
+    results = run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, enumeration=True)
+    assert results[1:] == cof_results[1:]
+    assert sorted(map(sorted, results[0])) == sorted(map(sorted, cof_results[0]))
+    results = run_menepath(DRAFT_PATH, SEED_PATH, TARGETS_PATH)
+    for index in [1, 3, 4]:
+        assert results[index] == path_results[index]
+    # the externals of a grounded program are numbered with the facts
+    program = query.GroundedProgram(query.scope_prg, [network],
+                                    [Atom('seed', [query.quote(metabolite)]) for metabolite in network.metabolites])
+    assert program.last_model(seeds)[0]['dscope'] == query.get_scope(network, seeds)['dscope'] == scope['dscope']
+
+
+def test_network_quoted_atoms():
+    print("*** test network quoted atoms ***")
+    network = Network()
+    network.add_reaction('R_"a\\b', True, ['M_"s'], ['M_t\\'])
+
+    # the atoms of a Network are escaped as its facts
+    assert sorted(str(atom) + '.' for atom in network) == sorted(query.network_facts(network))
+    seeds = TermSet([Atom('seed', [query.quote('M_"s')])])
+    assert query.get_scope(network, seeds)['dscope'] == {('M_"s',), ('M_t\\',)}
+    assert query.to_symbol(query.quote('M_"s\\\n')).string == 'M_"s\\\n'
+
+
+def test_scope_state():
+    print("*** test scope state ***")
+    draftnet = sbml.readSBMLnetwork_clyngor(MENEINC_DRAFT_PATH, 'draft')
+    seeds = sbml.readSBMLspecies_clyngor(MENEINC_SEED_PATH, 'seed')
+    state = ScopeState(draftnet, seeds)
+    assert state.scope == {"M_A_c", "M_B_c", "M_C_c", "M_D_c", "M_E_c", "M_F_c", "M_G_c", "M_H_c"}
+
+    reactants, products, reversible = state.reactions['R_3']
+    delta = state.remove_reaction('R_3')
+    assert delta['scope_removed'] == {"M_E_c", "M_F_c", "M_G_c", "M_H_c"}
+    assert delta['activated_removed'] == {"R_3", "R_4", "R_5"}
+    assert not delta['scope_added'] and not delta['activated_added']
+
+    delta = state.add_seed('M_E_c')
+    assert delta['scope_added'] == {"M_E_c", "M_F_c", "M_G_c", "M_H_c"}
+    assert delta['activated_added'] == {"R_4", "R_5"}
+
+    state.remove_seed('M_E_c')
+    delta = state.add_reaction('R_3', reactants, products, reversible)
+    assert delta['scope_added'] == {"M_E_c", "M_F_c", "M_G_c", "M_H_c"}
+    assert delta['activated_added'] == {"R_3", "R_4", "R_5"}
+    assert state.model() == ScopeState(draftnet, seeds).model()
+
+
 def test_menescope_inc_unproducible_targets():
     print("*** test menescope_inc unproducible targets ***")
 
@@ -327,6 +988,168 @@ def test_menescope_inc_cli():
     os.remove('test.json')
 
 
+@pytest.mark.parametrize('engine', ['asp', 'native'])
+def test_menebatch(engine):
+    print("*** test menebatch ***")
+    compounds = ['M_e_c', 'M_g_c', 'M_S_c', 'M_f_c', 'M_S_b', 'M_i_c', 'M_d_c', 'M_T3_c', 'M_l_c']
+    results = run_menebatch([DRAFT_PATH, MENEINC_DRAFT_PATH], SEED_PATH, TARGETS_PATH, processes=2, engine=engine)
+
+    assert list(results) == [DRAFT_PATH, MENEINC_DRAFT_PATH]
+    assert set(results[DRAFT_PATH]['scope']) == set(compounds)
+    assert results[DRAFT_PATH]['producible_target'] == ['M_T3_c']
+    assert set(results[DRAFT_PATH]['unproducible_target']) == set(['M_T2_c', 'M_T1_c'])
+    assert results[MENEINC_DRAFT_PATH]['scope'] == []
+    assert set(results[MENEINC_DRAFT_PATH]['absent_seeds']) == set(['M_S_c', 'M_foo_c', 'M_l_c'])
+
+
+def test_menebatch_cli(tmp_path):
+    print("*** test menebatch cli ***")
+    compounds = ['M_e_c', 'M_g_c', 'M_S_c', 'M_f_c', 'M_S_b', 'M_i_c', 'M_d_c', 'M_T3_c', 'M_l_c']
+    networks_list = os.path.join(tmp_path, 'networks.txt')
+    with open(networks_list, 'w') as networks_list_file:
+        networks_list_file.write(DRAFT_PATH + '\n' + MENEINC_DRAFT_PATH + '\n')
+    output = os.path.join(tmp_path, 'batch.jsonl')
+
+    subprocess.call(['mene', 'batch', '--networks-list', networks_list, '-s', SEED_PATH,
+                        '--processes', '2', '--output', output])
+
+    with open(output) as output_file:
+        rows = [json.loads(line) for line in output_file]
+    assert [row['network'] for row in rows] == [DRAFT_PATH, MENEINC_DRAFT_PATH]
+    assert set(rows[0]['scope']) == set(compounds)
+    assert 'producible_target' not in rows[0]
+
+
+def test_meneknockout():
+    print("*** test meneknockout ***")
+    results = run_meneknockout(DRAFT_PATH, SEED_PATH, TARGETS_PATH, processes=2)
+
+    assert results['unproducible_target'] == ['M_T1_c', 'M_T2_c']
+    assert results['knockouts']['R_4'] == {'lost_scope': ['M_T3_c', 'M_e_c', 'M_f_c'],
+                                           'deactivated_reactions': ['R_4', 'R_5'],
+                                           'unproducible_target': ['M_T3_c']}
+    assert results['knockouts']['R_6'] == {'lost_scope': ['M_g_c'],
+                                           'deactivated_reactions': ['R_6'],
+                                           'unproducible_target': []}
+    # R_1 is not activated
+    assert results['knockouts']['R_1'] == {'lost_scope': [], 'deactivated_reactions': [],
+                                           'unproducible_target': []}
+
+    results = run_meneknockout(DRAFT_PATH, SEED_PATH, reactions=['R_5', 'R_unknown'], processes=1)
+    assert list(results['knockouts']) == ['R_5']
+    assert results['knockouts']['R_5']['lost_scope'] == ['M_T3_c']
+
+
+def test_meneknockout_cli(tmp_path):
+    print("*** test meneknockout cli ***")
+    output = os.path.join(tmp_path, 'knockout.json')
+    subprocess.call(['mene', 'knockout', '-d', DRAFT_PATH, '-s', SEED_PATH, '-t', TARGETS_PATH,
+                        '-r', 'R_3', 'R_7', '--output', output])
+
+    with open(output) as output_file:
+        results = json.load(output_file)
+    assert results['knockouts']['R_3']['lost_scope'] == ['M_T3_c', 'M_d_c', 'M_e_c', 'M_f_c']
+    assert results['knockouts']['R_7']['unproducible_target'] == []
+
+
+def test_meneserve(tmp_path):
+    print("*** test meneserve ***")
+    compounds = ['M_e_c', 'M_g_c', 'M_S_c', 'M_f_c', 'M_S_b', 'M_i_c', 'M_d_c', 'M_T3_c', 'M_l_c']
+    server = make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/'
+
+    def post(request):
+        request = urllib.request.Request(url, data=json.dumps(request).encode('utf-8'), method='POST')
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+    try:
+        for engine in ['asp', 'native']:
+            results = post({'command': 'scope', 'draftnet': DRAFT_PATH, 'seeds': SEED_PATH, 'engine': engine})
+            assert set(results['scope']) == set(compounds)
+            assert results['absent_seeds'] == ['M_foo_c']
+
+            results = post({'command': 'check', 'draftnet': DRAFT_PATH, 'seeds': ['M_S_c', 'M_T1_c'],
+                            'targets': TARGETS_PATH, 'engine': engine})
+            assert set(results['producible_target']) == set(['M_T3_c', 'M_T1_c'])
+            assert results['unproducible_target'] == ['M_T2_c']
+
+        results = post({'command': 'path', 'draftnet': DRAFT_PATH, 'seeds': SEED_PATH, 'targets': TARGETS_PATH})
+        assert set(results['intersection_path']['M_T3_c']) == set(['R_4', 'R_5', 'R_3'])
+
+        with urllib.request.urlopen(url) as response:
+            assert json.load(response)['networks'] == [os.path.abspath(DRAFT_PATH)]
+
+        # the cofactors file of the command line
+        cofactors_txt = os.path.join(tmp_path, 'cofactors.txt')
+        with open(cofactors_txt, 'w') as cofactors_file:
+            cofactors_file.write('M_c_c\nM_T1_c\nM_d_c\n')
+        output = os.path.join(tmp_path, 'cof.json')
+        run_menecof(DRAFT_PATH, SEED_PATH, TARGETS_PATH, cofactors_txt=cofactors_txt, output=output)
+        with open(output) as output_file:
+            expected = json.load(output_file)
+        results = post({'command': 'cof', 'draftnet': DRAFT_PATH, 'seeds': SEED_PATH, 'targets': TARGETS_PATH,
+                        'cofactors': cofactors_txt})
+        assert sorted(results['chosen_cofactors']) == sorted(expected['chosen_cofactors'])
+        assert sorted(results['chosen_cofactors']) == [['M_T1_c', None], ['M_c_c', None]]
+
+        invalid_sbml = os.path.join(tmp_path, 'invalid.sbml')
+        with open(invalid_sbml, 'w') as invalid_file:
+            invalid_file.write('<sbml><model>')
+        for request in [{'command': 'scope', 'draftnet': DRAFT_PATH}, ['scope'],
+                        {'command': 'scope', 'draftnet': DRAFT_PATH, 'seeds': invalid_sbml},
+                        {'command': 'cof', 'draftnet': DRAFT_PATH, 'seeds': SEED_PATH, 'targets': TARGETS_PATH,
+                         'cofactors': cofactors_txt, 'weights': True},
+                        {'command': 'check', 'draftnet': DRAFT_PATH, 'seeds': ['x"). #include "/etc/hostname'],
+                         'targets': TARGETS_PATH},
+                        {'command': 'cof', 'draftnet': DRAFT_PATH, 'seeds': SEED_PATH, 'targets': TARGETS_PATH,
+                         'cofactors': ['a"b']},
+                        {'command': 'scope', 'draftnet': DRAFT_PATH, 'seeds': 3}]:
+            with pytest.raises(urllib.error.HTTPError) as error:
+                post(request)
+            assert error.value.code == 400
+            assert 'error' in json.load(error.value)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.mark.skipif(meneserve.UnixHTTPServer is None, reason='no Unix sockets')
+def test_meneserve_socket_path(tmp_path):
+    print("*** test meneserve socket path ***")
+    socket_path = os.path.join(tmp_path, 'mene.sock')
+    with open(socket_path, 'w') as socket_file:
+        socket_file.write('not a socket')
+    # only a stale socket is replaced
+    with pytest.raises(ValueError):
+        make_server(socket_path=socket_path)
+    with pytest.raises(SystemExit):
+        meneserve.run_meneserve(socket_path=socket_path)
+    with open(socket_path) as socket_file:
+        assert socket_file.read() == 'not a socket'
+
+    os.remove(socket_path)
+    make_server(socket_path=socket_path).server_close()
+    server = make_server(socket_path=socket_path)
+    server.server_close()
+    assert os.path.exists(socket_path)
+
+
+def test_meneserve_without_unix_sockets(tmp_path, monkeypatch):
+    print("*** test meneserve without unix sockets ***")
+    # no Unix sockets on Windows
+    monkeypatch.setattr(meneserve, 'UnixHTTPServer', None)
+    socket_path = os.path.join(tmp_path, 'mene.sock')
+    with pytest.raises(ValueError):
+        make_server(socket_path=socket_path)
+    with pytest.raises(SystemExit):
+        meneserve.run_meneserve(socket_path=socket_path)
+    assert not os.path.exists(socket_path)
+
+
 if __name__ == "__main__":
     test_menepath()
     test_menecheck()